@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# 离线控制器基准(cbench式): 不启动Mininet/OVS, 用本地模拟交换机向Ryu应用直接投递合成的
+# EventOFPPacketIn, 模拟交换机记录控制器发出的全部消息。统计每秒packet-in数、处理函数
+# p50/p99延迟、FlowMod数和峰值RSS, 结果保存为JSON以便跨提交对比:
+#   python3 bench_controller.py --macs 1000 --cross 0.2 --nd 0.1 --switches 4 -o head.json
+#   python3 bench_controller.py --compare base.json -o head.json
+
+import argparse
+import json
+import logging
+import random
+import socket
+import sys
+import time
+
+from ryu.lib.packet import packet
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import ether_types
+from ryu.lib.packet import in_proto
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import icmpv6
+
+from controller_harness import (APPS, PORTS_PER_SWITCH, Harness, create_app, packet_in_bytes,
+                                run_isolated, save_report)
+
+ROUTER_MAC = '00:00:00:00:00:f0'
+EDGE_DPID = 2
+
+
+class Host(object):
+    __slots__ = ('mac', 'ip', 'dpid', 'port')
+
+    def __init__(self, mac, ip, dpid, port):
+        self.mac = mac
+        self.ip = ip
+        self.dpid = dpid
+        self.port = port
+
+
+def make_hosts(macs, switches):
+    """数据中心主机均匀分布在各交换机上, 外部主机(数量为十分之一)接在边缘路由器上"""
+    internal = []
+    for i in range(macs):
+        dpid = 1 + i % switches
+        internal.append(Host(f'02:00:00:{i >> 16 & 0xff:02x}:{i >> 8 & 0xff:02x}:{i & 0xff:02x}',
+                             f'2001:db8:2::{i + 1:x}', dpid, 1 + (i // switches) % PORTS_PER_SWITCH))
+    external = []
+    for i in range(max(1, macs // 10)):
+        external.append(Host(f'04:00:00:{i >> 16 & 0xff:02x}:{i >> 8 & 0xff:02x}:{i & 0xff:02x}',
+                             f'2001:db8:1::{i + 1:x}', EDGE_DPID, 1 + i % PORTS_PER_SWITCH))
+    return internal, external
+
+
+def echo_frame(src_mac, dst_mac, src_ip, dst_ip):
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst=dst_mac, src=src_mac,
+                                       ethertype=ether_types.ETH_TYPE_IPV6))
+    pkt.add_protocol(ipv6.ipv6(src=src_ip, dst=dst_ip, nxt=in_proto.IPPROTO_ICMPV6))
+    pkt.add_protocol(icmpv6.icmpv6(type_=icmpv6.ICMPV6_ECHO_REQUEST,
+                                   data=icmpv6.echo(id_=1, seq=1, data=bytes(32))))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def ns_frame(src, target_ip):
+    """发往被请求节点组播地址的邻居请求, 带源链路层地址选项"""
+    suffix = int.from_bytes(socket.inet_pton(socket.AF_INET6, target_ip)[-3:], 'big')
+    group = f'ff02::1:ff{suffix >> 16:02x}:{suffix & 0xffff:x}'
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst=f'33:33:ff:{suffix >> 16:02x}:{suffix >> 8 & 0xff:02x}:'
+                                           f'{suffix & 0xff:02x}',
+                                       src=src.mac, ethertype=ether_types.ETH_TYPE_IPV6))
+    pkt.add_protocol(ipv6.ipv6(src=src.ip, dst=group, nxt=in_proto.IPPROTO_ICMPV6, hop_limit=255))
+    pkt.add_protocol(icmpv6.icmpv6(type_=icmpv6.ND_NEIGHBOR_SOLICIT, data=icmpv6.nd_neighbor(
+        dst=target_ip, option=icmpv6.nd_option_sla(hw_src=src.mac))))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def make_workload(args):
+    """生成[(dpid, 入端口, 帧)]; 相同的(源, 目的, 类型)只构造一次帧"""
+    rng = random.Random(args.seed)
+    internal, external = make_hosts(args.macs, args.switches)
+    edge_hosts = [host for host in internal if host.dpid == EDGE_DPID] or internal
+    frames = {}
+    workload = []
+    for _ in range(args.warmup + args.packets):
+        roll = rng.random()
+        if roll < args.nd:
+            src, dst = rng.choice(internal), rng.choice(internal)
+            key = ('nd', src.mac, dst.ip)
+            dpid, port = src.dpid, src.port
+            if key not in frames:
+                frames[key] = ns_frame(src, dst.ip)
+        elif roll < args.nd + args.cross:
+            # 外部主机经边缘路由器访问数据中心主机
+            src, dst = rng.choice(external), rng.choice(edge_hosts)
+            key = ('l3', src.mac, dst.ip)
+            dpid, port = EDGE_DPID, src.port
+            if key not in frames:
+                frames[key] = echo_frame(src.mac, ROUTER_MAC, src.ip, dst.ip)
+        else:
+            src, dst = rng.choice(internal), rng.choice(internal)
+            key = ('l2', src.mac, dst.mac)
+            dpid, port = src.dpid, src.port
+            if key not in frames:
+                frames[key] = echo_frame(src.mac, dst.mac, src.ip, dst.ip)
+        workload.append((dpid, port, frames[key]))
+    return workload
+
+
+def run_app(name, args):
+    """在当前进程中运行一个应用的基准, 返回结果字典"""
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    harness = Harness(create_app(name, args.env), flush_every=args.flush_every)
+    for dpid in range(1, args.switches + 1):
+        harness.datapath(dpid)
+
+    workload = make_workload(args)
+    raw = [(dpid, packet_in_bytes(i & 0xffffffff, port, data))
+           for i, (dpid, port, data) in enumerate(workload)]
+    for dpid, buf in raw[:args.warmup]:
+        harness.packet_in(dpid, buf)
+    harness.reset()
+
+    start = time.perf_counter()
+    for dpid, buf in raw[args.warmup:]:
+        harness.packet_in(dpid, buf)
+    harness.flush()
+    return harness.results(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线控制器packet-in基准(模拟交换机)')
+    parser.add_argument('--app', choices=list(APPS) + ['all'], default='all')
+    parser.add_argument('--packets', type=int, default=100000)
+    parser.add_argument('--warmup', type=int, default=2000, help='不计入统计的预热packet-in数')
+    parser.add_argument('--macs', type=int, default=1000, help='数据中心主机MAC数')
+    parser.add_argument('--cross', type=float, default=0.2, help='跨子网IPv6包占比')
+    parser.add_argument('--nd', type=float, default=0.1, help='邻居请求占比')
+    parser.add_argument('--switches', type=int, default=4)
+    parser.add_argument('--flush-every', type=int, default=16,
+                        help='每N个packet-in刷新一次发送队列')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--env', action='append', default=[],
+                        help='创建应用前设置的环境变量, 如 --env FLOW_CACHE=1')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('-o', '--output', help='结果JSON文件')
+    parser.add_argument('--compare', help='作为基线的结果JSON文件')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.switches < EDGE_DPID and args.cross:
+        parser.error(f'跨子网流量需要边缘路由器(dpid={EDGE_DPID}), --switches至少为{EDGE_DPID}')
+
+    if args.child:
+        json.dump(run_app(args.app, args), sys.stdout)
+        return
+
+    results = run_isolated(__file__, sys.argv[1:], APPS if args.app == 'all' else [args.app])
+    workload = {key: getattr(args, key) for key in
+                ('packets', 'warmup', 'macs', 'cross', 'nd', 'switches', 'flush_every', 'seed',
+                 'env')}
+    save_report(args.output, workload, results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
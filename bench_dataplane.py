@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# 端到端数据平面性能套件: 依次在simple_topo.py(simple_switch.py)和datacenter_topo.py
+# (datacenter_controller.py)上测量
+#   - 拓扑启动后到全部测试主机对连通的时间
+#   - 首包与稳态的ping6时延(全部主机对同时发起ping6序列, 第1个包需要控制器处理)
+#   - 同leaf、跨leaf和外部↔数据中心主机对的iperf3吞吐
+#   - 各阶段控制器进程的CPU时间和packet-in数
+# 结果写成JSON, 并按阈值文件逐项判定, 有不达标项时退出码为1, 可用于门禁。阈值由实测
+# 校准生成(--calibrate: 实测值加余量), 没有阈值文件时只记录结果; 门禁使用
+# --require-thresholds, 缺少阈值文件时直接失败:
+#   sudo python3 bench_dataplane.py --calibrate --margin 0.5     # 生成perf_thresholds.json
+#   sudo python3 bench_dataplane.py -o dataplane.json
+#   sudo python3 bench_dataplane.py --require-thresholds --thresholds perf_thresholds.json
+
+import argparse
+import importlib
+import itertools
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+from mininet.log import setLogLevel, info
+
+from controller_harness import git_commit
+from mininet_bench import add_test_address, cleanup, metric, start_controller, stop_controller
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+CATEGORIES = ('intra_leaf', 'inter_leaf', 'external')
+# 校准的指标: 指标路径 -> (方向, 绝对余量); 上限取实测值×(1+margin)+绝对余量,
+# 下限取实测值×(1-margin), 连通主机对数要求与实测完全一致
+CALIBRATED = {
+    'connectivity_seconds': ('max', 5.0),
+    'pairs.connected': ('min', None),
+    'phases.idle.cpu_percent': ('max', 5.0),
+    'phases.throughput.packet_ins': ('max', 50),
+}
+for _category in CATEGORIES:
+    CALIBRATED[f'latency.{_category}.first_ms_p50'] = ('max', 20.0)
+    CALIBRATED[f'latency.{_category}.steady_ms_p50'] = ('max', 1.0)
+    CALIBRATED[f'throughput_mbps.{_category}'] = ('min', 0.0)
+
+# 每个场景: 控制器、拓扑构建函数、参与测试的主机、外部网络交换机和测试地址
+SCENARIOS = {
+    'simple': {
+        'controller': 'simple_switch.py',
+        'topology': ('simple_topo', 'createNet'),
+        'hosts': ['h1', 'h2', 'h3', 'h4'],
+        'external_switch': None,
+        # 二层交换, 测试地址放在同一个ULA前缀内
+        'prefix': 'fd00::',
+        'gateway': None,
+    },
+    'datacenter': {
+        'controller': 'datacenter_controller.py',
+        'topology': ('datacenter_topo', 'createDatacenterNet'),
+        'hosts': ['h1a', 'h1b', 'h2a', 'h2b', 'h3a', 'h4a', 'h6', 'h7'],
+        'external_switch': 'ex',
+        # 数据中心主机的测试地址放在控制器的数据中心子网(2001:db8:2::/64)内
+        'prefix': '2001:db8:2::d:',
+        'gateway': '2001:db8:2::ffff',
+    },
+}
+PING_LINE = re.compile(r'^\[(\d+\.\d+)\].*icmp_seq=(\d+).*time=([\d.]+) ms')
+
+
+def packet_ins():
+    """控制器导出的packet-in总数"""
+    return metric('ryu_packet_in_total')
+
+
+def cpu_seconds(pid):
+    """进程累计的用户态+内核态CPU时间"""
+    with open(f'/proc/{pid}/stat') as f:
+        # 进程名可能含空格, 从右括号之后开始数字段(utime、stime为第14、15个字段)
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+class PhaseMeter(object):
+    """按阶段记录墙钟时间、控制器CPU时间和packet-in数"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.phases = {}
+        self.current = None
+
+    def start(self, name):
+        self.current = (name, time.monotonic(), cpu_seconds(self.pid), packet_ins())
+
+    def stop(self):
+        name, started, cpu, count = self.current
+        elapsed = time.monotonic() - started
+        used = cpu_seconds(self.pid) - cpu
+        self.phases[name] = {
+            'seconds': round(elapsed, 3),
+            'cpu_seconds': round(used, 3),
+            'cpu_percent': round(100 * used / elapsed, 1) if elapsed else 0.0,
+            'packet_ins': packet_ins() - count,
+        }
+        self.current = None
+
+
+def attached_switch(host):
+    """主机接入的交换机名"""
+    link = host.defaultIntf().link
+    peer = link.intf2 if link.intf1.node is host else link.intf1
+    return peer.node.name
+
+
+def setup_hosts(net, scenario):
+    """给主机配置测试地址, 返回 {主机名: (地址, 接入交换机, 是否外部主机)}"""
+    hosts = {}
+    for i, name in enumerate(scenario['hosts'], 1):
+        host = net.get(name)
+        switch = attached_switch(host)
+        external = switch == scenario['external_switch']
+        if external:
+            # 外部主机沿用拓扑配置的地址和默认路由
+            address = host.params['ip'].split('/')[0]
+        else:
+            address = f"{scenario['prefix']}{i:x}"
+            add_test_address(host, address, scenario['gateway'])
+        hosts[name] = (address, switch, external)
+    return hosts
+
+
+def category(hosts, src, dst):
+    if hosts[src][2] or hosts[dst][2]:
+        return 'external'
+    return 'intra_leaf' if hosts[src][1] == hosts[dst][1] else 'inter_leaf'
+
+
+def test_pairs(hosts):
+    """全部测试主机对(每对一个方向); 外部主机之间不经过数据中心, 不测"""
+    return [(src, dst) for src, dst in itertools.combinations(hosts, 2)
+            if not (hosts[src][2] and hosts[dst][2])]
+
+
+def ping_series(net, hosts, pairs, args, tag):
+    """全部主机对同时发起ping6序列, 返回 {(源, 目的): [(时间戳, 序号, 时延ms)]}"""
+    logs = {}
+    for i, (src, dst) in enumerate(pairs):
+        logs[(src, dst)] = f'/tmp/dataplane_{tag}_{i}.log'
+        net.get(src).cmd(f'ping6 -D -n -c {args.count} -i {args.interval} -W 1 '
+                         f'{hosts[dst][0]} > {logs[(src, dst)]} 2>&1 &')
+    for src in {src for src, _ in pairs}:
+        net.get(src).cmd('wait')
+    replies = {}
+    for pair, path in logs.items():
+        with open(path) as f:
+            matches = (PING_LINE.match(line) for line in f)
+            replies[pair] = [(float(m.group(1)), int(m.group(2)), float(m.group(3)))
+                             for m in matches if m]
+        os.remove(path)
+    return replies
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize_latency(hosts, replies, args):
+    """按主机对类别汇总首包(序号1)和稳态(后一半序号)时延"""
+    result = {}
+    for name in CATEGORIES:
+        pairs = [pair for pair in replies if category(hosts, *pair) == name]
+        if not pairs:
+            continue
+        first = [rtt for pair in pairs for _, seq, rtt in replies[pair] if seq == 1]
+        steady = [rtt for pair in pairs for _, seq, rtt in replies[pair] if seq > args.count // 2]
+        result[name] = {
+            'pairs': len(pairs),
+            'first_lost': len(pairs) - len(first),
+            'first_ms_p50': round(statistics.median(first), 3) if first else None,
+            'first_ms_max': round(max(first), 3) if first else None,
+            'steady_ms_p50': round(statistics.median(steady), 3) if steady else None,
+            'steady_ms_p99': round(percentile(steady, 0.99), 3) if steady else None,
+        }
+    return result
+
+
+def iperf(net, hosts, src, dst, seconds):
+    """src到dst的iperf3 TCP吞吐(Mbit/s), 失败时返回None"""
+    server = net.get(dst)
+    server.cmd('iperf3 -s -1 -D')
+    time.sleep(0.5)
+    out = net.get(src).cmd(f'iperf3 -c {hosts[dst][0]} -t {seconds} -J')
+    server.cmd('pkill -f "iperf3 -s"')
+    try:
+        return round(json.loads(out)['end']['sum_received']['bits_per_second'] / 1e6, 1)
+    except (ValueError, KeyError):
+        info(f"    iperf3 {src}->{dst} 失败\n")
+        return None
+
+
+def throughput(net, hosts, pairs, seconds):
+    """每个类别取第一对主机测iperf3吞吐; 外部↔数据中心由外部主机发送"""
+    result = {}
+    for name in CATEGORIES:
+        pair = next((pair for pair in pairs if category(hosts, *pair) == name), None)
+        if pair is None:
+            continue
+        src, dst = pair
+        if hosts[dst][2]:
+            src, dst = dst, src
+        result[name] = iperf(net, hosts, src, dst, seconds)
+        info(f"    {name:<10} {src}->{dst} {result[name]} Mbit/s\n")
+    return result
+
+
+def run_scenario(name, args):
+    scenario = SCENARIOS[name]
+    info(f"*** 场景 {name}\n")
+    cleanup()
+    controller = start_controller(f'dataplane_{name}.log', app=scenario['controller'])
+    meter = PhaseMeter(controller.pid)
+    net = None
+    try:
+        module, function = scenario['topology']
+        meter.start('startup')
+        started = time.time()
+        net = getattr(importlib.import_module(module), function)()
+        hosts = setup_hosts(net, scenario)
+        pairs = test_pairs(hosts)
+        replies = ping_series(net, hosts, pairs, args, name)
+        meter.stop()
+
+        connected = sum(1 for pair in pairs if replies[pair])
+        # 全部主机对都收到过应答时, 最晚的首个应答即为全连通的时刻
+        connectivity = (round(max(replies[pair][0][0] for pair in pairs) - started, 3)
+                        if connected == len(pairs) else None)
+        info(f"    连通{connected}/{len(pairs)}对, 全连通用时{connectivity}秒\n")
+
+        meter.start('idle')
+        time.sleep(args.idle)
+        meter.stop()
+
+        meter.start('throughput')
+        rates = throughput(net, hosts, pairs, args.iperf_seconds)
+        meter.stop()
+    finally:
+        if net is not None:
+            net.stop()
+        stop_controller(controller)
+    return {
+        'connectivity_seconds': connectivity,
+        'pairs': {'connected': connected, 'total': len(pairs)},
+        'latency': summarize_latency(hosts, replies, args),
+        'throughput_mbps': rates,
+        'phases': meter.phases,
+    }
+
+
+def lookup(result, path):
+    """按点分路径取嵌套结果中的值, 不存在时返回None"""
+    for key in path.split('.'):
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key)
+    return result
+
+
+def check(results, thresholds):
+    """逐项对比阈值({场景: {指标路径: {"min"/"max": 值}}}), 缺失的指标视为不达标"""
+    checks = []
+    for name, limits in thresholds.items():
+        if name not in results:
+            continue
+        for path, bounds in limits.items():
+            value = lookup(results[name], path)
+            for op, limit in bounds.items():
+                ok = value is not None and (value >= limit if op == 'min' else value <= limit)
+                checks.append({'scenario': name, 'metric': path, 'value': value,
+                               op: limit, 'pass': ok})
+    return checks
+
+
+def calibrate(results, margin):
+    """按实测结果生成阈值, 场景中没有的指标(如simple场景的外部主机对)不生成"""
+    thresholds = {}
+    for name, result in results.items():
+        limits = {}
+        for path, (op, slack) in CALIBRATED.items():
+            value = lookup(result, path)
+            if value is None:
+                continue
+            if slack is None:
+                limit = value
+            elif op == 'max':
+                limit = round(value * (1 + margin) + slack, 3)
+            else:
+                limit = round(value * max(0.0, 1 - margin), 3)
+            limits[path] = {op: limit}
+        thresholds[name] = limits
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mininet拓扑上的端到端数据平面性能套件')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='要运行的场景, 可重复; 默认全部')
+    parser.add_argument('--count', type=int, default=20, help='每对主机的ping6次数')
+    parser.add_argument('--interval', type=float, default=0.1, help='ping6间隔(秒)')
+    parser.add_argument('--idle', type=float, default=5.0, help='空闲阶段时长(秒)')
+    parser.add_argument('--iperf-seconds', type=int, default=5, help='每次iperf3时长(秒)')
+    parser.add_argument('--thresholds', default='perf_thresholds.json', help='阈值JSON文件')
+    parser.add_argument('--require-thresholds', action='store_true',
+                        help='阈值文件不存在时不运行, 以退出码2失败(门禁使用)')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='不做判定, 按本次实测值加余量写入阈值文件')
+    parser.add_argument('--margin', type=float, default=0.5,
+                        help='校准余量(相对实测值的比例)')
+    parser.add_argument('-o', '--output', help='结果JSON文件')
+    args = parser.parse_args()
+    if args.count < 2:
+        parser.error('--count至少为2, 才能区分首包和稳态')
+    if args.require_thresholds and not args.calibrate and not os.path.exists(args.thresholds):
+        parser.error(f'阈值文件{args.thresholds}不存在, 先用--calibrate或make perf-calibrate生成')
+
+    setLogLevel('info')
+    results = {name: run_scenario(name, args) for name in args.scenario or SCENARIOS}
+    thresholds = {}
+    if args.calibrate:
+        thresholds = calibrate(results, args.margin)
+        thresholds['_calibration'] = {
+            'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'margin': args.margin,
+            'workload': {key: getattr(args, key) for key in
+                         ('count', 'interval', 'idle', 'iperf_seconds')},
+            'measured': {name: {path: lookup(results[name], path) for path in limits}
+                         for name, limits in thresholds.items()},
+        }
+        with open(args.thresholds, 'w') as f:
+            json.dump(thresholds, f, indent=2, ensure_ascii=False)
+        info(f"*** 已按实测值(余量{args.margin:.0%})写入阈值文件{args.thresholds}\n")
+        thresholds = {}
+    elif args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    else:
+        info("*** 没有阈值文件, 只记录结果(先用--calibrate或make perf-calibrate生成)\n")
+    checks = check(results, thresholds)
+    failed = [item for item in checks if not item['pass']]
+
+    info(f"*** 阈值检查 {len(checks) - len(failed)}/{len(checks)}项通过\n")
+    for item in failed:
+        bound = ', '.join(f'{op} {item[op]}' for op in ('min', 'max') if op in item)
+        info(f"    不达标 {item['scenario']} {item['metric']} = {item['value']} ({bound})\n")
+    report = {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'workload': {key: getattr(args, key) for key in
+                     ('count', 'interval', 'idle', 'iperf_seconds', 'thresholds', 'calibrate')},
+        'results': results,
+        'checks': checks,
+        'passed': not failed,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        info(f"*** 结果已保存到{args.output}\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# 日志基准: 对比同步logger.info与异步采样事件日志(0%/1%/100%采样)下packet-in处理吞吐
+
+import argparse
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import fast_packet
+from event_log import EventLog
+
+
+def make_frames(count):
+    frames = []
+    for i in range(count):
+        src = struct.pack('!HI', 0x0200, i)
+        dst = struct.pack('!HI', 0x0200, (i * 7919) % count)
+        frames.append(dst + src + struct.pack('!H', fast_packet.ETH_TYPE_IPV6) + bytes(54))
+    return frames
+
+
+def run_handler(frames, log, repeat):
+    """模拟L2分支: 快速解析 -> 学习MAC -> 查表 -> 记录转发事件"""
+    mac_to_port = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for in_port, data in enumerate(frames):
+            hdr = fast_packet.parse_headers(data)
+            mac_to_port[hdr.src] = in_port & 0xff
+            out_port = mac_to_port.get(hdr.dst, 0)
+            log(1, hdr.src, hdr.dst, in_port, out_port)
+    return len(frames) * repeat / (time.perf_counter() - start)
+
+
+def sync_logger(path):
+    logger = logging.getLogger('bench_sync')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+
+    def log(dpid, src, dst, in_port, out_port):
+        logger.info(f"dpid{dpid}: {src}->{dst} 从端口{in_port}到端口{out_port}")
+    return log, lambda: (logger.removeHandler(handler), handler.close())
+
+
+def async_logger(path, rate):
+    event_log = EventLog(logging.getLogger('bench_async'), path=path,
+                         sample_rates={'l2_forward': rate})
+    stop = threading.Event()
+
+    def drain_loop():
+        while not stop.is_set():
+            time.sleep(event_log.interval)
+            event_log.drain()
+
+    thread = threading.Thread(target=drain_loop, daemon=True)
+    thread.start()
+
+    def log(dpid, src, dst, in_port, out_port):
+        event_log.emit('l2_forward', dpid=dpid, src=src, dst=dst,
+                       in_port=in_port, out_port=out_port)
+
+    def close():
+        stop.set()
+        thread.join()
+        event_log.close()
+        stats = event_log.get_stats()
+        print(f"  写出{stats['written']}条, 采样跳过{stats['sampled_out']}条, "
+              f"缓冲区溢出{stats['overflow']}条")
+    return log, close
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同步日志与异步采样事件日志吞吐基准')
+    parser.add_argument('--frames', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    total = args.frames * args.repeat
+    print(f"packet-in数: {total}")
+
+    baseline = run_handler(frames, lambda *a: None, args.repeat)
+    print(f"{'无日志':<24} {baseline:>12,.0f} 包/秒")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [('同步logger.info', lambda path: sync_logger(path))]
+        for rate in (0.0, 0.01, 1.0):
+            cases.append((f'异步事件日志 {rate:.0%}采样',
+                          lambda path, rate=rate: async_logger(path, rate)))
+        for name, factory in cases:
+            path = os.path.join(tmp, 'log')
+            log, close = factory(path)
+            rate = run_handler(frames, log, args.repeat)
+            print(f"{name:<24} {rate:>12,.0f} 包/秒 ({rate / baseline:.0%})")
+            close()
+            print(f"  日志文件: {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
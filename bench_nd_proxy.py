@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# ND代理基准: 测量从收到邻居请求帧到序列化出携带邻居通告的PacketOut的耗时
+
+import argparse
+import ipaddress
+import time
+
+from ryu.lib.packet import packet
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import ether_types
+from ryu.lib.packet import in_proto
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import icmpv6
+from ryu.ofproto import ofproto_protocol
+from ryu.ofproto import ofproto_v1_3
+
+import fast_packet
+from nd_proxy import NDProxy
+
+ROUTER_MAC = '00:00:00:00:00:f0'
+SOLICITED_NODE_PREFIX = ipaddress.IPv6Address('ff02::1:ff00:0')
+
+
+def solicited_node(ip):
+    """目标地址对应的请求节点组播地址及其MAC"""
+    low = int(ipaddress.IPv6Address(ip)) & 0xffffff
+    group = str(ipaddress.IPv6Address(int(SOLICITED_NODE_PREFIX) | low))
+    mac = '33:33:ff:%02x:%02x:%02x' % (low >> 16, (low >> 8) & 0xff, low & 0xff)
+    return group, mac
+
+
+def build_solicit(src_ip, src_mac, target_ip):
+    group, group_mac = solicited_node(target_ip)
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst=group_mac, src=src_mac,
+                                       ethertype=ether_types.ETH_TYPE_IPV6))
+    pkt.add_protocol(ipv6.ipv6(src=src_ip, dst=group,
+                               nxt=in_proto.IPPROTO_ICMPV6, hop_limit=255))
+    pkt.add_protocol(icmpv6.icmpv6(
+        type_=icmpv6.ND_NEIGHBOR_SOLICIT,
+        data=icmpv6.nd_neighbor(dst=target_ip,
+                                option=icmpv6.nd_option_sla(hw_src=src_mac))))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def turnaround(proxy, datapath, data):
+    """控制器处理路径: 快速解析 -> 完整解析ND -> 代答 -> 序列化PacketOut"""
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+    hdr = fast_packet.parse_headers(data)
+    pkt = packet.Packet(data)
+    na = proxy.handle_solicit(hdr.src, pkt.get_protocol(ipv6.ipv6),
+                              pkt.get_protocol(icmpv6.icmpv6))
+    out = parser.OFPPacketOut(datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+                              in_port=ofproto.OFPP_CONTROLLER,
+                              actions=[parser.OFPActionOutput(1)], data=na)
+    out.serialize()
+    return out.buf
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ND代理NS->NA耗时基准')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--hosts', type=int, default=1000)
+    args = parser.parse_args()
+
+    nd_table = {'2001:db8:2::ffff': ROUTER_MAC}
+    for i in range(1, args.hosts + 1):
+        nd_table[f'2001:db8:2:{i >> 8:x}::{i & 0xff:x}'] = '00:00:00:00:%02x:%02x' % (i >> 8, i & 0xff)
+    targets = list(nd_table)
+    frames = [build_solicit('2001:db8:2:ff::1', '00:00:00:00:ff:01', targets[i % len(targets)])
+              for i in range(min(args.requests, len(targets)))]
+
+    proxy = NDProxy(nd_table, ROUTER_MAC)
+    datapath = ofproto_protocol.ProtocolDesc(ofproto_v1_3.OFP_VERSION)
+    assert turnaround(proxy, datapath, frames[0])
+
+    samples = []
+    start = time.perf_counter()
+    for i in range(args.requests):
+        t0 = time.perf_counter()
+        turnaround(proxy, datapath, frames[i % len(frames)])
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    samples.sort()
+    print(f"NS请求数: {args.requests}, 邻居表项: {len(nd_table)}")
+    print(f"吞吐: {args.requests / elapsed:,.0f} NS/s")
+    print(f"NS->NA耗时: p50={samples[len(samples) // 2] * 1e6:.1f}us "
+          f"p99={samples[int(len(samples) * 0.99)] * 1e6:.1f}us")
+
+
+if __name__ == '__main__':
+    main()
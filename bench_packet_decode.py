@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# 包头解析基准: 对比Ryu完整解析器与fast_packet快速解析的每秒处理包数
+
+import argparse
+import random
+import socket
+import struct
+import time
+
+from ryu.lib.packet import packet
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import icmpv6
+
+import fast_packet
+
+
+def _mac(value):
+    return value.to_bytes(6, 'big')
+
+
+def _ip6(text):
+    return socket.inet_pton(socket.AF_INET6, text)
+
+
+def build_frame(src_mac, dst_mac, src_ip, dst_ip, nxt, payload):
+    eth = _mac(dst_mac) + _mac(src_mac) + struct.pack('!H', fast_packet.ETH_TYPE_IPV6)
+    ip = struct.pack('!IHBB', 6 << 28, len(payload), nxt, 64) + _ip6(src_ip) + _ip6(dst_ip)
+    return eth + ip + payload
+
+
+def make_frames(count, nd_ratio):
+    """生成IPv6帧: TCP、ICMPv6回显请求以及按比例混入的邻居请求"""
+    rng = random.Random(1)
+    frames = []
+    for _ in range(count):
+        src = rng.randrange(1, 4096)
+        dst = rng.randrange(1, 4096)
+        src_ip = f"2001:db8:2:{src >> 8:x}::{src & 0xff:x}"
+        dst_ip = f"2001:db8:1::{dst:x}"
+        roll = rng.random()
+        if roll < nd_ratio:
+            target = _ip6(dst_ip)
+            payload = struct.pack('!BBH4x', 135, 0, 0) + target + struct.pack('!BB', 1, 1) + _mac(src)
+            frames.append(build_frame(src, 0x333300000000 | dst, src_ip,
+                                      'ff02::1:ff00:%x' % dst, 58, payload))
+        elif roll < 0.5:
+            payload = struct.pack('!BBHHH', 128, 0, 0, 1, 1) + b'\x00' * 56
+            frames.append(build_frame(src, dst, src_ip, dst_ip, 58, payload))
+        else:
+            payload = struct.pack('!HHIIBBHHH', 40000, 80, 1, 0, 5 << 4, 2, 65535, 0, 0)
+            frames.append(build_frame(src, dst, src_ip, dst_ip, 6, payload + b'\x00' * 1400))
+    return frames
+
+
+def ryu_path(data):
+    pkt = packet.Packet(data)
+    eth = pkt.get_protocols(ethernet.ethernet)[0]
+    ipv6_pkt = pkt.get_protocol(ipv6.ipv6)
+    icmpv6_pkt = pkt.get_protocol(icmpv6.icmpv6)
+    return (eth.dst, eth.src, eth.ethertype, ipv6_pkt.src, ipv6_pkt.dst,
+            icmpv6_pkt.type_ if icmpv6_pkt else None)
+
+
+def fast_path(data):
+    hdr = fast_packet.parse_headers(data)
+    if hdr.needs_full_parse:
+        packet.Packet(data)
+    return (hdr.dst, hdr.src, hdr.ethertype, hdr.ipv6_src, hdr.ipv6_dst,
+            hdr.icmpv6_type)
+
+
+def run(fn, frames):
+    start = time.perf_counter()
+    for data in frames:
+        fn(data)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='包头解析基准')
+    parser.add_argument('--packets', type=int, default=50000)
+    parser.add_argument('--nd-ratio', type=float, default=0.05,
+                        help='需要回退完整解析的邻居发现包比例')
+    args = parser.parse_args()
+
+    frames = make_frames(args.packets, args.nd_ratio)
+    for data in frames[:1000]:
+        assert ryu_path(data) == fast_path(data)
+
+    ryu_pps = run(ryu_path, frames)
+    fast_pps = run(fast_path, frames)
+    print(f"包数: {len(frames)}, ND比例: {args.nd_ratio:.0%}")
+    print(f"Ryu完整解析: {ryu_pps:>12,.0f} pps")
+    print(f"快速解析:    {fast_pps:>12,.0f} pps ({fast_pps / ryu_pps:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
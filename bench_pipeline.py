@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# 单表与多级流表(DC_PIPELINE=1)对比: 数据中心主机两两互ping(L2) + 外部主机×数据中心主机互ping(L3),
+# 统计全部交换机各表的流表数, 以及冷启动和第二轮(主机均已学习)时的packet-in数与速率
+
+import argparse
+import collections
+import re
+import time
+
+from mininet.log import setLogLevel, info
+
+from datacenter_topo import createDatacenterNet
+from mininet_bench import (EXTERNAL_HOSTS, INTERNAL_HOSTS, cleanup, mesh_pairs, metric,
+                           ping_pairs, setup_hosts, start_controller, stop_controller)
+
+# 数据中心主机的测试地址放在同一/64内, 主机之间走L2转发, 与外部主机之间经边缘路由器L3转发
+TEST_PREFIX = '2001:db8:2::d:'
+CASES = {
+    'flat': {'DC_PIPELINE': '0', 'L3_FLOW_MODE': 'pair'},
+    'pipeline': {'DC_PIPELINE': '1', 'L3_FLOW_MODE': 'host'},
+}
+
+
+def packet_ins():
+    """控制器导出的全部交换机IPv6 packet-in计数"""
+    return metric('ryu_packet_in_total', 'ethertype="0x86dd"')
+
+
+def flow_counts(net):
+    """全部交换机按表号统计的流表数"""
+    counts = collections.Counter()
+    for switch in net.switches:
+        out = switch.cmd(f'ovs-ofctl -O OpenFlow13 dump-flows {switch.name}')
+        for line in out.splitlines():
+            if 'priority=' not in line:
+                continue
+            table = re.search(r'table=(\d+)', line)
+            counts[int(table.group(1)) if table else 0] += 1
+    return counts
+
+
+def ping_matrix(net, external, addresses):
+    """L2全互ping + L3外部×内部ping, 返回(成功对数, 总对数, 耗时)"""
+    pairs = mesh_pairs(external, addresses)
+    start = time.time()
+    ok = ping_pairs(net, pairs)
+    return ok, len(pairs), time.time() - start
+
+
+def run_case(name, args):
+    info(f"*** {name}: {CASES[name]}\n")
+    cleanup()
+    controller = start_controller(f'pipeline_{name}.log', **CASES[name])
+    net = None
+    rounds = []
+    try:
+        net = createDatacenterNet()
+        external = EXTERNAL_HOSTS[:args.external]
+        addresses = setup_hosts(net, INTERNAL_HOSTS[:args.internal], TEST_PREFIX)
+        for _ in range(2):
+            before = packet_ins()
+            ok, total, elapsed = ping_matrix(net, external, addresses)
+            rounds.append((ok, total, packet_ins() - before, elapsed))
+        flows = flow_counts(net)
+    finally:
+        if net is not None:
+            net.stop()
+        stop_controller(controller)
+    for label, (ok, total, count, elapsed) in zip(('冷启动', '第二轮'), rounds):
+        info(f"    {label}: 连通{ok}/{total}对, packet-in {count}个 ({count / elapsed:.1f}个/秒)\n")
+    info(f"    流表: {dict(sorted(flows.items()))} 共{sum(flows.values())}条\n")
+    return flows, rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='单表与多级流表的流表数和packet-in对比')
+    parser.add_argument('--external', type=int, default=len(EXTERNAL_HOSTS))
+    parser.add_argument('--internal', type=int, default=len(INTERNAL_HOSTS))
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    results = {name: run_case(name, args) for name in CASES}
+    info(f"*** {args.internal}台数据中心主机, {args.external}台外部主机\n")
+    for name, (flows, rounds) in results.items():
+        info(f"    {name:<9} 流表{sum(flows.values()):>5}条  "
+             f"packet-in 冷启动{rounds[0][2]:>5}个 第二轮{rounds[1][2]:>5}个\n")
+
+
+if __name__ == '__main__':
+    main()
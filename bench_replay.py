@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# packet-in轨迹回放: 把PACKET_TRACE录制的轨迹按原速、N倍速或尽快回放到控制器应用
+# (模拟交换机, 不需要Mininet/OVS), 统计与bench_controller.py相同的指标并可跨提交对比:
+#   python3 bench_replay.py storm.trace --speed 0 -o head.json
+#   python3 bench_replay.py storm.trace --app all --speed 4 --compare base.json
+
+import argparse
+import json
+import logging
+import sys
+
+from controller_harness import APPS, Harness, create_app, packet_in_bytes, run_isolated, save_report
+from packet_trace import TraceReplayer, read_trace
+
+
+def run_app(name, args):
+    """在当前进程中把轨迹回放到一个应用, 返回结果字典"""
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    harness = Harness(create_app(name, args.env), flush_every=args.flush_every)
+    xid = [0]
+
+    def deliver(record):
+        xid[0] = (xid[0] + 1) & 0xffffffff
+        harness.packet_in(record.dpid, packet_in_bytes(
+            xid[0], record.in_port, record.data, buffer_id=record.buffer_id,
+            total_len=record.total_len, reason=record.reason, table_id=record.table_id))
+
+    records = read_trace(args.trace)
+    if args.warmup:
+        TraceReplayer(speed=0).run(records, deliver, limit=args.warmup)
+    harness.reset()
+    replay = TraceReplayer(speed=args.speed).run(records, deliver, limit=args.limit)
+    result = harness.results(replay['elapsed'])
+    result.update(trace_seconds=replay['trace_seconds'], max_lag_ms=replay['max_lag'] * 1e3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='packet-in轨迹离线回放')
+    parser.add_argument('trace', help='PACKET_TRACE录制的轨迹文件')
+    parser.add_argument('--app', default='datacenter',
+                        help=f'{"/".join(APPS)}/all, 或"模块:类名"')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='回放速度: 1为原速, N为N倍速, 0为尽快')
+    parser.add_argument('--warmup', type=int, default=0, help='尽快回放且不计入统计的前N个packet-in')
+    parser.add_argument('--limit', type=int, default=0, help='最多回放的packet-in数(0为全部)')
+    parser.add_argument('--flush-every', type=int, default=16,
+                        help='每N个packet-in刷新一次发送队列')
+    parser.add_argument('--env', action='append', default=[],
+                        help='创建应用前设置的环境变量, 如 --env FLOW_CACHE=1')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('-o', '--output', help='结果JSON文件')
+    parser.add_argument('--compare', help='作为基线的结果JSON文件')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(run_app(args.app, args), sys.stdout)
+        return
+
+    results = run_isolated(__file__, sys.argv[1:], APPS if args.app == 'all' else [args.app])
+    for name, result in results.items():
+        print(f"{name:<11} 轨迹{result['trace_seconds']:.1f}秒, 最大落后{result['max_lag_ms']:.1f}ms")
+    workload = {key: getattr(args, key) for key in
+                ('trace', 'speed', 'warmup', 'limit', 'flush_every', 'env')}
+    save_report(args.output, workload, results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# 流量清洗基准: 把外部网络(2001:db8:1::/64)标记为可疑前缀, 外部主机h6/h7/h8向数据中心内主机
+# 发送iperf流量, 分别使用1/2/3台清洗服务器(h5a/h5b/h5c)时测量总吞吐
+#
+# 清洗服务器接入链路限速为--bw, 边缘路由器的SELECT组按流哈希把流量分担到健康的清洗服务器,
+# 总吞吐应随清洗服务器数近似线性增长。清洗服务器只开启IPv6转发, 把流量路由回网关。
+
+import argparse
+import time
+
+from mininet.log import setLogLevel, info
+
+from datacenter_topo import createDatacenterNet
+from mininet_bench import (EXTERNAL_GATEWAY, GATEWAY, cleanup, setup_hosts, start_controller,
+                           stop_controller)
+
+SCRUBBERS = [('h5a', '00:00:00:00:05:01', '2001:db8:2:5::1'),
+             ('h5b', '00:00:00:00:05:02', '2001:db8:2:5::2'),
+             ('h5c', '00:00:00:00:05:03', '2001:db8:2:5::3')]
+# (外部源主机, 数据中心目的主机)
+PAIRS = [('h6', 'h1a'), ('h7', 'h2a'), ('h8', 'h3a')]
+# 目的主机的测试地址放在控制器的数据中心子网(2001:db8:2::/64)内, 走边缘路由器的L3转发
+TEST_PREFIX = '2001:db8:2::b:'
+
+
+def setup_scrubbers(net, scrubbers):
+    """清洗服务器开启转发并经网关回送"""
+    for name, _, _ in SCRUBBERS[:scrubbers]:
+        host = net.get(name)
+        intf = host.defaultIntf()
+        host.cmd('sysctl -qw net.ipv6.conf.all.forwarding=1')
+        host.cmd(f'sysctl -qw net.ipv6.conf.{intf}.accept_redirects=0')
+        host.cmd(f'ip -6 route replace default via {GATEWAY} dev {intf} onlink')
+        # 让控制器学到清洗服务器的位置
+        host.cmd(f'ping6 -c 2 -i 0.2 {GATEWAY}')
+
+
+def warm_up(net):
+    """由数据中心一侧先发起通信, 边缘路由器据此安装双向L3流表"""
+    for src, dst in PAIRS:
+        net.get(src).cmd(f'ping6 -c 2 -i 0.2 {EXTERNAL_GATEWAY}')
+        net.get(dst).cmd(f'ping6 -c 2 -i 0.2 {GATEWAY}')
+    for src, dst in PAIRS:
+        src_ip = net.get(src).params['ip'].split('/')[0]
+        net.get(dst).cmd(f'ping6 -c 3 -i 0.2 {src_ip}')
+
+
+def run_iperf(net, addresses, duration, parallel):
+    """并发运行全部iperf客户端, 返回每对主机的吞吐(Mbit/s)"""
+    for _, dst in PAIRS:
+        net.get(dst).cmd('iperf -s -V > /dev/null 2>&1 &')
+    time.sleep(1)
+
+    clients = []
+    for src, dst in PAIRS:
+        clients.append(net.get(src).popen(
+            ['iperf', '-V', '-c', addresses[dst], '-t', str(duration),
+             '-P', str(parallel), '-y', 'C']))
+
+    results = []
+    for proc in clients:
+        out, _ = proc.communicate()
+        lines = [line.split(',') for line in out.decode().splitlines()
+                 if line.count(',') >= 8]
+        # 多条并行流时最后一行(ID为-1)是合计
+        total = [fields for fields in lines if fields[5] == '-1'] or lines[-1:]
+        results.append(int(total[0][8]) / 1e6 if total else 0.0)
+
+    for _, dst in PAIRS:
+        net.get(dst).cmd('kill %iperf')
+    return results
+
+
+def run_case(scrubbers, args):
+    info(f"*** {scrubbers}台清洗服务器\n")
+    cleanup()
+    servers = ','.join(f'{mac}={ip}' for _, mac, ip in SCRUBBERS[:scrubbers])
+    controller = start_controller(f'scrubbing_{scrubbers}.log',
+                                  SCRUB_PREFIXES='2001:db8:1::/64', SCRUB_SERVERS=servers)
+    net = None
+    try:
+        net = createDatacenterNet(scrubber_bw=args.bw)
+        setup_scrubbers(net, scrubbers)
+        addresses = setup_hosts(net, [dst for _, dst in PAIRS], TEST_PREFIX)
+        warm_up(net)
+        # 等待健康检查把清洗服务器加入SELECT组
+        time.sleep(args.probe_wait)
+        results = run_iperf(net, addresses, args.duration, args.parallel)
+    finally:
+        if net is not None:
+            net.stop()
+        stop_controller(controller)
+    for (src, dst), mbps in zip(PAIRS, results):
+        info(f"    {src} -> {dst}: {mbps:.1f} Mbit/s\n")
+    return sum(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='清洗服务器数量与清洗吞吐基准')
+    parser.add_argument('--bw', type=float, default=10, help='清洗服务器接入链路带宽(Mbit/s)')
+    parser.add_argument('--duration', type=int, default=20, help='iperf时长(秒)')
+    parser.add_argument('--parallel', type=int, default=4, help='每对主机的并行TCP流数')
+    parser.add_argument('--probe-wait', type=float, default=8, help='开始测量前等待健康检查的秒数')
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    totals = {n: run_case(n, args) for n in (1, 2, 3)}
+    for n, total in totals.items():
+        info(f"*** {n}台清洗服务器: 总吞吐{total:.1f} Mbit/s "
+             f"({total / totals[1] if totals[1] else 0:.2f}x)\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# 分片控制器扩展性基准(离线): N个worker进程各运行一个IPv6DatacenterController分片
+# (SHARD_INDEX/SHARD_COUNT), 每个worker连接全部模拟交换机, packet-in只投递给交换机的MASTER,
+# 邻居表等共享状态经真实的本机UDP总线复制。所有worker同时开始, 总吞吐为总packet-in数除以
+# 最慢worker的耗时, 与单进程(不分片)相比给出加速比和并行效率:
+#   python3 bench_shard.py --workers 1,2,4,8 --switches 64 -o shard.json
+# 加速比受分区均衡度限制(边缘路由器上的跨子网流量只能由一个worker处理), 一并输出分区上限
+
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from bench_controller import EDGE_DPID, make_workload
+from controller_harness import Harness, create_app, packet_in_bytes, save_report
+
+
+def settle(harness, timeout=10.0):
+    """反复收发总线消息, 直到全部worker互相看到对方连接了全部交换机"""
+    shard = harness.app.shard
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        harness.flush()
+        if (len(shard.members) == shard.count and
+                all(shard.peer_dpids.get(member) == frozenset(shard.datapaths)
+                    for member in shard.members if member != shard.index)):
+            # 其他worker可能还没收到本worker完整的dpid列表, 离开前再发一次
+            shard.dpids_changed = True
+            harness.flush()
+            return
+        time.sleep(shard.heartbeat / 5)
+    raise RuntimeError(f'worker {shard.index} 等待其他worker超时')
+
+
+def worker(index, count, args, barrier, results):
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    env = list(args.env)
+    if count > 1:
+        env += [f'SHARD_INDEX={index}', f'SHARD_COUNT={count}', f'SHARD_BUS_PORT={args.bus_port}']
+    harness = Harness(create_app('datacenter', env), flush_every=args.flush_every)
+    for dpid in range(1, args.switches + 1):
+        harness.datapath(dpid)
+    shard = harness.app.shard
+    if shard is not None:
+        shard.heartbeat = 0.1  # 加快启动时的成员发现
+        settle(harness)
+
+    # 全部worker生成相同的负载, 各自只处理自己负责的交换机上的packet-in
+    raw = [(dpid, packet_in_bytes(i & 0xffffffff, port, data))
+           for i, (dpid, port, data) in enumerate(make_workload(args))]
+    if shard is not None:
+        raw = [item for item in raw if shard.is_master(item[0])]
+    warmup = raw[:args.warmup * len(raw) // (args.warmup + args.packets)]
+    for dpid, buf in warmup:
+        harness.packet_in(dpid, buf)
+    harness.reset()
+
+    barrier.wait(args.timeout)
+    start = time.perf_counter()
+    for dpid, buf in raw[len(warmup):]:
+        harness.packet_in(dpid, buf)
+    harness.flush()
+    elapsed = time.perf_counter() - start
+    result = harness.results(elapsed)
+    result['elapsed'] = elapsed
+    result['masters'] = sum(1 for dpid in harness.datapaths
+                            if shard is None or shard.is_master(dpid))
+    if shard is not None:
+        # 让其他worker收完最后一批状态再统计复制的邻居表项
+        barrier.wait(args.timeout)
+        time.sleep(0.2)
+        shard.poll()
+        result.update(shard.get_stats())
+    result['nd_entries'] = len(harness.app.nd_table)
+    results.put((index, result))
+
+
+def collect(procs, results, timeout):
+    """收集每个worker的结果; 有worker异常退出或超时未返回时终止全部worker并退出"""
+    per_worker = {}
+    deadline = time.monotonic() + timeout
+    while len(per_worker) < len(procs):
+        try:
+            index, result = results.get(timeout=1.0)
+            per_worker[index] = result
+            continue
+        except queue.Empty:
+            pass
+        failed = {index: proc.exitcode for index, proc in enumerate(procs)
+                  if index not in per_worker and proc.exitcode is not None}
+        if failed:
+            error = '; '.join(f'worker {index}退出码{code}' for index, code in sorted(failed.items()))
+        elif time.monotonic() > deadline:
+            missing = [index for index in range(len(procs)) if index not in per_worker]
+            error = f'worker {missing} 超过{timeout:.0f}秒没有返回结果'
+        else:
+            continue
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+        sys.exit(f'分片基准失败: {error}')
+    return per_worker
+
+
+def run(count, args):
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(count)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(index, count, args, barrier, results))
+             for index in range(count)]
+    for proc in procs:
+        proc.start()
+    per_worker = collect(procs, results, args.timeout)
+    for proc in procs:
+        proc.join()
+    packet_ins = sum(result['packet_ins'] for result in per_worker.values())
+    elapsed = max(result['elapsed'] for result in per_worker.values())
+    return {
+        'packet_ins': packet_ins,
+        'packet_ins_per_sec': packet_ins / elapsed if elapsed else 0.0,
+        # 分区上限: 负载最重的worker决定总耗时
+        'partition_bound': packet_ins / max(result['packet_ins'] for result in per_worker.values()),
+        'latency_p99_us': max(result['latency_p99_us'] for result in per_worker.values()),
+        'flow_mods': sum(result['flow_mods'] for result in per_worker.values()),
+        'bus_sent': sum(result.get('bus_sent', 0) for result in per_worker.values()),
+        'nd_entries_min': min(result['nd_entries'] for result in per_worker.values()),
+        'peak_rss_mib': max(result['peak_rss_mib'] for result in per_worker.values()),
+        'workers': {index: {key: per_worker[index][key]
+                            for key in ('packet_ins', 'masters', 'elapsed')}
+                    for index in sorted(per_worker)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分片控制器1..N个worker的离线扩展性基准')
+    parser.add_argument('--workers', default='1,2,4', help='逗号分隔的worker数')
+    parser.add_argument('--packets', type=int, default=200000, help='全部worker合计的packet-in数')
+    parser.add_argument('--warmup', type=int, default=4000)
+    parser.add_argument('--macs', type=int, default=4000, help='数据中心主机MAC数')
+    parser.add_argument('--cross', type=float, default=0.05, help='跨子网IPv6包占比')
+    parser.add_argument('--nd', type=float, default=0.05, help='邻居请求占比')
+    parser.add_argument('--switches', type=int, default=64)
+    parser.add_argument('--flush-every', type=int, default=16,
+                        help='每N个packet-in刷新一次发送队列和分片总线')
+    parser.add_argument('--bus-port', type=int, default=6700, help='分片总线起始端口')
+    parser.add_argument('--timeout', type=float, default=600.0,
+                        help='等待worker同步和返回结果的最长秒数')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--env', action='append', default=[],
+                        help='创建应用前设置的环境变量, 如 --env FLOW_CACHE=1')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('-o', '--output', help='结果JSON文件')
+    parser.add_argument('--compare', help='作为基线的结果JSON文件')
+    args = parser.parse_args()
+    if args.switches < EDGE_DPID and args.cross:
+        parser.error(f'跨子网流量需要边缘路由器(dpid={EDGE_DPID}), --switches至少为{EDGE_DPID}')
+    # 加速比以单进程(不分片)为基准
+    counts = sorted({1} | {int(count) for count in args.workers.split(',')})
+    if max(counts) > os.cpu_count():
+        print(f'*** 注意: 只有{os.cpu_count()}个CPU核, 超出部分的worker无法并行')
+
+    results = {}
+    for count in counts:
+        result = run(count, args)
+        base = results['1w']['packet_ins_per_sec'] if results else result['packet_ins_per_sec']
+        result['speedup'] = result['packet_ins_per_sec'] / base if base else 0.0
+        result['efficiency'] = result['speedup'] / count
+        results[f'{count}w'] = result
+        print(f"{count:>2}个worker {result['packet_ins_per_sec']:>10,.0f} packet-in/秒  "
+              f"加速比 {result['speedup']:>5.2f} (分区上限 {result['partition_bound']:>5.2f})  "
+              f"效率 {result['efficiency']:>6.1%}  p99 {result['latency_p99_us']:>8.1f}us  "
+              f"总线消息 {result['bus_sent']:>6}  邻居表最少 {result['nd_entries_min']}项")
+    workload = {key: getattr(args, key) for key in
+                ('workers', 'packets', 'warmup', 'macs', 'cross', 'nd', 'switches',
+                 'flush_every', 'seed', 'env')}
+    save_report(args.output, workload, results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# 子网查找微基准: 对比线性扫描与最长前缀匹配索引在不同前缀数量下的每秒查找次数
+
+import argparse
+import ipaddress
+import random
+import time
+
+from subnet_index import SubnetIndex
+
+
+def make_subnets(count):
+    """生成count个租户/64前缀, 外加若干/48聚合前缀"""
+    subnets = [f"2001:db8:{i >> 16:x}:{i & 0xffff:x}::/64" for i in range(count)]
+    subnets += [f"2001:db8:{i:x}::/48" for i in range(max(1, count // 256) + 1)]
+    return subnets
+
+
+def make_addresses(subnets, count, distinct):
+    rng = random.Random(1)
+    pool = []
+    for _ in range(distinct):
+        net = ipaddress.ip_network(rng.choice(subnets))
+        host = rng.randrange(1, 1 << 16)
+        pool.append(str(net.network_address + host))
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def linear_lookup(subnets, ip):
+    """原控制器实现: 每次重建网络对象并线性扫描"""
+    try:
+        ip_addr = ipaddress.ip_address(ip)
+        for subnet in subnets:
+            if ip_addr in ipaddress.ip_network(subnet):
+                return subnet
+        return None
+    except ValueError:
+        return None
+
+
+def run(fn, addrs):
+    start = time.perf_counter()
+    for ip in addrs:
+        fn(ip)
+    return len(addrs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='子网查找微基准')
+    parser.add_argument('--prefixes', type=int, nargs='+',
+                        default=[2, 16, 128, 512, 2048])
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=1000,
+                        help='不同地址数量(影响缓存命中率)')
+    args = parser.parse_args()
+
+    print(f"{'前缀数':>8} {'线性扫描/s':>14} {'索引(无缓存)/s':>16} {'索引(缓存)/s':>14}")
+    for count in args.prefixes:
+        subnets = make_subnets(count)
+        addrs = make_addresses(subnets, args.lookups, args.distinct)
+
+        # 线性扫描随前缀数线性变慢, 限制样本数以控制运行时间
+        linear_addrs = addrs[:max(200, args.lookups * 16 // len(subnets))]
+        linear = run(lambda ip: linear_lookup(subnets, ip), linear_addrs)
+
+        nomemo = SubnetIndex(subnets, memo_size=0)
+        memo = SubnetIndex(subnets)
+        for ip in linear_addrs:
+            assert nomemo.lookup(ip) == memo.lookup(ip)
+
+        print(f"{len(subnets):>8} {linear:>14,.0f} {run(nomemo.lookup, addrs):>16,.0f} "
+              f"{run(memo.lookup, addrs):>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# 表内存基准: 对比字符串字典与整数编码老化表在大量表项下的内存占用和写入速度
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from host_tables import MacTable, NeighborTable
+
+
+def addresses(count):
+    for i in range(count):
+        yield (f"2001:db8:{(i >> 32) & 0xffff:x}:{(i >> 16) & 0xffff:x}::{i & 0xffff:x}",
+               '02:%02x:%02x:%02x:%02x:%02x' % ((i >> 32) & 0xff, (i >> 24) & 0xff,
+                                               (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff))
+
+
+def measure(name, factory, fill, count):
+    """写入速度和内存占用分两次测量, 避免tracemalloc拖慢计时"""
+    table = factory()
+    start = time.perf_counter()
+    fill(table)
+    elapsed = time.perf_counter() - start
+    del table
+
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    table = factory()
+    fill(table)
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    print(f"{name:<28} {used / 2 ** 20:>9.1f} MiB {used / count:>9.1f} B/项 "
+          f"{count / elapsed:>12,.0f} 项/s")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MAC表/邻居表内存基准')
+    parser.add_argument('--entries', type=int, default=1000000)
+    args = parser.parse_args()
+    count = args.entries
+
+    print(f"表项数: {count}")
+
+    # 地址字符串在写入时生成, 与packet-in解析得到的字符串一样由表决定是否保留
+    def fill_nd(table):
+        for ip, mac in addresses(count):
+            table[ip] = mac
+
+    measure('邻居表 dict[str, str]', dict, fill_nd, count)
+    measure('邻居表 NeighborTable', lambda: NeighborTable(count, 300), fill_nd, count)
+
+    def fill_mac(table):
+        for i, (_, mac) in enumerate(addresses(count)):
+            table[mac] = i & 0xff
+
+    measure('MAC表 dict[str, int]', dict, fill_mac, count)
+    measure('MAC表 MacTable', lambda: MacTable(count, 300), fill_mac, count)
+
+    # 超出容量时按LRU淘汰, 占用保持在容量上限
+    table = measure('邻居表 NeighborTable(容量10%)',
+                    lambda: NeighborTable(count // 10, 300), fill_nd, count)
+    print(f"  淘汰统计: {table.get_stats()}")
+
+
+if __name__ == '__main__':
+    main()
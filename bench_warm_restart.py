@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# 控制器热重启对比: 网络学习完成后重启ryu-manager, 交换机保留原有流表、主机持续互ping,
+# 统计新控制器启动后前30秒内的packet-in数; 冷启动(不设WARM_RESTART)与热重启(快照+流表核对)各测一次
+
+import argparse
+import os
+import subprocess
+import time
+
+from mininet.log import setLogLevel, info
+
+from datacenter_topo import createDatacenterNet
+from mininet_bench import (EXTERNAL_HOSTS, INTERNAL_HOSTS, cleanup, mesh_pairs, metric,
+                           ping_pairs, setup_hosts, start_controller, stop_controller)
+
+# 数据中心主机的测试地址放在同一/64内, 主机之间走L2转发, 与外部主机之间经边缘路由器L3转发
+TEST_PREFIX = '2001:db8:2::e:'
+SNAPSHOT = '/tmp/bench_warm_restart.snap'
+
+
+def run_case(name, args):
+    info(f"*** {name}\n")
+    cleanup()
+    if os.path.exists(SNAPSHOT):
+        os.remove(SNAPSHOT)
+    env = {}
+    if name == 'warm':
+        env.update(WARM_RESTART=SNAPSHOT, WARM_RESTART_INTERVAL=str(args.snapshot_interval))
+    log_path = f'warm_restart_{name}.log'
+    controller = start_controller(log_path, **env)
+    net = None
+    try:
+        net = createDatacenterNet()
+        external = EXTERNAL_HOSTS[:args.external]
+        addresses = setup_hosts(net, INTERNAL_HOSTS[:args.internal], TEST_PREFIX)
+        targets = mesh_pairs(external, addresses)
+        learned = ping_pairs(net, targets)
+        # 等待至少一次快照覆盖学习结果
+        time.sleep(args.snapshot_interval + 1)
+        stop_controller(controller)
+
+        # 控制器停机期间主机邻居缓存过期, 重启后所有主机对持续互ping
+        for host in net.hosts:
+            host.cmd('ip -6 neigh flush all')
+        for src, address in targets:
+            net.get(src).cmd(f'ping6 -i {args.interval} -w {args.window} {address} '
+                             f'> /dev/null 2>&1 &')
+        # 重启后的日志追加到同一文件, 统计窗口结束时确认新控制器仍在运行
+        controller = start_controller(log_path, wait=args.window, append=True, **env)
+        packet_ins = metric('ryu_packet_in_total')
+        reconcile = {event: metric('ryu_warm_restart_total', f'event="{event}"')
+                     for event in ('kept', 'adopted', 'deleted')} if name == 'warm' else {}
+        subprocess.call(['pkill', '-f', f'ping6 -i {args.interval}'])
+        reachable = ping_pairs(net, targets)
+    finally:
+        if net is not None:
+            net.stop()
+        stop_controller(controller)
+    info(f"    重启前连通{learned}/{len(targets)}对, 重启后{args.window}秒内packet-in {packet_ins}个, "
+         f"之后连通{reachable}/{len(targets)}对\n")
+    if reconcile:
+        info(f"    流表核对: {reconcile}\n")
+    return packet_ins, reachable, len(targets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='控制器冷启动与热重启后的packet-in对比')
+    parser.add_argument('--window', type=int, default=30, help='重启后的统计窗口(秒)')
+    parser.add_argument('--interval', type=float, default=0.5, help='后台ping间隔(秒)')
+    parser.add_argument('--snapshot-interval', type=float, default=2.0)
+    parser.add_argument('--external', type=int, default=len(EXTERNAL_HOSTS))
+    parser.add_argument('--internal', type=int, default=len(INTERNAL_HOSTS))
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    results = {name: run_case(name, args) for name in ('cold', 'warm')}
+    info(f"*** 重启后{args.window}秒内的packet-in\n")
+    for name, (packet_ins, reachable, total) in results.items():
+        info(f"    {name:<5} packet-in{packet_ins:>6}个  之后连通{reachable}/{total}对\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import inspect
+import time
+
+from ryu.controller import ofp_event
+from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_3_parser
+from ryu.ofproto.ofproto_parser import MsgBase
+
+
+def packet_in_max_len(ofproto, n_buffers, miss_len):
+    """上送控制器动作的max_len: 启用截断且交换机有缓存时为miss_len, 否则上送完整帧"""
+    if miss_len and n_buffers:
+        return miss_len
+    return ofproto.OFPCML_NO_BUFFER
+
+
+def received_message_events(parser=ofproto_v1_3_parser):
+    """parser模块中packet-in以外全部消息类对应的ryu事件类, 供统计接收字节的处理函数注册
+
+    请求类消息不会从交换机收到, 注册了也不会触发; packet-in由ChannelStats.packet_in单独统计。
+    """
+    return [ofp_event.ofp_msg_to_ev_cls(cls)
+            for _, cls in inspect.getmembers(parser, inspect.isclass)
+            if issubclass(cls, MsgBase) and cls.__module__ == parser.__name__
+            and cls is not parser.OFPPacketIn]
+
+
+RX_EVENTS = received_message_events()
+
+
+class ChannelStats(object):
+    """控制通道字节计数
+
+    按dpid统计控制器收发的OpenFlow字节数(接收方向包括packet-in、统计应答、
+    Barrier应答、错误等全部消息), 以及packet-in截断(交换机缓存原始帧)
+    节省的字节数: 上行为帧长减去上送部分, 下行为按buffer_id释放而不必回传的帧长。
+    后台循环每interval秒计算一次每秒速率。
+    """
+
+    FIELDS = ('rx_bytes', 'tx_bytes', 'rx_saved', 'tx_saved', 'packet_ins', 'buffered')
+
+    def __init__(self, logger, interval=5.0, clock=time.monotonic):
+        self.logger = logger
+        self.interval = interval
+        self.clock = clock
+        self.counters = {}   # dpid -> {字段: 累计值}
+        self.rates = {}      # dpid -> {字段: 每秒速率}
+        self._last = {}      # dpid -> 上次计算速率时的累计值
+        self._last_time = clock()
+
+    def run(self):
+        """后台速率计算循环, 由应用通过hub.spawn启动"""
+        while True:
+            hub.sleep(self.interval)
+            self.update_rates()
+
+    def _get(self, dpid):
+        counters = self.counters.get(dpid)
+        if counters is None:
+            counters = self.counters[dpid] = dict.fromkeys(self.FIELDS, 0)
+        return counters
+
+    def packet_in(self, msg):
+        """记录一个packet-in; 带buffer_id的包之后由交换机缓存释放, 不再回传帧数据"""
+        counters = self._get(msg.datapath.id)
+        counters['packet_ins'] += 1
+        counters['rx_bytes'] += len(msg.buf)
+        counters['rx_saved'] += msg.total_len - len(msg.data)
+        if msg.buffer_id != msg.datapath.ofproto.OFP_NO_BUFFER:
+            counters['buffered'] += 1
+            counters['tx_saved'] += msg.total_len
+
+    def received(self, msg):
+        """记录packet-in以外的一条接收消息; 握手阶段还没有dpid的消息不计"""
+        if msg.datapath.id is not None:
+            self._get(msg.datapath.id)['rx_bytes'] += len(msg.buf)
+
+    def sent(self, dpid, nbytes):
+        self._get(dpid)['tx_bytes'] += nbytes
+
+    def update_rates(self):
+        now = self.clock()
+        elapsed = now - self._last_time
+        if elapsed <= 0:
+            return
+        for dpid, counters in self.counters.items():
+            last = self._last.get(dpid, {})
+            self.rates[dpid] = {field: (value - last.get(field, 0)) / elapsed
+                                for field, value in counters.items()}
+            self._last[dpid] = dict(counters)
+        self._last_time = now
+
+        rx = sum(rates['rx_bytes'] for rates in self.rates.values())
+        tx = sum(rates['tx_bytes'] for rates in self.rates.values())
+        saved = sum(rates['rx_saved'] + rates['tx_saved'] for rates in self.rates.values())
+        if rx or tx:
+            self.logger.debug(f"控制通道: 收{rx / 1024:.1f}KiB/s 发{tx / 1024:.1f}KiB/s "
+                              f"截断节省{saved / 1024:.1f}KiB/s")
+
+    def remove(self, dpid):
+        self.counters.pop(dpid, None)
+        self.rates.pop(dpid, None)
+        self._last.pop(dpid, None)
+
+    def get_stats(self):
+        """返回每个dpid的累计字节数和最近一个周期的每秒速率"""
+        return {dpid: {'total': dict(counters),
+                       'per_second': dict(self.rates.get(dpid, {}))}
+                for dpid, counters in self.counters.items()}
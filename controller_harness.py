@@ -0,0 +1,242 @@
+import importlib
+import json
+import os
+import resource
+import struct
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from ryu.app.wsgi import WSGIApplication
+from ryu.controller import ofp_event
+from ryu.controller.handler import MAIN_DISPATCHER
+from ryu.ofproto import ofproto_parser, ofproto_v1_3, ofproto_v1_3_parser
+
+APPS = {
+    'datacenter': ('datacenter_controller', 'IPv6DatacenterController'),
+    'simple': ('simple_switch', 'SimpleSwitch13'),
+}
+PORTS_PER_SWITCH = 48
+# 越大越好的指标; 其余(延迟、消息数、内存)越小越好
+HIGHER_IS_BETTER = {'packet_ins_per_sec'}
+
+
+class SimulatedDatapath(object):
+    """代替ryu Datapath的本地交换机: 不建立连接, 记录控制器发出的消息类型和字节数"""
+
+    def __init__(self, dpid, record=False):
+        self.id = dpid
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.is_active = True
+        self.xid = 0
+        self.sent = Counter()     # 消息类名 -> 数量
+        self.sent_bytes = 0
+        self.barriers = []        # 待应答的BarrierRequest xid
+        self.messages = [] if record else None  # record时按发送顺序保存消息对象(供测试检查)
+
+    def set_xid(self, msg):
+        self.xid = (self.xid + 1) & 0xffffffff
+        msg.set_xid(self.xid)
+        self.sent[type(msg).__name__] += 1
+        if self.messages is not None:
+            self.messages.append(msg)
+        if msg.cls_msg_type == self.ofproto.OFPT_BARRIER_REQUEST:
+            self.barriers.append(self.xid)
+        return self.xid
+
+    def send(self, buf):
+        self.sent_bytes += len(buf)
+        return True
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        return self.send(msg.buf)
+
+
+def packet_in_bytes(xid, in_port, data, buffer_id=ofproto_v1_3.OFP_NO_BUFFER, total_len=None,
+                    reason=ofproto_v1_3.OFPR_NO_MATCH, table_id=0):
+    """OpenFlow 1.3 PACKET_IN报文, 匹配字段只有in_port"""
+    match = struct.pack('!HHII4x', ofproto_v1_3.OFPMT_OXM, 12, 0x80000004, in_port)
+    body = struct.pack('!IHBBQ', buffer_id, len(data) if total_len is None else total_len,
+                       reason, table_id, 0) + match + bytes(2) + data
+    return struct.pack('!BBHI', ofproto_v1_3.OFP_VERSION, ofproto_v1_3.OFPT_PACKET_IN,
+                       8 + len(body), xid) + body
+
+
+def create_app(name, env=()):
+    """按名称(APPS中的键或"模块:类名")创建应用, env为创建前设置的"KEY=VALUE"环境变量"""
+    for item in env:
+        key, _, value = item.partition('=')
+        os.environ[key] = value
+    module, cls = APPS[name] if name in APPS else name.split(':', 1)
+    return getattr(importlib.import_module(module), cls)(wsgi=WSGIApplication())
+
+
+class Harness(object):
+    """离线运行一个控制器应用
+
+    交换机在第一次出现时按ryu的连接顺序投递SwitchFeatures、MAIN状态和端口列表
+    (端口视为已确认的边缘端口)。packet-in报文经ryu解析器生成事件后直接调用应用的
+    处理函数, 每flush_every个packet-in刷新一次批量发送队列(相当于后台刷新循环)并
+    立即应答Barrier。分片应用(SHARD_COUNT>1)的总线消息也在刷新时收发。
+    """
+
+    def __init__(self, app, flush_every=16, ports=PORTS_PER_SWITCH, record=False):
+        self.app = app
+        self.flush_every = flush_every
+        self.ports = ports
+        self.record = record
+        self.datapaths = {}
+        self.latencies = []
+        self.delivered = 0
+        self.setup_flow_mods = 0
+        self.baseline = {}        # dpid -> reset()时的已发送消息计数
+
+    def datapath(self, dpid):
+        dp = self.datapaths.get(dpid)
+        if dp is None:
+            dp = self.datapaths[dpid] = SimulatedDatapath(dpid, record=self.record)
+            self._connect(dp)
+            self.flush()
+            self.setup_flow_mods += dp.sent['OFPFlowMod']
+        return dp
+
+    def _connect(self, dp):
+        app = self.app
+        parser = dp.ofproto_parser
+        features = parser.OFPSwitchFeatures(dp, datapath_id=dp.id, n_buffers=0, n_tables=254,
+                                            auxiliary_id=0, capabilities=0)
+        app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(features))
+        state = ofp_event.EventOFPStateChange(dp)
+        state.state = MAIN_DISPATCHER
+        app._state_change_handler(state)
+        reply = parser.OFPPortDescStatsReply(dp)
+        reply.body = [parser.OFPPort(port_no=port,
+                                     hw_addr=f'0a:00:00:{dp.id & 0xff:02x}:{port >> 8 & 0xff:02x}:'
+                                             f'{port & 0xff:02x}',
+                                     name=f's{dp.id}-eth{port}'.encode(), config=0, state=0,
+                                     curr=0, advertised=0, supported=0, peer=0,
+                                     curr_speed=0, max_speed=0)
+                      for port in range(1, self.ports + 1)]
+        app._port_desc_stats_reply_handler(ofp_event.EventOFPPortDescStatsReply(reply))
+        flood_tree = app.flood_tree
+        ports = flood_tree.ports.get(dp.id, {})
+        for port in ports:
+            ports[port] = flood_tree.settle_probes
+        flood_tree.update()
+
+    def flush(self):
+        shard = getattr(self.app, 'shard', None)
+        if shard is not None:
+            # 没有事件循环, 由刷新代替分片总线的发布和接收循环
+            shard.flush()
+            shard.poll()
+        self.app.flow_batcher.flush_all()
+        for dp in self.datapaths.values():
+            for xid in dp.barriers:
+                reply = dp.ofproto_parser.OFPBarrierReply(dp)
+                reply.xid = xid
+                self.app._barrier_reply_handler(ofp_event.EventOFPBarrierReply(reply))
+            dp.barriers.clear()
+
+    def packet_in(self, dpid, buf, clock=time.perf_counter):
+        """解析一个PACKET_IN报文并交给应用处理, 记录处理函数耗时"""
+        dp = self.datapath(dpid)
+        version, msg_type, msg_len, xid = struct.unpack_from('!BBHI', buf)
+        ev = ofp_event.ofp_msg_to_ev(ofproto_parser.msg(dp, version, msg_type, msg_len, xid, buf))
+        t = clock()
+        self.app._packet_in_handler(ev)
+        self.latencies.append(clock() - t)
+        self.delivered += 1
+        if self.delivered % self.flush_every == 0:
+            self.flush()
+
+    def reset(self):
+        """预热结束: 清空延迟样本, 之后的消息计数从当前值起算"""
+        self.flush()
+        self.latencies = []
+        self.baseline = {dpid: Counter(dp.sent) for dpid, dp in self.datapaths.items()}
+
+    def results(self, elapsed):
+        self.flush()
+        sent = Counter()
+        for dpid, dp in self.datapaths.items():
+            sent.update(dp.sent - self.baseline.get(dpid, Counter()))
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            'packet_ins': count,
+            'packet_ins_per_sec': count / elapsed if elapsed else 0.0,
+            'latency_p50_us': latencies[count // 2] * 1e6 if count else 0.0,
+            'latency_p99_us': latencies[min(count - 1, int(count * 0.99))] * 1e6 if count else 0.0,
+            'flow_mods': sent['OFPFlowMod'],
+            'packet_outs': sent['OFPPacketOut'],
+            'setup_flow_mods': self.setup_flow_mods,
+            'switches': len(self.datapaths),
+            'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """按应用逐项打印相对基线的变化, 正号表示变好"""
+    print(f"*** 对比基线 {baseline.get('commit')} ({baseline.get('time')})")
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        for key, value in result.items():
+            old = base.get(key)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+            change = value / old - 1
+            if key not in HIGHER_IS_BETTER:
+                change = -change
+            print(f"    {name:<11} {key:<20} {old:>14,.1f} -> {value:>14,.1f}  {change:+.1%}")
+
+
+def summary_line(name, result):
+    return (f"{name:<11} {result['packet_ins_per_sec']:>10,.0f} packet-in/秒  "
+            f"p50 {result['latency_p50_us']:>7.1f}us  p99 {result['latency_p99_us']:>8.1f}us  "
+            f"FlowMod {result['flow_mods']:>7}  PacketOut {result['packet_outs']:>7}  "
+            f"峰值RSS {result['peak_rss_mib']:.1f} MiB")
+
+
+def run_isolated(script, argv, names):
+    """每个应用在独立子进程中运行(峰值RSS互不影响): 以"argv --child --app 名称"调用脚本,
+    子进程把结果JSON写到标准输出"""
+    results = {}
+    for name in names:
+        out = subprocess.check_output([sys.executable, script] + argv + ['--child', '--app', name])
+        results[name] = json.loads(out)
+        print(summary_line(name, results[name]))
+    return results
+
+
+def save_report(path, workload, results, baseline=None):
+    """按提交号保存结果JSON; 给出基线文件时先打印对比"""
+    if baseline:
+        with open(baseline) as f:
+            compare(results, json.load(f))
+    if path:
+        report = {
+            'commit': git_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'workload': workload,
+            'results': results,
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"结果已保存到{path}")
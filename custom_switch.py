@@ -1,41 +1,83 @@
 from ryu.base import app_manager
 from ryu.controller import ofp_event
-from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
+from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.lib.packet import packet, ethernet, ipv4
 from ryu.lib import hub
+from ryu.app.wsgi import WSGIApplication
+import os
+
+import fast_packet
+import instrumentation
+from flow_stats import FlowStatsCollector, FlowStatsController
 
 class CustomSwitch(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {'wsgi': WSGIApplication}
 
     def __init__(self, *args, **kwargs):
         super(CustomSwitch, self).__init__(*args, **kwargs)
         self.datapaths = {}
-        self.monitor_thread = hub.spawn(self._monitor)
+        # 热路径埋点, 经WSGI端点GET /metrics导出, PUT /metrics/enable|disable运行时开关
+        self.metrics = instrumentation.Instrumentation(
+            'custom_switch', enabled=os.environ.get('METRICS') == '1')
+        instrumentation.register_wsgi(kwargs['wsgi'])
+        self.metrics.describe('ryu_flow_stats_entries_total', '流统计应答中的流表项数')
+
+        # 流表/端口统计采集, 轮询周期按流变化率在STATS_MIN_INTERVAL~STATS_MAX_INTERVAL秒间自适应
+        self.flow_stats = FlowStatsCollector(
+            self.logger, lambda datapath, msg: datapath.send_msg(msg),
+            min_interval=float(os.environ.get('STATS_MIN_INTERVAL', 1)),
+            max_interval=float(os.environ.get('STATS_MAX_INTERVAL', 30)))
+        kwargs['wsgi'].register(FlowStatsController, {'flow_stats': self.flow_stats})
+
+        self.metrics.register(
+            'ryu_datapaths', 'gauge', '已连接的交换机数',
+            lambda: [((), len(self.datapaths))])
+        self.metrics.register(
+            'ryu_active_flows', 'gauge', '统计到的活动流表项数',
+            lambda: [((('dpid', dpid),), len(table))
+                     for dpid, table in self.flow_stats.flows.items()])
+        self.metrics.register(
+            'ryu_stats_poll_interval_seconds', 'gauge', '当前统计轮询周期',
+            lambda: [((('dpid', dpid),), interval)
+                     for dpid, interval in self.flow_stats.intervals.items()])
+        self.monitor_thread = hub.spawn(self.flow_stats.run)
 
-    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, CONFIG_DISPATCHER])
+    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
     def _state_change_handler(self, ev):
         datapath = ev.datapath
         if ev.state == MAIN_DISPATCHER:
             self.datapaths[datapath.id] = datapath
+            self.flow_stats.add_datapath(datapath)
+        elif ev.state == DEAD_DISPATCHER and datapath.id is not None:
+            self.datapaths.pop(datapath.id, None)
+            self.flow_stats.remove_datapath(datapath.id)
 
-    def _monitor(self):
-        while True:
-            for dp in self.datapaths.values():
-                self._request_stats(dp)
-            hub.sleep(10)
-
-    def _request_stats(self, datapath):
-        ofp = datapath.ofproto
-        ofp_parser = datapath.ofproto_parser
-        req = ofp_parser.OFPFlowStatsRequest(datapath)
-        datapath.send_msg(req)
+    def top_talkers(self, n=10, by='bytes', dpid=None):
+        """速率最高的n条流, by为bytes或packets"""
+        return self.flow_stats.top_talkers(n, by, dpid)
 
     @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
     def _flow_stats_reply_handler(self, ev):
-        pass
+        start = self.metrics.start()
+        self.metrics.inc('ryu_flow_stats_entries_total', (('dpid', ev.msg.datapath.id),),
+                         len(ev.msg.body))
+        self.flow_stats.flow_stats_reply(ev.msg)
+        self.metrics.stage('flow_stats_reply', start)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def _port_stats_reply_handler(self, ev):
+        start = self.metrics.start()
+        self.flow_stats.port_stats_reply(ev.msg)
+        self.metrics.stage('port_stats_reply', start)
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
-        pass
\ No newline at end of file
+        start = self.metrics.start()
+        if start is not None:
+            hdr = fast_packet.parse_headers(ev.msg.data)
+            if hdr is not None:
+                self.metrics.packet_in(ev.msg.datapath.id, hdr.ethertype)
+        self.metrics.stage('packet_in', start)
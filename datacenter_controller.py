@@ -1,25 +1,92 @@
 from ryu.base import app_manager
 from ryu.controller import ofp_event
-from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
+from ryu.controller.handler import (CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER,
+                                    HANDSHAKE_DISPATCHER)
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
+from ryu.lib import hub
+from ryu.app.wsgi import WSGIApplication
 from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
 from ryu.lib.packet import ether_types
+from ryu.lib.packet import in_proto
 from ryu.lib.packet import ipv6
 from ryu.lib.packet import icmpv6
-import ipaddress
+import os
+
+import fast_packet
+import flow_compiler
+from channel_stats import RX_EVENTS, ChannelStats, packet_in_max_len
+from ddos_detector import DDoSDetector
+from event_log import EventLog, parse_rates
+from flood_tree import FloodTree
+from flow_cache import FlowCache
+from flow_batcher import FlowModBatcher
+from flow_stats import FlowStatsCollector
+from host_tables import MacTable, NeighborTable
+import instrumentation
+from nd_proxy import UNSPECIFIED_ADDRESS, NDProxy
+from packet_in_guard import PacketInGuard
+from packet_trace import TraceRecorder
+from scrubbing import ScrubbingSteering
+from shard_cluster import ShardCluster
+from subnet_index import SubnetIndex
+from topology import Topology
+from traffic_engineer import TrafficEngineer
+from warm_restart import WarmRestart
+
+# 请求节点组播地址(ff02::1:ffXX:XXXX)对应的以太网组播MAC 33:33:ff:XX:XX:XX
+_SOLICITED_NODE_MAC = ('33:33:ff:00:00:00', 'ff:ff:ff:00:00:00')
+
+# 多级流表(DC_PIPELINE=1): 入口表保留LLDP/邻居请求上送、清洗、流量工程等高优先级表项,
+# 其余流量依次经过源MAC学习表、L3路由表和L2转发表
+INGRESS_TABLE = 0
+LEARN_TABLE = 1
+L3_TABLE = 2
+L2_TABLE = 3
 
 
 class IPv6DatacenterController(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {'wsgi': WSGIApplication}
 
     def __init__(self, *args, **kwargs):
         super(IPv6DatacenterController, self).__init__(*args, **kwargs)
-        self.mac_to_port = {}
+        # 热路径埋点, 经WSGI端点GET /metrics导出, PUT /metrics/enable|disable运行时开关
+        self.metrics = instrumentation.Instrumentation(
+            'datacenter', enabled=os.environ.get('METRICS') == '1')
+        instrumentation.register_wsgi(kwargs['wsgi'])
+
+        # 异步结构化日志: 设置EVENT_LOG(JSON行文件, "-"为写入日志器)时, 转发事件经有界缓冲区
+        # 由后台循环写出, 按EVENT_LOG_SAMPLE/EVENT_LOG_RATE采样和限速; 未设置时同步记录日志
+        self.event_log = None
+        event_log_path = os.environ.get('EVENT_LOG')
+        if event_log_path:
+            self.event_log = EventLog(
+                self.logger, path=None if event_log_path == '-' else event_log_path,
+                sample_rates=parse_rates(os.environ.get('EVENT_LOG_SAMPLE')),
+                rate_limits=parse_rates(os.environ.get('EVENT_LOG_RATE')))
+            self.event_log_thread = hub.spawn(self.event_log.run)
+
+        # MAC表和邻居表容量及老化时间(秒), 超出容量时淘汰最久未更新的表项; 容量不大于0时不限容量
+        self.mac_table_size = int(os.environ.get('MAC_TABLE_SIZE', 4096))
+        self.nd_table_size = int(os.environ.get('ND_TABLE_SIZE', 65536))
+        for name, size in (('MAC_TABLE_SIZE', self.mac_table_size),
+                           ('ND_TABLE_SIZE', self.nd_table_size)):
+            if size <= 0:
+                self.logger.warning(f"{name}={size}: 表不限容量, 表项只靠老化删除")
+        self.host_table_ttl = float(os.environ.get('HOST_TABLE_TTL', 300))
+
+        self.mac_to_port = {}  # dpid -> MacTable
         self.dpid_to_name = {}  # 用于日志记录
         self.router_mac = "00:00:00:00:00:f0"  # 虚拟路由器MAC
         self.edge_dpid = 2  # 边缘路由器DPID
+        self.external_dpid = 1  # 外部网络交换机DPID
+        # 多级流表: 已学习的源MAC在交换机内直接转发, 目的未知时经广播树洪泛, 不再上送控制器
+        self.pipeline = os.environ.get('DC_PIPELINE') == '1'
+        # 边缘路由器L3流表粒度: pair为每对主机一对精确流表, host为每台目的主机一条
+        # 通配源地址的路由, 流表数从O(外部主机×内部主机)降为O(外部主机+内部主机);
+        # 单表模式默认pair, 多级流表模式默认host
+        self.l3_flow_mode = os.environ.get('L3_FLOW_MODE', 'host' if self.pipeline else 'pair')
 
         # 子网信息
         self.subnets = {
@@ -33,14 +100,250 @@ class IPv6DatacenterController(app_manager.RyuApp):
             "2001:db8:2::/64": "2001:db8:2::ffff"
         }
 
-        # 邻居表 (IPv6地址 -> MAC地址)
-        self.nd_table = {
-            "2001:db8:1::ffff": self.router_mac,
-            "2001:db8:2::ffff": self.router_mac
-        }
-
+        # 子网最长前缀匹配索引
+        self.subnet_index = SubnetIndex(self.subnets)
+
+        # 邻居表 (IPv6地址 -> MAC地址), 网关为静态表项
+        self.nd_table = NeighborTable(self.nd_table_size, self.host_table_ttl)
+        for gateway_ip in self.gateway_ips.values():
+            self.nd_table.add_static(gateway_ip, self.router_mac)
+
+        # 邻居发现代理, 用邻居表直接应答邻居请求
+        self.nd_proxy = NDProxy(self.nd_table, self.router_mac)
+
+        # 截断packet-in: 设置PACKET_IN_MISS_LEN(如128)时table-miss只上送包头, 原始帧留在交换机
+        # 缓存中由buffer_id释放; 交换机没有缓存时仍上送完整帧
+        self.miss_send_len = int(os.environ.get('PACKET_IN_MISS_LEN', 0))
+        self.packet_in_max_len = {}  # dpid -> table-miss上送长度
+        self.channel_stats = ChannelStats(self.logger)
+        self.channel_stats_thread = hub.spawn(self.channel_stats.run)
+
+        # FlowMod批量发送队列, FLOW_BUNDLES=1时使用OpenFlow bundle原子提交
+        self.flow_batcher = FlowModBatcher(
+            self.logger, use_bundles=os.environ.get('FLOW_BUNDLES') == '1',
+            channel_stats=self.channel_stats, metrics=self.metrics)
+        self.flow_batcher_thread = hub.spawn(self.flow_batcher.run)
+
+        # 流表影子缓存: FLOW_CACHE=1时不重复下发相同表项, 通过FlowRemoved跟踪交换机上的表项,
+        # 单表表项数达到FLOW_TABLE_LIMIT(0为不限)或交换机报告表满时按LRU淘汰(命中时间取自流统计)
+        self.flow_cache = None
+        if os.environ.get('FLOW_CACHE') == '1':
+            self.flow_cache = FlowCache(
+                self.logger, self.flow_batcher.send_msg,
+                table_limit=int(os.environ.get('FLOW_TABLE_LIMIT', 0)))
+
+        # 热重启: 设置WARM_RESTART为快照文件路径时, 每WARM_RESTART_INTERVAL秒(默认10)把MAC表、
+        # 邻居表和交换机名称写入快照, 启动时恢复; 交换机重连后导出流表与恢复的状态核对,
+        # 只核对学习下发的L2/L3表项(带空闲超时), 主动下发和上送表项不受影响
+        self.warm_restart = None
+        snapshot_path = os.environ.get('WARM_RESTART')
+        if snapshot_path:
+            self.warm_restart = WarmRestart(
+                self.logger, self.flow_batcher.send_msg, snapshot_path,
+                self.mac_to_port, self.nd_table, self.dpid_to_name,
+                new_mac_table=self._new_mac_table,
+                owned=lambda stat: stat.priority in (1, 10) and stat.idle_timeout > 0,
+                interval=float(os.environ.get('WARM_RESTART_INTERVAL', 10)))
+            self.warm_restart.load()
+            self.warm_restart_thread = hub.spawn(self.warm_restart.run)
+
+        self.aging_thread = hub.spawn(self._aging_loop)
+
+        # packet-in轨迹: 设置PACKET_TRACE为文件路径时, 进入处理函数的每个packet-in经有界缓冲区
+        # 由后台循环追加到二进制轨迹文件, 可用bench_replay.py离线回放
+        self.packet_trace = None
+        trace_path = os.environ.get('PACKET_TRACE')
+        if trace_path:
+            self.packet_trace = TraceRecorder(
+                self.logger, trace_path,
+                snaplen=int(os.environ.get('PACKET_TRACE_SNAPLEN', 0)),
+                max_bytes=int(float(os.environ.get('PACKET_TRACE_MAX_MB', 0)) * 2 ** 20))
+            self.packet_trace_thread = hub.spawn(self.packet_trace.run)
+
+        # packet-in风暴防护(包/秒, 0为不限): 交换机侧限速表 + 控制器侧按交换机/源MAC的令牌桶,
+        # 超限的packet-in在解析前丢弃, PACKET_IN_SAMPLE=N时每N个超限包放行一个
+        self.packet_in_guard = PacketInGuard(
+            self.logger, self.flow_batcher.send_msg,
+            meter_rate=int(os.environ.get('PACKET_IN_METER_PPS', 0)),
+            dpid_rate=float(os.environ.get('PACKET_IN_DPID_PPS', 0)),
+            src_rate=float(os.environ.get('PACKET_IN_SRC_PPS', 0)),
+            sample_every=int(os.environ.get('PACKET_IN_SAMPLE', 0)))
+
+        # 主动模式: 设置DC_TOPOLOGY为拓扑描述文件(JSON/YAML)时, 交换机连接后预先下发全部转发表项
+        self.topology_file = os.environ.get('DC_TOPOLOGY')
+        self.topology = None
+        self.topology_mtime = None
+        self.proactive_flows = {}
+
+        # ECMP: 主动模式下设置DC_ECMP=1时, 跨交换机流量经SELECT组在全部等价上行链路间分担
+        self.ecmp = os.environ.get('DC_ECMP') == '1'
+        self.ecmp_groups = {}   # dpid -> {组号: [(端口, 权重)]}
+        self.down_ports = set()  # 故障的交换机互联端口 (dpid, 端口)
+        self.datapaths = {}
+
+        # LLDP链路发现与无环广播树, 洪泛经ALL组只走生成树端口和边缘端口
+        self.flood_tree = FloodTree(self.logger, self.flow_batcher.send_msg)
+        self.flood_tree_thread = hub.spawn(self.flood_tree.run)
+
+        # 分片部署: SHARD_COUNT>1时本进程是第SHARD_INDEX个worker(从0起), 交换机同时连接全部worker,
+        # 按哈希分给存活的worker并用OFPRoleRequest声明MASTER/SLAVE, 只有MASTER处理packet-in和下发
+        # 表项; 邻居表、LLDP发现的链路和未知目标的邻居请求洪泛经本机UDP总线(SHARD_BUS_PORT起的
+        # 连续端口, 默认6700)复制到其他worker, worker故障时其交换机由其余worker接管
+        self.shard = None
+        shard_count = int(os.environ.get('SHARD_COUNT', 1))
+        if shard_count > 1:
+            self.shard = ShardCluster(
+                self.logger, self.flow_batcher.send_msg, int(os.environ.get('SHARD_INDEX', 0)),
+                shard_count, bus_port=int(os.environ.get('SHARD_BUS_PORT', 6700)),
+                on_master=self._take_over)
+            self.flow_batcher.accept = self.shard.may_send
+            self.shard.subscribe('nd', self._replicated_neighbor)
+            self.shard.subscribe('link', lambda src, dst: self.flood_tree.add_link(tuple(src),
+                                                                                   tuple(dst)))
+            self.shard.subscribe('flood', lambda _, data: self._flood_to_edge(
+                None, None, bytes.fromhex(data)))
+            self.shard_thread = hub.spawn(self.shard.run)
+            self.shard_receive_thread = hub.spawn(self.shard.receive_loop)
+
+        # 流量工程: DC_TE=1时周期性采集流/端口统计, 把速率超过TE_ELEPHANT_MBPS(默认10Mbit/s)
+        # 的大流从拥塞的spine迁移到较空闲的spine
+        te = os.environ.get('DC_TE') == '1'
+        ddos = os.environ.get('DDOS_DETECT') == '1'
+        self.flow_stats = None
+        self.traffic_engineer = None
+        if te or ddos or self.flow_cache:
+            self.flow_stats = FlowStatsCollector(
+                self.logger, self.flow_batcher.send_msg,
+                min_interval=1.0, max_interval=5.0, initial_interval=2.0)
+            self.flow_stats_thread = hub.spawn(self.flow_stats.run)
+        if self.flow_cache:
+            self.flow_stats.listeners.append(self.flow_cache.flow_stats)
+        if te:
+            self.traffic_engineer = TrafficEngineer(
+                self.logger, self.flow_batcher.send_msg, self.flow_batcher.when_confirmed,
+                self.flow_stats, lambda: self.flood_tree.links, self._locate_host,
+                threshold=float(os.environ.get('TE_ELEPHANT_MBPS', 10)) * 1e6 / 8)
+
+        # 流量清洗: SCRUB_PREFIXES为逗号分隔的可疑外部前缀, 边缘路由器把来自这些前缀的外部流量
+        # 经SELECT组分担到清洗服务器(SCRUB_SERVERS="MAC=IPv6,...", 默认leaf5上的h5a/h5b/h5c)
+        self.scrubbing = None
+        scrub_prefixes = [p for p in os.environ.get('SCRUB_PREFIXES', '').split(',') if p]
+        if scrub_prefixes:
+            servers = os.environ.get(
+                'SCRUB_SERVERS', '00:00:00:00:05:01=2001:db8:2:5::1,'
+                                 '00:00:00:00:05:02=2001:db8:2:5::2,'
+                                 '00:00:00:00:05:03=2001:db8:2:5::3')
+            self.scrubbing = ScrubbingSteering(
+                self.logger, self.flow_batcher.send_msg, self.datapaths,
+                lambda: self.flood_tree.links, self._host_location,
+                self.edge_dpid, self.external_dpid, self.router_mac,
+                self.gateway_ips["2001:db8:2::/64"], scrub_prefixes,
+                [tuple(item.split('=', 1)) for item in servers.split(',') if item])
+            self.scrubbing_thread = hub.spawn(self.scrubbing.run)
+
+        # DDoS检测: DDOS_DETECT=1时用固定内存草图统计边缘路由器的入向packet-in和流统计,
+        # 单源超过DDOS_SOURCE_PPS时丢弃该源; 不同源地址数超过DDOS_DISTINCT且某/64前缀超过
+        # DDOS_PREFIX_PPS时把该前缀引流到清洗集群(未配置清洗时丢弃)
+        self.ddos = None
+        if ddos:
+            self.ddos = DDoSDetector(
+                self.logger, self.flow_batcher.send_msg, self.datapaths, self.edge_dpid,
+                source_pps=float(os.environ.get('DDOS_SOURCE_PPS', 1000)),
+                prefix_pps=float(os.environ.get('DDOS_PREFIX_PPS', 5000)),
+                distinct=float(os.environ.get('DDOS_DISTINCT', 1000)),
+                block_seconds=int(os.environ.get('DDOS_BLOCK_SECONDS', 60)),
+                steer=self.scrubbing.steer if self.scrubbing else None,
+                unsteer=self.scrubbing.unsteer if self.scrubbing else None,
+                collector=self.flow_stats)
+            self.ddos_thread = hub.spawn(self.ddos.run)
+            if self.l3_flow_mode == 'host':
+                # 主机路由通配源地址, 流统计无法按源计数; 检测开启时保留按主机对的精确流表
+                self.logger.warning("DDoS检测需要按主机对的L3流表, L3_FLOW_MODE改为pair")
+                self.l3_flow_mode = 'pair'
+
+        self._register_metrics()
         self.logger.info("IPv6数据中心控制器已启动")
 
+    def _register_metrics(self):
+        """注册导出时从各模块统计中取值的指标"""
+        batcher = self.flow_batcher
+        self.metrics.register(
+            'ryu_flow_mods_sent_total', 'counter', '已发送的FlowMod数',
+            lambda: [((('dpid', dpid),), n) for dpid, n in batcher.sent_flows.items()])
+        self.metrics.register(
+            'ryu_flow_mods_failed_total', 'counter', '被交换机拒绝的FlowMod数',
+            lambda: [((('dpid', dpid),), stats['failed_flows'])
+                     for dpid, stats in batcher.get_stats().items()])
+        self.metrics.register(
+            'ryu_send_queue_depth', 'gauge', '批量发送队列中等待发送的消息数',
+            lambda: [((('dpid', dpid),), n) for dpid, n in batcher.queue_depth().items()])
+        self.metrics.register(
+            'ryu_packet_in_dropped_total', 'counter', '准入控制丢弃的packet-in数',
+            lambda: [((('dpid', dpid),), stats['dropped'])
+                     for dpid, stats in self.packet_in_guard.get_stats().items()])
+        self.metrics.register(
+            'ryu_channel_bytes_total', 'counter', '控制通道收发字节数',
+            lambda: [((('dpid', dpid), ('direction', direction)), stats['total'][field])
+                     for dpid, stats in self.channel_stats.get_stats().items()
+                     for direction, field in (('rx', 'rx_bytes'), ('tx', 'tx_bytes'))])
+        if self.event_log:
+            self.metrics.register(
+                'ryu_event_log_events_total', 'counter', '结构化事件日志按结果统计的事件数',
+                lambda: [((('result', key),), value)
+                         for key, value in self.event_log.get_stats().items()])
+        if self.traffic_engineer:
+            self.metrics.register(
+                'ryu_te_moves_total', 'counter', '流量工程完成的大流迁移次数',
+                lambda: [((), self.traffic_engineer.moves)])
+        if self.packet_trace:
+            self.metrics.register(
+                'ryu_packet_trace_records_total', 'counter', 'packet-in轨迹记录/写出/丢弃数',
+                lambda: [((('result', key),), value)
+                         for key, value in self.packet_trace.get_stats().items()
+                         if key not in ('bytes', 'buffered')])
+        if self.warm_restart:
+            self.metrics.register(
+                'ryu_warm_restart_total', 'counter', '热重启快照次数、恢复的表项数和核对结果',
+                lambda: [((('event', event),), n)
+                         for event, n in self.warm_restart.get_stats().items()])
+        if self.flow_cache:
+            self.metrics.register(
+                'ryu_flow_cache_entries', 'gauge', '影子流表中的表项数',
+                lambda: [((('dpid', dpid),), n) for dpid, n in self.flow_cache.entries().items()])
+            self.metrics.register(
+                'ryu_flow_cache_events_total', 'counter', '影子流表的下发/去重/删除/淘汰次数',
+                lambda: [((('event', event),), n)
+                         for event, n in self.flow_cache.get_stats().items()])
+        if self.ddos:
+            self.metrics.register(
+                'ryu_ddos_distinct_sources', 'gauge', '上一窗口入向流量的不同源地址估计数',
+                lambda: [((), self.ddos.last_window.get('distinct_sources', 0))])
+            self.metrics.register(
+                'ryu_ddos_mitigations_total', 'counter', 'DDoS检测触发的处置次数',
+                lambda: [((('action', action),), self.ddos.stats[action])
+                         for action in ('blocked_sources', 'blocked_prefixes',
+                                        'redirected_prefixes')])
+        if self.shard:
+            self.metrics.register(
+                'ryu_shard_switches', 'gauge', '交换机确认本worker为各角色的交换机数',
+                lambda: [((('role', role),), n) for role, n in self.shard.role_counts().items()])
+            self.metrics.register(
+                'ryu_shard_members', 'gauge', '存活的分片worker数',
+                lambda: [((), len(self.shard.members))])
+            self.metrics.register(
+                'ryu_shard_events_total', 'counter', '角色请求、接管/交出、总线收发等分片事件数',
+                lambda: [((('event', event),), n)
+                         for event, n in self.shard.get_stats().items()])
+        if self.scrubbing:
+            self.metrics.register(
+                'ryu_scrubbers_healthy', 'gauge', '健康的清洗服务器数',
+                lambda: [((), len(self.scrubbing.healthy()))])
+        self.metrics.register(
+            'ryu_host_table_entries', 'gauge', 'MAC表和邻居表表项数',
+            lambda: [((('table', 'nd'),), len(self.nd_table))] +
+                    [((('table', 'mac'), ('dpid', dpid)), len(table))
+                     for dpid, table in self.mac_to_port.items()])
+
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
         datapath = ev.msg.datapath
@@ -49,7 +352,10 @@ class IPv6DatacenterController(app_manager.RyuApp):
 
         # 将DPID映射到更友好的名称
         dpid = datapath.id
-        if dpid == 1:
+        self._load_topology()
+        if self.topology and dpid in self.topology.switches:
+            self.dpid_to_name[dpid] = self.topology.switches[dpid]
+        elif dpid == 1:
             self.dpid_to_name[dpid] = "external_switch"
         elif dpid == 2:
             self.dpid_to_name[dpid] = "edge_router"
@@ -61,43 +367,396 @@ class IPv6DatacenterController(app_manager.RyuApp):
             self.dpid_to_name[dpid] = f"switch{dpid}"
 
         # 初始化MAC表
-        self.mac_to_port.setdefault(dpid, {})
+        self.mac_to_port.setdefault(dpid, self._new_mac_table())
+        # 分片部署: 先声明角色, 非MASTER时之后的表项不会发出
+        if self.shard:
+            self.shard.switch_ready(datapath)
+        # 交换机(重新)连接时流表状态未知
+        if self.flow_cache:
+            self.flow_cache.remove(dpid)
+
+        self.packet_in_max_len[dpid] = packet_in_max_len(
+            ofproto, ev.msg.n_buffers, self.miss_send_len)
+        if self.miss_send_len:
+            if ev.msg.n_buffers:
+                self.flow_batcher.send_msg(datapath, parser.OFPSetConfig(
+                    datapath, ofproto.OFPC_FRAG_NORMAL, self.miss_send_len))
+            else:
+                self.logger.info(f"dpid={dpid} 没有包缓存, packet-in上送完整帧")
+
+        # 先建立洪泛组: 之后的缺省表项会引用它, switch_enter删除重建组时也会删掉
+        # 已经引用该组的流表
+        self.flood_tree.switch_enter(datapath)
+        if self.scrubbing:
+            self.scrubbing.switch_enter(dpid)
+
+        # 安装上送控制器的流表项, 交换机支持限速表时在应答后重新安装并挂上限速表
+        self._install_punt_flows(datapath)
+        self.packet_in_guard.meter_features_request(datapath)
+
+        # 主动下发预计算的转发表项, 未知主机仍由table-miss交给控制器学习
+        if dpid in self.proactive_flows:
+            self._install_proactive_flows(datapath)
+
+        self.logger.info(f"交换机已连接: dpid={dpid} ({self.dpid_to_name[dpid]})")
+
+    def _install_punt_flows(self, datapath):
+        """安装table-miss和邻居请求上送流表, 已安装限速表时经限速表上送"""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        meter_id = self.packet_in_guard.meter_id(datapath.id)
 
         # 安装table-miss流表项
         match = parser.OFPMatch()
+        max_len = self.packet_in_max_len.get(datapath.id, ofproto.OFPCML_NO_BUFFER)
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, max_len)]
+        if self.pipeline:
+            self._install_pipeline_misses(datapath, actions, meter_id)
+        else:
+            self.add_flow(datapath, 0, match, actions, meter_id=meter_id)
+
+        # 只有发往请求节点组播地址的地址解析请求上送控制器, 由ND代理应答或只向边缘端口
+        # 转发(需要完整帧, 不截断); 单播的邻居不可达检测按普通流量转发
+        ns = dict(eth_type=ether_types.ETH_TYPE_IPV6, ip_proto=in_proto.IPPROTO_ICMPV6,
+                  icmpv6_type=icmpv6.ND_NEIGHBOR_SOLICIT, eth_dst=_SOLICITED_NODE_MAC)
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
                                           ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
+        self.add_flow(datapath, 20, parser.OFPMatch(**ns), actions, meter_id=meter_id)
+        # 重复地址检测(源地址为::)控制器不代答, 直接在交换机内沿广播树洪泛
+        self.add_flow(datapath, 21, parser.OFPMatch(ipv6_src=UNSPECIFIED_ADDRESS, **ns),
+                      self.flood_tree.flood_actions(datapath))
 
-        self.logger.info(f"交换机已连接: dpid={dpid} ({self.dpid_to_name[dpid]})")
+    def _install_pipeline_misses(self, datapath, punt_actions, meter_id):
+        """多级流表的各表缺省表项: 只有源MAC学习表未命中时上送控制器"""
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch()
+        self.add_flow(datapath, 0, match, [], table_id=INGRESS_TABLE, goto_table=LEARN_TABLE)
+        self.add_flow(datapath, 0, match, punt_actions, meter_id=meter_id, table_id=LEARN_TABLE)
+        self.add_flow(datapath, 0, match, [], table_id=L3_TABLE, goto_table=L2_TABLE)
+        if datapath.id == self.edge_dpid:
+            # 发往路由器但还没有路由的IPv6包上送控制器解析目的主机
+            match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IPV6, eth_dst=self.router_mac)
+            self.add_flow(datapath, 1, match, punt_actions, meter_id=meter_id, table_id=L3_TABLE)
+        # 目的MAC未知时在交换机内沿广播树洪泛
+        self.add_flow(datapath, 0, parser.OFPMatch(), self.flood_tree.flood_actions(datapath),
+                      table_id=L2_TABLE)
+
+    def _install_learned_host(self, datapath, mac, port):
+        """多级流表: 源MAC学习表项(已学习的源不再上送)和L2转发表项, 表项数与主机数成正比"""
+        parser = datapath.ofproto_parser
+        idle_timeout = int(self.host_table_ttl)
+        self.add_flow(datapath, 1, parser.OFPMatch(in_port=port, eth_src=mac), [],
+                      idle_timeout=idle_timeout, table_id=LEARN_TABLE, goto_table=L3_TABLE)
+        self.add_flow(datapath, 1, parser.OFPMatch(eth_dst=mac), [parser.OFPActionOutput(port)],
+                      idle_timeout=idle_timeout, table_id=L2_TABLE)
+
+    @set_ev_cls(ofp_event.EventOFPMeterFeaturesStatsReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _meter_features_reply_handler(self, ev):
+        datapath = ev.msg.datapath
+        if self.packet_in_guard.meter_features_reply(ev.msg):
+            # 限速表须先于引用它的流表生效(bundle只包含FlowMod/GroupMod)
+            self.flow_batcher.flush(datapath.id)
+            self._install_punt_flows(datapath)
+
+    def _load_topology(self):
+        """加载(或在文件更新后重新加载)拓扑描述并预编译转发表项"""
+        if not self.topology_file:
+            return
+        try:
+            mtime = os.path.getmtime(self.topology_file)
+        except OSError:
+            return
+        if mtime == self.topology_mtime:
+            return
+
+        try:
+            topology = Topology.load(self.topology_file)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error(f"加载拓扑描述失败: {self.topology_file}: {e}")
+            return
+        self.topology = topology
+        self.topology_mtime = mtime
+        self.proactive_flows = flow_compiler.compile_flows(
+            topology, self.router_mac, self.edge_dpid, ecmp=self.ecmp)
+        if self.ecmp:
+            self.ecmp_groups = flow_compiler.compile_groups(topology, self.down_ports)
+
+        # 用拓扑中的已知主机预置邻居表和MAC表
+        for host in topology.hosts:
+            self.nd_table.add_static(host['ip'], host['mac'])
+        for dpid in topology.switches:
+            ports = self.mac_to_port.setdefault(dpid, self._new_mac_table())
+            for host in topology.hosts:
+                port = flow_compiler.host_port(topology, dpid, host)
+                if port is not None:
+                    ports.add_static(host['mac'], port)
+
+        total = sum(len(flows) for flows in self.proactive_flows.values())
+        self.logger.info(f"已加载拓扑: {len(topology.switches)}台交换机, "
+                         f"{len(topology.hosts)}台主机, 预编译{total}条流表")
+
+    def _install_proactive_flows(self, datapath):
+        """向交换机下发预编译的转发表项(ECMP模式下先下发SELECT组)"""
+        parser = datapath.ofproto_parser
+        if self.ecmp:
+            # 逐个清除交换机上残留的同号ECMP组(及引用它们的流表)后重新添加;
+            # 不能用OFPG_ALL, 否则会删掉洪泛组、清洗组等其他模块的组
+            ofproto = datapath.ofproto
+            datapath_groups = self.ecmp_groups.get(datapath.id, {})
+            for group_id, buckets in datapath_groups.items():
+                self.flow_batcher.send_msg(datapath, parser.OFPGroupMod(
+                    datapath, ofproto.OFPGC_DELETE, ofproto.OFPGT_SELECT, group_id))
+                self._send_group_mod(datapath, ofproto.OFPGC_ADD, group_id, buckets)
+
+        flows = self.proactive_flows[datapath.id]
+        for spec in flows:
+            match = parser.OFPMatch(**spec.match)
+            actions = flow_compiler.build_actions(parser, spec.actions)
+            self.add_flow(datapath, spec.priority, match, actions)
+        self.logger.info(f"{self.dpid_to_name[datapath.id]}: 主动下发{len(flows)}条流表")
+
+    def _send_group_mod(self, datapath, command, group_id, buckets):
+        """发送ECMP SELECT组, buckets为[(端口, 权重)]"""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        of_buckets = [parser.OFPBucket(weight=weight, watch_port=port,
+                                       watch_group=ofproto.OFPG_ANY,
+                                       actions=[parser.OFPActionOutput(port)])
+                      for port, weight in buckets]
+        self.flow_batcher.send_msg(datapath, parser.OFPGroupMod(
+            datapath, command, ofproto.OFPGT_SELECT, group_id, of_buckets))
+
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    def _port_status_handler(self, ev):
+        """端口状态变化时更新广播树和ECMP组权重"""
+        msg = ev.msg
+        self.flood_tree.port_status(msg)
+
+        dpid = msg.datapath.id
+        ofproto = msg.datapath.ofproto
+        port_no = msg.desc.port_no
+        if self.scrubbing and (msg.reason == ofproto.OFPPR_DELETE
+                               or msg.desc.state & ofproto.OFPPS_LINK_DOWN):
+            self.scrubbing.port_down(dpid, port_no)
+        if not self.ecmp or not self.topology or port_no not in self.topology.switch_ports(dpid):
+            return
 
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None, idle_timeout=0):
+        down = (msg.reason == ofproto.OFPPR_DELETE
+                or msg.desc.state & ofproto.OFPPS_LINK_DOWN
+                or msg.desc.config & ofproto.OFPPC_PORT_DOWN)
+        if bool(down) == ((dpid, port_no) in self.down_ports):
+            return
+        if down:
+            self.down_ports.add((dpid, port_no))
+        else:
+            self.down_ports.discard((dpid, port_no))
+        self.logger.info(f"{self.dpid_to_name.get(dpid, dpid)}: 端口{port_no}"
+                         f"{'故障' if down else '恢复'}, 重新计算ECMP组")
+        self._update_ecmp_groups()
+
+    def _update_ecmp_groups(self):
+        """按当前故障端口重新计算ECMP组, 只修改发生变化的组"""
+        groups = flow_compiler.compile_groups(self.topology, self.down_ports)
+        for dpid, datapath_groups in groups.items():
+            old_groups = self.ecmp_groups.get(dpid, {})
+            datapath = self.datapaths.get(dpid)
+            if datapath is None:
+                continue
+            for group_id, buckets in datapath_groups.items():
+                if old_groups.get(group_id) != buckets:
+                    self._send_group_mod(datapath, datapath.ofproto.OFPGC_MODIFY,
+                                         group_id, buckets)
+        self.ecmp_groups = groups
+
+    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
+    def _state_change_handler(self, ev):
+        datapath = ev.datapath
+        if ev.state == MAIN_DISPATCHER:
+            self.datapaths[datapath.id] = datapath
+            if self.flow_stats:
+                self.flow_stats.add_datapath(datapath)
+            if self.warm_restart:
+                self.warm_restart.switch_ready(datapath)
+        elif ev.state == DEAD_DISPATCHER and datapath.id is not None:
+            self.datapaths.pop(datapath.id, None)
+            if self.flow_stats:
+                self.flow_stats.remove_datapath(datapath.id)
+            self.flood_tree.switch_leave(datapath.id)
+            if self.scrubbing:
+                self.scrubbing.switch_leave(datapath.id)
+            self.flow_batcher.remove(datapath.id)
+            if self.flow_cache:
+                self.flow_cache.remove(datapath.id)
+            if self.warm_restart:
+                self.warm_restart.switch_leave(datapath.id)
+            if self.shard:
+                self.shard.switch_leave(datapath.id)
+            self.packet_in_guard.remove(datapath.id)
+            self.channel_stats.remove(datapath.id)
+            self.packet_in_max_len.pop(datapath.id, None)
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def _flow_stats_reply_handler(self, ev):
+        if self.warm_restart and self.warm_restart.flow_stats_reply(ev.msg):
+            return
+        if self.flow_stats:
+            self.flow_stats.flow_stats_reply(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def _port_stats_reply_handler(self, ev):
+        if self.flow_stats:
+            self.flow_stats.port_stats_reply(ev.msg)
+
+    def _locate_host(self, match):
+        """流表匹配字段中目的主机所在的交换机(接入端口为边缘端口), 未知时返回None"""
+        mac = match.get('eth_dst')
+        if mac is None and isinstance(match.get('ipv6_dst'), str):
+            mac = self.nd_table.get(match['ipv6_dst'])
+        if not isinstance(mac, str):
+            return None
+        location = self._host_location(mac)
+        return location[0] if location else None
+
+    def _host_location(self, mac):
+        """主机的接入位置(dpid, 端口), 未知时返回None"""
+        if self.topology and mac in self.topology.hosts_by_mac:
+            host = self.topology.hosts_by_mac[mac]
+            return host['dpid'], host['port']
+        for dpid, table in self.mac_to_port.items():
+            port = table.get(mac)
+            if port is not None and port in self.flood_tree.edge_ports(dpid):
+                return dpid, port
+        return None
+
+    @set_ev_cls(ofp_event.EventOFPPortDescStatsReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _port_desc_stats_reply_handler(self, ev):
+        self.flood_tree.port_desc_reply(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def _flow_removed_handler(self, ev):
+        if self.flow_cache:
+            self.flow_cache.flow_removed(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _error_msg_handler(self, ev):
+        msg = ev.msg
+        batched = self.flow_batcher.error(msg)
+        if self.shard and self.shard.error(msg):
+            return
+        if self.flow_cache and self.flow_cache.error(msg):
+            return
+        if not batched:
+            self.logger.debug(f"dpid={msg.datapath.id} 错误消息 type={msg.type} code={msg.code}")
+
+    @set_ev_cls(ofp_event.EventOFPRoleReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _role_reply_handler(self, ev):
+        if self.shard:
+            self.shard.role_reply(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _barrier_reply_handler(self, ev):
+        self.flow_batcher.barrier_reply(ev.msg)
+
+    @set_ev_cls(RX_EVENTS, [HANDSHAKE_DISPATCHER, CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _channel_rx_handler(self, ev):
+        self.channel_stats.received(ev.msg)
+
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None, idle_timeout=0,
+                 meter_id=None, table_id=0, goto_table=None):
         """向交换机添加流表项"""
+        t = self.metrics.start()
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
-                                             actions)]
-        if buffer_id:
-            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
+        inst = []
+        if actions or goto_table is None:
+            inst.append(parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions))
+        if goto_table is not None:
+            inst.append(parser.OFPInstructionGotoTable(goto_table))
+        if meter_id is not None:
+            inst.insert(0, parser.OFPInstructionMeter(meter_id, ofproto.OFPIT_METER))
+        if buffer_id is not None and buffer_id != ofproto.OFP_NO_BUFFER:
+            mod = parser.OFPFlowMod(datapath=datapath, table_id=table_id, buffer_id=buffer_id,
                                     priority=priority, match=match,
                                     instructions=inst, idle_timeout=idle_timeout)
         else:
-            mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
+            mod = parser.OFPFlowMod(datapath=datapath, table_id=table_id, priority=priority,
                                     match=match, instructions=inst,
                                     idle_timeout=idle_timeout)
-        datapath.send_msg(mod)
+        if self.flow_cache:
+            self.flow_cache.install(datapath, mod)
+        else:
+            self.flow_batcher.send_msg(datapath, mod)
+        self.metrics.stage('add_flow', t)
+
+    def add_subnet(self, subnet, name, gateway_ip=None):
+        """运行时添加子网及其网关"""
+        self.subnets[subnet] = name
+        self.subnet_index.add(subnet)
+        if gateway_ip:
+            self.gateway_ips[subnet] = gateway_ip
+            self.nd_table.add_static(gateway_ip, self.router_mac)
+        self.logger.info(f"添加子网: {subnet} ({name})")
+
+    def remove_subnet(self, subnet):
+        """运行时删除子网及其网关"""
+        self.subnets.pop(subnet, None)
+        self.subnet_index.remove(subnet)
+        gateway_ip = self.gateway_ips.pop(subnet, None)
+        if gateway_ip:
+            self.nd_table.pop(gateway_ip, None)
+        self.logger.info(f"删除子网: {subnet}")
+
+    def _take_over(self, datapath):
+        """分片部署中接管交换机(原MASTER故障): 重新下发洪泛组、上送流表和清洗表项,
+        影子流表状态未知; 作为SLAVE时发出的消息都被过滤, 组不一定存在, 因此先重建洪泛组"""
+        dpid = datapath.id
+        if self.flow_cache:
+            self.flow_cache.remove(dpid)
+        self.flood_tree.reinstall(datapath)
+        self._install_punt_flows(datapath)
+        if dpid in self.proactive_flows:
+            self._install_proactive_flows(datapath)
+        if self.scrubbing:
+            self.scrubbing.switch_enter(dpid)
+            self.scrubbing.update()
+
+    def _replicated_neighbor(self, ip, mac):
+        """其他worker学习到的IPv6-MAC映射"""
+        self.nd_table[ip] = mac
+
+    def _new_mac_table(self):
+        return MacTable(self.mac_table_size, self.host_table_ttl)
+
+    def _aging_loop(self):
+        """周期性清理MAC表和邻居表中的过期表项, 每轮只扫描一部分槽位以免阻塞事件循环"""
+        while True:
+            hub.sleep(1)
+            expired = self.nd_table.expire(limit=8192)
+            for table in list(self.mac_to_port.values()):
+                expired += table.expire(limit=8192)
+            if expired:
+                self.logger.debug(f"老化清理{expired}个表项")
+
+    def table_stats(self):
+        """MAC表和邻居表的占用及淘汰/老化计数"""
+        return {
+            'nd_table': self.nd_table.get_stats(),
+            'mac_to_port': {dpid: table.get_stats()
+                            for dpid, table in self.mac_to_port.items()},
+        }
+
+    def packet_in_stats(self):
+        """每台交换机的packet-in准入/丢弃/采样计数"""
+        return self.packet_in_guard.get_stats()
+
+    def channel_bandwidth(self):
+        """控制通道收发字节数、截断节省的字节数及每秒速率"""
+        return self.channel_stats.get_stats()
 
     def _get_subnet(self, ip):
-        """获取IPv6地址所属子网"""
-        try:
-            ip_addr = ipaddress.ip_address(ip)
-            for subnet in self.subnets:
-                if ip_addr in ipaddress.ip_network(subnet):
-                    return subnet
-            return None
-        except ValueError:
-            return None
+        """获取IPv6地址所属子网(最长前缀匹配)"""
+        return self.subnet_index.lookup(ip)
 
     def _is_same_subnet(self, ip1, ip2):
         """判断两个IPv6地址是否在同一子网"""
@@ -118,70 +777,158 @@ class IPv6DatacenterController(app_manager.RyuApp):
         else:
             out = parser.OFPPacketOut(datapath=datapath, buffer_id=buffer_id,
                                       in_port=in_port, actions=actions)
-        datapath.send_msg(out)
+        self.flow_batcher.send_msg(datapath, out)
 
     def _handle_icmpv6(self, datapath, in_port, src_mac, dst_mac,
                        ipv6_pkt, icmpv6_pkt, data):
         """处理ICMPv6数据包(邻居发现协议)"""
         # 邻居请求(NS)处理
-        if icmpv6_pkt.type_ == icmpv6.ND_NEIGHBOR_SOLICIT:
-            # 获取目标IPv6地址 - 简化处理
-            if ipv6_pkt.dst.startswith('ff02::1:ff'):  # 组播地址前缀
-                target_ip = ipv6_pkt.dst.replace('ff02::1:ff', '2001:db8:')
-                if target_ip in self.nd_table:
-                    # 记录此请求,依靠主机预设的邻居表项
-                    self.logger.info(f"处理邻居请求: {target_ip}")
-                    return True
-
-        return False
+        target_ip = self.nd_proxy.solicit_target(icmpv6_pkt)
+        if target_ip is None:
+            return False
+
+        # 目标已知: 由控制器构造邻居通告从入端口发回
+        na = self.nd_proxy.handle_solicit(src_mac, ipv6_pkt, icmpv6_pkt)
+        if na is not None:
+            ofproto = datapath.ofproto
+            parser = datapath.ofproto_parser
+            actions = [parser.OFPActionOutput(in_port)]
+            self._send_packet_out(datapath, ofproto.OFP_NO_BUFFER,
+                                  ofproto.OFPP_CONTROLLER, actions, na)
+            self.logger.debug(f"代答邻居请求: {target_ip} -> {self.nd_table[target_ip]}")
+            return True
+
+        # 目标未知: 直接发往所有交换机的边缘端口, 避免逐跳洪泛和重复上送
+        self._flood_to_edge(datapath, in_port, data)
+        return True
+
+    def _install_host_route(self, datapath, ip, mac, port):
+        """边缘路由器上到一台主机的路由: 只匹配发往路由器MAC、目的精确为该主机的IPv6流量,
+        源地址通配, MAC改写和出端口取自邻居表和MAC表"""
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IPV6, eth_dst=self.router_mac,
+                                ipv6_dst=ip)
+        actions = [
+            parser.OFPActionSetField(eth_src=self.router_mac),
+            parser.OFPActionSetField(eth_dst=mac),
+            parser.OFPActionOutput(port)
+        ]
+        self.add_flow(datapath, 10, match, actions, idle_timeout=300, table_id=self._l3_table)
+
+    @property
+    def _l3_table(self):
+        return L3_TABLE if self.pipeline else 0
+
+    def _flood_to_edge(self, datapath, in_port, data):
+        """将包从控制器直接发送到所有交换机的已确认边缘端口(不含入端口)
+
+        分片部署中只发往本worker负责的交换机, 其余交换机由其他worker收到总线消息后发送。
+        """
+        if self.shard and datapath is not None:
+            self.shard.publish('flood', None, bytes(data).hex())
+        for dpid, dp in list(self.flood_tree.datapaths.items()):
+            if self.shard and not self.shard.is_master(dpid):
+                continue
+            ports = self.flood_tree.edge_ports(dpid)
+            if dp is datapath:
+                ports.discard(in_port)
+            if not ports:
+                continue
+            parser = dp.ofproto_parser
+            actions = [parser.OFPActionOutput(port) for port in sorted(ports)]
+            self._send_packet_out(dp, dp.ofproto.OFP_NO_BUFFER,
+                                  dp.ofproto.OFPP_CONTROLLER, actions, data)
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
         """处理交换机上报的数据包"""
-        msg = ev.msg
+        start = self.metrics.start()
+        if self.shard and not self.shard.admit(ev.msg.datapath.id):
+            return
+        if self.packet_trace:
+            self.packet_trace.record(ev.msg)
+        self._handle_packet_in(ev.msg, start)
+        self.metrics.stage('packet_in', start)
+
+    def _handle_packet_in(self, msg, t):
+        """packet-in处理流程, t为埋点计时起点(埋点关闭时为None)"""
         datapath = msg.datapath
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         in_port = msg.match['in_port']
         dpid = datapath.id
 
-        switch_name = self.dpid_to_name.get(dpid, f"dpid{dpid}")
+        self.channel_stats.packet_in(msg)
 
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        # 准入控制在解析前进行, 超限的packet-in直接丢弃
+        if not self.packet_in_guard.admit(dpid, msg.data):
+            return
+        t = self.metrics.stage('admit', t)
 
-        # 忽略LLDP包
-        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
+        # 快速解析包头, 仅在需要时回退到Ryu完整解析器
+        hdr = fast_packet.parse_headers(msg.data)
+        if hdr is None:
+            return
+        t = self.metrics.stage('parse', t)
+        self.metrics.packet_in(dpid, hdr.ethertype)
+
+        # LLDP包用于链路发现
+        if hdr.ethertype == ether_types.ETH_TYPE_LLDP:
+            link = self.flood_tree.lldp_packet_in(datapath, in_port, msg.data)
+            if link and self.shard:
+                self.shard.announce('link', *link, refresh=self.flood_tree.interval)
             return
 
-        dst_mac = eth.dst
-        src_mac = eth.src
+        dst_mac = hdr.dst
+        src_mac = hdr.src
 
-        # 学习MAC地址
+        # 学习MAC地址; 多级流表模式下源MAC学习表未命中时同时下发学习表项和转发表项
         self.mac_to_port[dpid][src_mac] = in_port
+        if self.pipeline and msg.table_id == LEARN_TABLE:
+            self._install_learned_host(datapath, src_mac, in_port)
+        t = self.metrics.stage('learn', t)
 
         # 处理IPv6包
-        if eth.ethertype == ether_types.ETH_TYPE_IPV6:
-            ipv6_pkt = pkt.get_protocol(ipv6.ipv6)
-            if ipv6_pkt:
-                # 记录IPv6-MAC映射
-                self.nd_table[ipv6_pkt.src] = src_mac
-
-                # 处理ICMPv6包
-                icmpv6_pkt = pkt.get_protocol(icmpv6.icmpv6)
-                if icmpv6_pkt:
-                    if self._handle_icmpv6(datapath, in_port, src_mac, dst_mac, ipv6_pkt, icmpv6_pkt, msg.data):
-                        return
+        if hdr.ethertype == ether_types.ETH_TYPE_IPV6:
+            if hdr.ipv6_src:
+                if self.ddos and dpid == self.edge_dpid:
+                    self.ddos.packet_in(msg.data, hdr.l3_offset)
+                ipv6_src = hdr.ipv6_src
+                ipv6_dst = hdr.ipv6_dst
+
+                # 记录IPv6-MAC映射; 清洗服务器送回的干净流量源MAC是清洗服务器, 不学习
+                returned = self.scrubbing is not None and self.scrubbing.returned(src_mac, ipv6_src)
+                if not returned:
+                    self.nd_table[ipv6_src] = src_mac
+                    if self.shard:
+                        self.shard.announce('nd', ipv6_src, src_mac,
+                                            refresh=self.host_table_ttl / 2)
+
+                # 清洗服务器对健康探测的邻居通告应答
+                if (self.scrubbing and dst_mac == self.router_mac
+                        and hdr.icmpv6_type == icmpv6.ND_NEIGHBOR_ADVERT
+                        and self.scrubbing.health_reply(ipv6_src)):
+                    return
+
+                # 处理ICMPv6邻居发现包(需要完整解析ND选项)
+                if hdr.needs_full_parse:
+                    pkt = packet.Packet(msg.data)
+                    ipv6_pkt = pkt.get_protocol(ipv6.ipv6)
+                    icmpv6_pkt = pkt.get_protocol(icmpv6.icmpv6)
+                    if icmpv6_pkt:
+                        if self._handle_icmpv6(datapath, in_port, src_mac, dst_mac, ipv6_pkt, icmpv6_pkt, msg.data):
+                            self.metrics.stage('nd', t)
+                            return
 
                 # 检查是否是跨子网通信
-                src_subnet = self._get_subnet(ipv6_pkt.src)
-                dst_subnet = self._get_subnet(ipv6_pkt.dst)
+                src_subnet = self._get_subnet(ipv6_src)
+                dst_subnet = self._get_subnet(ipv6_dst)
 
                 # 如果是边缘路由器并且是跨子网通信
                 if dpid == self.edge_dpid and src_subnet != dst_subnet:
                     # 如果目标IPv6在邻居表中
-                    if ipv6_pkt.dst in self.nd_table:
-                        dst_mac = self.nd_table[ipv6_pkt.dst]
+                    if ipv6_dst in self.nd_table:
+                        dst_mac = self.nd_table[ipv6_dst]
 
                         # 如果知道目标主机端口
                         if dst_mac in self.mac_to_port[dpid]:
@@ -194,26 +941,35 @@ class IPv6DatacenterController(app_manager.RyuApp):
                                 parser.OFPActionOutput(out_port)
                             ]
 
-                            # 安装正向流表
-                            match = parser.OFPMatch(
-                                eth_type=ether_types.ETH_TYPE_IPV6,
-                                ipv6_src=str(ipv6_pkt.src),
-                                ipv6_dst=str(ipv6_pkt.dst)
-                            )
-                            self.add_flow(datapath, 10, match, actions, idle_timeout=300)
-
-                            # 安装反向流表
-                            reverse_match = parser.OFPMatch(
-                                eth_type=ether_types.ETH_TYPE_IPV6,
-                                ipv6_src=str(ipv6_pkt.dst),
-                                ipv6_dst=str(ipv6_pkt.src)
-                            )
-                            reverse_actions = [
-                                parser.OFPActionSetField(eth_src=self.router_mac),
-                                parser.OFPActionSetField(eth_dst=src_mac),
-                                parser.OFPActionOutput(in_port)
-                            ]
-                            self.add_flow(datapath, 10, reverse_match, reverse_actions, idle_timeout=300)
+                            if self.l3_flow_mode == 'host':
+                                # 按目的主机路由: 正反两个方向各一条通配源地址的主机路由
+                                self._install_host_route(datapath, ipv6_dst, dst_mac, out_port)
+                                if not returned:
+                                    self._install_host_route(datapath, ipv6_src, src_mac, in_port)
+                            else:
+                                # 安装正向流表
+                                match = parser.OFPMatch(
+                                    eth_type=ether_types.ETH_TYPE_IPV6,
+                                    ipv6_src=ipv6_src,
+                                    ipv6_dst=ipv6_dst
+                                )
+                                self.add_flow(datapath, 10, match, actions, idle_timeout=300,
+                                              table_id=self._l3_table)
+
+                                # 安装反向流表(清洗服务器送回的流量不知道真实源的位置, 不安装)
+                                if not returned:
+                                    reverse_match = parser.OFPMatch(
+                                        eth_type=ether_types.ETH_TYPE_IPV6,
+                                        ipv6_src=ipv6_dst,
+                                        ipv6_dst=ipv6_src
+                                    )
+                                    reverse_actions = [
+                                        parser.OFPActionSetField(eth_src=self.router_mac),
+                                        parser.OFPActionSetField(eth_dst=src_mac),
+                                        parser.OFPActionOutput(in_port)
+                                    ]
+                                    self.add_flow(datapath, 10, reverse_match, reverse_actions,
+                                                  idle_timeout=300, table_id=self._l3_table)
 
                             # 发送当前包
                             self._send_packet_out(datapath, msg.buffer_id, in_port,
@@ -221,8 +977,11 @@ class IPv6DatacenterController(app_manager.RyuApp):
                             return
                         else:
                             # 目标MAC未知端口，洪泛
-                            self.logger.info(f"目标MAC {dst_mac} 端口未知, 洪泛")
-                            actions = [parser.OFPActionOutput(ofproto.OFPP_FLOOD)]
+                            if self.event_log:
+                                self.event_log.emit('l3_flood', dpid=dpid, dst=dst_mac)
+                            else:
+                                self.logger.info(f"目标MAC {dst_mac} 端口未知, 洪泛")
+                            actions = self.flood_tree.flood_actions(datapath)
                             self._send_packet_out(datapath, msg.buffer_id, in_port,
                                                   actions, msg.data)
                             return
@@ -231,21 +990,27 @@ class IPv6DatacenterController(app_manager.RyuApp):
         if dst_mac in self.mac_to_port[dpid]:
             # 已知目标端口，直接发送
             out_port = self.mac_to_port[dpid][dst_mac]
-            self.logger.info(f"{switch_name}: {src_mac}->{dst_mac} 从端口{in_port}到端口{out_port}")
+            if self.event_log:
+                self.event_log.emit('l2_forward', dpid=dpid, src=src_mac, dst=dst_mac,
+                                    in_port=in_port, out_port=out_port)
+            else:
+                switch_name = self.dpid_to_name.get(dpid, f"dpid{dpid}")
+                self.logger.info(f"{switch_name}: {src_mac}->{dst_mac} 从端口{in_port}到端口{out_port}")
 
             actions = [parser.OFPActionOutput(out_port)]
 
             # 安装流表
             match = parser.OFPMatch(eth_dst=dst_mac)
+            table_id = L2_TABLE if self.pipeline else 0
             if msg.buffer_id != ofproto.OFP_NO_BUFFER:
-                self.add_flow(datapath, 1, match, actions, buffer_id=msg.buffer_id, idle_timeout=300)
+                self.add_flow(datapath, 1, match, actions, buffer_id=msg.buffer_id, idle_timeout=300,
+                              table_id=table_id)
                 return
             else:
-                self.add_flow(datapath, 1, match, actions, idle_timeout=300)
+                self.add_flow(datapath, 1, match, actions, idle_timeout=300, table_id=table_id)
         else:
             # 目标MAC未知，洪泛
-            out_port = ofproto.OFPP_FLOOD
-            actions = [parser.OFPActionOutput(out_port)]
+            actions = self.flood_tree.flood_actions(datapath)
 
         # 发送包
         self._send_packet_out(datapath, msg.buffer_id, in_port, actions, msg.data)
\ No newline at end of file
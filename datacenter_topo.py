@@ -6,19 +6,58 @@ from mininet.cli import CLI
 from mininet.log import setLogLevel, info
 from mininet.link import TCLink
 from mininet.node import Node
-import time
 import os
 import sys
 
+from fabric_topo import (DATACENTER_GATEWAY, EXTERNAL_GATEWAY, EXTERNAL_PREFIX, add_controllers,
+                         configure_hosts, wait_connected, wait_flood_ready)
+from topology import Topology
+
+
+def exportTopology(net, path):
+    """导出拓扑描述(dpid、主机MAC/IPv6及接入端口、交换机间链路)供控制器主动下发流表"""
+    switches = {int(sw.dpid, 16): sw.name for sw in net.switches}
+    by_name = {name: dpid for dpid, name in switches.items()}
+    hosts = []
+    links = []
+    for link in net.links:
+        intf1, intf2 = link.intf1, link.intf2
+        node1, node2 = intf1.node, intf2.node
+        if node1.name in by_name and node2.name in by_name:
+            links.append({'src': by_name[node1.name], 'src_port': node1.ports[intf1],
+                          'dst': by_name[node2.name], 'dst_port': node2.ports[intf2]})
+            continue
+        if node1.name not in by_name:
+            node1, intf1, node2, intf2 = node2, intf2, node1, intf1
+        ip, prefixlen = node2.params['ip'].split('/')
+        hosts.append({'name': node2.name, 'mac': node2.params['mac'], 'ip': ip,
+                      'prefixlen': int(prefixlen), 'dpid': by_name[node1.name],
+                      'port': node1.ports[intf1]})
+    Topology(switches, hosts, links).save(path)
+
+
+def hostConfigs(net):
+    """各主机的地址和默认网关, 供fabric_topo.configure_hosts批量并发配置"""
+    hosts = []
+    for host in net.hosts:
+        ip, prefixlen = host.params['ip'].split('/')
+        gateway = EXTERNAL_GATEWAY if ip.startswith(EXTERNAL_PREFIX) else DATACENTER_GATEWAY
+        hosts.append({'name': host.name, 'ip': ip, 'prefixlen': int(prefixlen),
+                      'gateway': gateway})
+    return hosts
+
+
+def createDatacenterNet(link_bw=None, scrubber_bw=None):
+    # link_bw: spine与leaf之间链路的带宽限制(Mbit/s), None为不限速
+    # scrubber_bw: leaf5与h5a/h5b/h5c(清洗服务器)之间链路的带宽限制(Mbit/s)
+    uplink = {'bw': link_bw} if link_bw else {}
+    scrubber_link = {'bw': scrubber_bw} if scrubber_bw else {}
 
-def createDatacenterNet():
     # 创建网络并添加节点
     net = Mininet(controller=RemoteController, link=TCLink, switch=OVSKernelSwitch)
 
-    # 添加控制器
-    controller_ip = os.environ.get('CONTROLLER_IP', '127.0.0.1')
-    info(f'*** 添加控制器 (IP: {controller_ip})\n')
-    c0 = net.addController('c0', controller=RemoteController, ip=controller_ip, port=6633)
+    # 添加控制器(分片部署时连接全部worker)
+    controllers = add_controllers(net)
 
     # 添加交换机 - 外部网络
     info('*** 添加外部网络交换机\n')
@@ -89,23 +128,23 @@ def createDatacenterNet():
     net.addLink(edge_router, spine3)
 
     # 汇聚层连接接入层
-    net.addLink(spine1, leaf1)
-    net.addLink(spine1, leaf2)
-    net.addLink(spine1, leaf3)
-    net.addLink(spine1, leaf4)
-    net.addLink(spine1, leaf5)
-
-    net.addLink(spine2, leaf1)
-    net.addLink(spine2, leaf2)
-    net.addLink(spine2, leaf3)
-    net.addLink(spine2, leaf4)
-    net.addLink(spine2, leaf5)
-
-    net.addLink(spine3, leaf1)
-    net.addLink(spine3, leaf2)
-    net.addLink(spine3, leaf3)
-    net.addLink(spine3, leaf4)
-    net.addLink(spine3, leaf5)
+    net.addLink(spine1, leaf1, **uplink)
+    net.addLink(spine1, leaf2, **uplink)
+    net.addLink(spine1, leaf3, **uplink)
+    net.addLink(spine1, leaf4, **uplink)
+    net.addLink(spine1, leaf5, **uplink)
+
+    net.addLink(spine2, leaf1, **uplink)
+    net.addLink(spine2, leaf2, **uplink)
+    net.addLink(spine2, leaf3, **uplink)
+    net.addLink(spine2, leaf4, **uplink)
+    net.addLink(spine2, leaf5, **uplink)
+
+    net.addLink(spine3, leaf1, **uplink)
+    net.addLink(spine3, leaf2, **uplink)
+    net.addLink(spine3, leaf3, **uplink)
+    net.addLink(spine3, leaf4, **uplink)
+    net.addLink(spine3, leaf5, **uplink)
 
     # 接入层连接主机
     net.addLink(leaf1, h1a)
@@ -120,71 +159,52 @@ def createDatacenterNet():
     net.addLink(leaf4, h4a)
     net.addLink(leaf4, h4b)
 
-    net.addLink(leaf5, h5a)
-    net.addLink(leaf5, h5b)
-    net.addLink(leaf5, h5c)
+    net.addLink(leaf5, h5a, **scrubber_link)
+    net.addLink(leaf5, h5b, **scrubber_link)
+    net.addLink(leaf5, h5c, **scrubber_link)
 
     # 启动网络
     info('*** 启动网络\n')
     net.build()
-    c0.start()
+
+    # 在交换机连接控制器之前导出拓扑, 供控制器主动模式使用
+    topology_file = os.environ.get('DC_TOPOLOGY')
+    if topology_file:
+        info(f'*** 导出拓扑描述到 {topology_file}\n')
+        exportTopology(net, topology_file)
+
+    for controller in controllers:
+        controller.start()
 
     # 启动所有交换机
     info('*** 启动交换机\n')
-    external_switch.start([c0])
-    edge_router.start([c0])
-    spine1.start([c0])
-    spine2.start([c0])
-    spine3.start([c0])
-    leaf1.start([c0])
-    leaf2.start([c0])
-    leaf3.start([c0])
-    leaf4.start([c0])
-    leaf5.start([c0])
-
-    # 配置主机默认网关 - 与控制器中定义的网关IP匹配
+    external_switch.start(controllers)
+    edge_router.start(controllers)
+    spine1.start(controllers)
+    spine2.start(controllers)
+    spine3.start(controllers)
+    leaf1.start(controllers)
+    leaf2.start(controllers)
+    leaf3.start(controllers)
+    leaf4.start(controllers)
+    leaf5.start(controllers)
+
+    # 配置主机默认网关(与控制器中定义的网关IP匹配), 各主机并发执行
     info('*** 配置默认网关\n')
-    # 外部网络主机配置网关
-    h6.cmd('ip -6 route add default via 2001:db8:1::ffff')
-    h7.cmd('ip -6 route add default via 2001:db8:1::ffff')
-    h8.cmd('ip -6 route add default via 2001:db8:1::ffff')
-
-    # 数据中心网络主机配置网关
-    h1a.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h1b.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h2a.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h2b.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h3a.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h3b.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h4a.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h4b.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h5a.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h5b.cmd('ip -6 route add default via 2001:db8:2::ffff')
-    h5c.cmd('ip -6 route add default via 2001:db8:2::ffff')
-
-    # 初始化邻居表
-    info('*** 初始化主机邻居表\n')
-    # 外部网络主机的网关邻居
-    h6.cmd('ip -6 neigh add 2001:db8:1::ffff lladdr 00:00:00:00:00:f0 dev h6-eth0')
-    h7.cmd('ip -6 neigh add 2001:db8:1::ffff lladdr 00:00:00:00:00:f0 dev h7-eth0')
-    h8.cmd('ip -6 neigh add 2001:db8:1::ffff lladdr 00:00:00:00:00:f0 dev h8-eth0')
-
-    # 数据中心网络主机的网关邻居
-    h1a.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h1a-eth0')
-    h1b.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h1b-eth0')
-    h2a.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h2a-eth0')
-    h2b.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h2b-eth0')
-    h3a.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h3a-eth0')
-    h3b.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h3b-eth0')
-    h4a.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h4a-eth0')
-    h4b.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h4b-eth0')
-    h5a.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h5a-eth0')
-    h5b.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h5b-eth0')
-    h5c.cmd('ip -6 neigh add 2001:db8:2::ffff lladdr 00:00:00:00:00:f0 dev h5c-eth0')
-
-    # 等待控制器连接
+    failed = configure_hosts(net, hostConfigs(net))
+    if failed:
+        info(f'*** 主机配置失败: {failed}\n')
+
+    # 网关邻居表项由控制器的ND代理应答邻居请求获得, 无需在主机上预置
+
+    # 等待交换机实际连上控制器, 再轮询直到控制器确认端口并填好每台交换机的洪泛组
     info('*** 等待控制器连接\n')
-    time.sleep(10)  # 保持10秒的等待时间
+    pending = wait_connected(net.switches)
+    if pending:
+        info(f'*** 仍有交换机未连接控制器: {pending}\n')
+    pending = wait_flood_ready(net.switches)
+    if pending:
+        info(f'*** 洪泛组仍未就绪: {pending}\n')
 
     return net
 
@@ -0,0 +1,360 @@
+import ipaddress
+import socket
+import time
+
+import numpy as np
+from ryu.lib import hub
+from ryu.lib.packet import ether_types
+
+from flow_stats import flow_key
+
+# 丢弃表项优先级: 高于清洗引流(18), 低于邻居请求上送(20)
+DROP_PRIORITY = 19
+
+_U64 = np.uint64
+_GOLDEN = _U64(0x9e3779b97f4a7c15)
+
+
+def mix64(x):
+    """splitmix64终结函数, 对uint64数组逐元素做雪崩哈希"""
+    x = (x ^ (x >> _U64(30))) * _U64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> _U64(27))) * _U64(0x94d049bb133111eb)
+    return x ^ (x >> _U64(31))
+
+
+def address_keys(hi, lo):
+    """128位地址(高/低64位数组)的64位哈希键"""
+    return mix64(hi ^ mix64(lo + _GOLDEN))
+
+
+def _bit_length(x):
+    """uint64数组逐元素的有效位数(0的位数为0)"""
+    hi = (x >> _U64(32)).astype(np.float64)
+    lo = (x & _U64(0xffffffff)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+class CountMinSketch(object):
+    """count-min草图: depth行×width列计数器, 估计值为各行计数的最小值(只会高估)"""
+
+    def __init__(self, width=1 << 16, depth=4, seed=1):
+        if width & (width - 1):
+            raise ValueError("width必须是2的幂")
+        self.width = width
+        self.depth = depth
+        self.shift = _U64(64 - width.bit_length() + 1)
+        self.seeds = np.random.default_rng(seed).integers(
+            1, 2 ** 63, size=depth, dtype=np.uint64) | _U64(1)
+        self.counts = np.zeros((depth, width), dtype=np.float64)
+
+    def _index(self, keys):
+        return (mix64(keys[np.newaxis, :] ^ self.seeds[:, np.newaxis]) >> self.shift).astype(np.intp)
+
+    def add(self, keys, counts):
+        idx = self._index(keys)
+        for row in range(self.depth):
+            self.counts[row] += np.bincount(idx[row], weights=counts, minlength=self.width)
+
+    def estimate(self, keys):
+        idx = self._index(np.asarray(keys, dtype=np.uint64))
+        return self.counts[np.arange(self.depth)[:, np.newaxis], idx].min(axis=0)
+
+    def reset(self):
+        self.counts.fill(0)
+
+
+class SpaceSaving(object):
+    """Space-Saving高频项跟踪, 按批次向量化更新
+
+    一批中已跟踪的键直接累加; 未跟踪的键以"当前最小计数+本批计数"进入候选,
+    与已跟踪项一起只保留计数最大的capacity项。任何未被跟踪的键的真实计数
+    不超过表中最小计数, 表中计数减去error是真实计数的下界。
+    """
+
+    def __init__(self, capacity=256, payload_width=2):
+        self.capacity = capacity
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.float64)
+        self.errors = np.zeros(0, dtype=np.float64)
+        self.payload = np.zeros((0, payload_width), dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, keys, counts, payload):
+        if not len(keys):
+            return
+        ukeys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        weights = np.bincount(inverse, weights=counts)
+        upayload = payload[first]
+
+        order = np.argsort(self.keys)
+        pos = np.searchsorted(self.keys, ukeys, sorter=order)
+        pos = np.minimum(pos, max(len(self.keys) - 1, 0))
+        tracked = np.zeros(len(ukeys), dtype=bool)
+        if len(self.keys):
+            pos = order[pos]
+            tracked = self.keys[pos] == ukeys
+            self.counts[pos[tracked]] += weights[tracked]
+
+        new = ~tracked
+        floor = self.counts.min() if len(self.keys) >= self.capacity else 0.0
+        keys = np.concatenate((self.keys, ukeys[new]))
+        counts = np.concatenate((self.counts, floor + weights[new]))
+        errors = np.concatenate((self.errors, np.full(int(new.sum()), floor)))
+        payload = np.concatenate((self.payload, upayload[new]))
+        if len(keys) > self.capacity:
+            keep = np.argpartition(-counts, self.capacity - 1)[:self.capacity]
+            keys, counts, errors, payload = keys[keep], counts[keep], errors[keep], payload[keep]
+        self.keys, self.counts, self.errors, self.payload = keys, counts, errors, payload
+
+    def top(self, n=None):
+        """按计数降序返回[(键, 计数, 误差, 附带数据)]"""
+        order = np.argsort(-self.counts)[:n]
+        return [(int(self.keys[i]), float(self.counts[i]), float(self.errors[i]), self.payload[i])
+                for i in order.tolist()]
+
+    def reset(self):
+        self.__init__(self.capacity, self.payload.shape[1])
+
+
+class HyperLogLog(object):
+    """HyperLogLog基数估计, 2^precision个6位寄存器(以uint8保存), 标准误差约1.04/sqrt(m)"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, hashes):
+        p = _U64(self.precision)
+        idx = (hashes >> (_U64(64) - p)).astype(np.intp)
+        rest = hashes & ((_U64(1) << (_U64(64) - p)) - _U64(1))
+        rho = (64 - self.precision + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rho)
+
+    def estimate(self):
+        estimate = self.alpha * self.m * self.m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # 小基数时用线性计数修正
+            estimate = self.m * np.log(self.m / zeros)
+        return float(estimate)
+
+    def reset(self):
+        self.registers.fill(0)
+
+
+class DDoSDetector(object):
+    """边缘路由器入向流量的固定内存流式DDoS检测
+
+    输入为边缘路由器的packet-in(流表未命中的首包)和流统计中各L3流表项
+    本轮的包增量, 两者互不重叠。只统计目的地址在受保护前缀内、源地址在其外的
+    入向流量。观测先放入待处理队列, 每flush_interval秒一次性向量化更新:
+    count-min草图(单源包数)、按源地址和按源/64前缀的Space-Saving高频项表、
+    HyperLogLog不同源地址数。内存与源地址数量无关。
+
+    每个window秒的窗口结束时检查阈值:
+    - 单个源地址超过source_pps: 在边缘路由器下发丢弃表项;
+    - 不同源地址数超过distinct(伪造源攻击)且某/64前缀超过prefix_pps: 有清洗
+      集群时把该前缀引流到清洗服务器, 否则丢弃该前缀。
+    处置持续block_seconds秒(丢弃表项的hard_timeout), 到期后如仍超限会再次处置。
+    """
+
+    def __init__(self, logger, send_msg, datapaths, edge_dpid, protected='2001:db8:2::/48',
+                 source_pps=1000.0, prefix_pps=5000.0, distinct=1000, window=5.0,
+                 block_seconds=60, steer=None, unsteer=None, collector=None,
+                 width=1 << 16, depth=4, capacity=256, precision=14,
+                 flush_interval=0.5, max_pending=1 << 18, clock=time.monotonic):
+        self.logger = logger
+        self.send_msg = send_msg      # send_msg(datapath, msg)
+        self.datapaths = datapaths    # dpid -> datapath
+        self.edge_dpid = edge_dpid
+        network = ipaddress.IPv6Network(protected)
+        if network.prefixlen > 64:
+            raise ValueError("受保护前缀长度不能超过/64")
+        self.protected = _U64(int(network.network_address) >> 64)
+        self.protected_mask = _U64(int(network.netmask) >> 64)
+        self.source_pps = source_pps
+        self.prefix_pps = prefix_pps
+        self.distinct = distinct
+        self.window = window
+        self.block_seconds = block_seconds
+        self.steer = steer            # steer(前缀字符串), 为None时前缀级处置为丢弃
+        self.unsteer = unsteer
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.clock = clock
+
+        self.sketch = CountMinSketch(width, depth)
+        self.sources = SpaceSaving(capacity, payload_width=2)
+        self.prefixes = SpaceSaving(capacity, payload_width=1)
+        self.hll = HyperLogLog(precision)
+        self.window_start = clock()
+        self.window_packets = 0.0
+        self.pending = []             # packet-in的源+目的地址(32字节)
+        self.pending_flows = []       # (源+目的地址, 包增量)
+        self.mitigated = {}           # (地址或前缀, 处置方式) -> 到期时间
+        self.stats = {'packet_ins': 0, 'flow_packets': 0, 'overflow': 0,
+                      'blocked_sources': 0, 'blocked_prefixes': 0, 'redirected_prefixes': 0}
+        self.last_window = {}
+        if collector is not None:
+            collector.listeners.append(self.flow_stats)
+
+    def packet_in(self, data, l3_offset):
+        """边缘路由器的IPv6 packet-in, 只复制源/目的地址"""
+        if len(self.pending) >= self.max_pending:
+            self.stats['overflow'] += 1
+            return
+        self.pending.append(bytes(data[l3_offset + 8:l3_offset + 40]))
+
+    def flow_stats(self, dpid, body, table):
+        """FlowStatsCollector监听回调: 取边缘路由器L3流表项本轮的包增量"""
+        if dpid != self.edge_dpid:
+            return
+        for stat in body:
+            src = stat.match.get('ipv6_src')
+            dst = stat.match.get('ipv6_dst')
+            if not isinstance(src, str) or not isinstance(dst, str):
+                continue
+            slot = table.slots.get(flow_key(stat))
+            packets = int(table.delta_packets[slot]) if slot is not None else 0
+            if packets:
+                self.pending_flows.append((socket.inet_pton(socket.AF_INET6, src) +
+                                           socket.inet_pton(socket.AF_INET6, dst), packets))
+
+    def run(self):
+        """后台循环, 由应用通过hub.spawn启动"""
+        while True:
+            hub.sleep(self.flush_interval)
+            self.flush()
+            if self.clock() - self.window_start >= self.window:
+                self.evaluate()
+
+    def flush(self):
+        """把待处理的观测批量写入草图"""
+        pending, self.pending = self.pending, []
+        flows, self.pending_flows = self.pending_flows, []
+        if not pending and not flows:
+            return
+        self.stats['packet_ins'] += len(pending)
+        records = b''.join(pending) + b''.join(record for record, _ in flows)
+        counts = np.concatenate((np.ones(len(pending)),
+                                 np.array([packets for _, packets in flows], dtype=np.float64)))
+        self.stats['flow_packets'] += int(counts[len(pending):].sum())
+        words = np.frombuffer(records, dtype='>u8').astype(np.uint64).reshape(-1, 4)
+        self.ingest(words[:, 0], words[:, 1], words[:, 2], counts)
+
+    def ingest(self, src_hi, src_lo, dst_hi, counts):
+        """向量化更新: 过滤入向流量后写入count-min、高频项表和HyperLogLog"""
+        inbound = (((dst_hi & self.protected_mask) == self.protected)
+                   & ((src_hi & self.protected_mask) != self.protected))
+        if not inbound.all():
+            src_hi, src_lo, counts = src_hi[inbound], src_lo[inbound], counts[inbound]
+        if not len(counts):
+            return
+        keys = address_keys(src_hi, src_lo)
+        self.sketch.add(keys, counts)
+        self.sources.update(keys, counts, np.stack((src_hi, src_lo), axis=1))
+        self.prefixes.update(src_hi, counts, src_hi[:, np.newaxis])
+        self.hll.add(keys)
+        self.window_packets += float(counts.sum())
+
+    def heavy_sources(self, elapsed):
+        """本窗口内超过source_pps的源地址[(地址, 包/秒)], count-min与Space-Saving估计取较小值"""
+        candidates = [item for item in self.sources.top()
+                      if item[1] / elapsed >= self.source_pps]
+        if not candidates:
+            return []
+        estimates = self.sketch.estimate([key for key, _, _, _ in candidates])
+        result = []
+        for (key, count, _, payload), estimate in zip(candidates, estimates.tolist()):
+            pps = min(count, estimate) / elapsed
+            if pps >= self.source_pps:
+                address = ipaddress.IPv6Address((int(payload[0]) << 64) | int(payload[1]))
+                result.append((str(address), pps))
+        return result
+
+    def heavy_prefixes(self, elapsed):
+        """本窗口内超过prefix_pps的源/64前缀[(前缀, 包/秒)]"""
+        result = []
+        for _, count, _, payload in self.prefixes.top():
+            if count / elapsed < self.prefix_pps:
+                break
+            network = ipaddress.IPv6Network((int(payload[0]) << 64, 64))
+            result.append((str(network), count / elapsed))
+        return result
+
+    def evaluate(self):
+        """窗口结束: 检查阈值并处置, 然后清空草图开始新窗口"""
+        now = self.clock()
+        elapsed = max(now - self.window_start, 1e-3)
+        distinct = self.hll.estimate()
+        sources = self.heavy_sources(elapsed) if self.source_pps else []
+        prefixes = []
+        if self.prefix_pps and distinct >= self.distinct:
+            prefixes = self.heavy_prefixes(elapsed)
+        self.last_window = {
+            'seconds': elapsed, 'pps': self.window_packets / elapsed,
+            'distinct_sources': distinct,
+            'heavy_sources': sources, 'heavy_prefixes': prefixes,
+        }
+
+        self.expire(now)
+        for address, pps in sources:
+            self._drop(address, 128, pps, now)
+        for prefix, pps in prefixes:
+            if self.steer is not None:
+                self._redirect(prefix, pps, now)
+            else:
+                self._drop(prefix, 64, pps, now)
+
+        self.sketch.reset()
+        self.sources.reset()
+        self.prefixes.reset()
+        self.hll.reset()
+        self.window_packets = 0.0
+        self.window_start = now
+
+    def _drop(self, address, prefixlen, pps, now):
+        key = (f"{address.split('/')[0]}/{prefixlen}", 'drop')
+        if key in self.mitigated:
+            return
+        self.mitigated[key] = now + self.block_seconds
+        self.stats['blocked_sources' if prefixlen == 128 else 'blocked_prefixes'] += 1
+        self.logger.warning(f"DDoS: {key[0]} 速率{pps:.0f}包/秒, 在边缘路由器丢弃{self.block_seconds}秒")
+        datapath = self.datapaths.get(self.edge_dpid)
+        if datapath is None:
+            return
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        network = ipaddress.IPv6Network(key[0], strict=False)
+        match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IPV6,
+                                ipv6_src=(str(network.network_address), str(network.netmask)))
+        self.send_msg(datapath, parser.OFPFlowMod(
+            datapath=datapath, priority=DROP_PRIORITY, match=match, instructions=[],
+            hard_timeout=self.block_seconds))
+
+    def _redirect(self, prefix, pps, now):
+        key = (prefix, 'redirect')
+        if key in self.mitigated:
+            return
+        self.mitigated[key] = now + self.block_seconds
+        self.stats['redirected_prefixes'] += 1
+        self.logger.warning(f"DDoS: {prefix} 速率{pps:.0f}包/秒, 不同源地址约"
+                            f"{self.last_window['distinct_sources']:.0f}个, 引流到清洗集群")
+        self.steer(prefix)
+
+    def expire(self, now):
+        """处置到期: 丢弃表项由hard_timeout删除, 引流需要撤销"""
+        for key in [key for key, deadline in self.mitigated.items() if deadline <= now]:
+            del self.mitigated[key]
+            if key[1] == 'redirect' and self.unsteer is not None:
+                self.unsteer(key[0])
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['mitigations'] = len(self.mitigated)
+        stats['last_window'] = self.last_window
+        return stats
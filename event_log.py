@@ -0,0 +1,110 @@
+import json
+import time
+from collections import deque
+
+from ryu.lib import hub
+
+from packet_in_guard import TokenBucket
+
+
+def parse_rates(text):
+    """解析"事件类型=值,..."格式的配置, 如"l2_forward=0.01,flood=100"; *表示默认值"""
+    rates = {}
+    for item in (text or '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            rates[name.strip()] = float(value)
+    return rates
+
+
+class EventLog(object):
+    """异步结构化事件日志
+
+    emit()只做采样/限速判断并把(时间, 类型, 字段)放入有界环形缓冲区, 不做任何
+    字符串格式化和I/O; 后台循环批量取出事件, 序列化为JSON行写入文件(或日志器)。
+    缓冲区满时丢弃最旧的事件并计数。采样率按事件类型配置(1为全部记录, 0.01为
+    每100个记录1个), 限速为每秒最多记录的事件数。
+    """
+
+    def __init__(self, logger, path=None, capacity=65536, sample_rates=None,
+                 rate_limits=None, interval=0.1, clock=time.time):
+        self.logger = logger
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self.buffer = deque(maxlen=capacity)
+        self.sample_rates = dict(sample_rates or {})
+        self.default_sample = self.sample_rates.pop('*', 1.0)
+        self.rate_limits = dict(rate_limits or {})
+        self.default_limit = self.rate_limits.pop('*', 0)
+        self._sample_credit = {}  # 事件类型 -> 累计采样额度
+        self._buckets = {}        # 事件类型 -> TokenBucket
+        self.stats = {'emitted': 0, 'sampled_out': 0, 'rate_limited': 0,
+                      'overflow': 0, 'written': 0}
+        self._sink = open(path, 'a') if path else None
+
+    def emit(self, event, **fields):
+        """记录一个事件, 返回是否进入缓冲区"""
+        stats = self.stats
+        rate = self.sample_rates.get(event, self.default_sample)
+        if rate < 1:
+            # 确定性采样: 每个事件累加rate, 额度满1时记录一次
+            credit = self._sample_credit.get(event, 0.0) + rate
+            if credit < 1:
+                self._sample_credit[event] = credit
+                stats['sampled_out'] += 1
+                return False
+            self._sample_credit[event] = credit - 1
+
+        now = self.clock()
+        limit = self.rate_limits.get(event, self.default_limit)
+        if limit:
+            bucket = self._buckets.get(event)
+            if bucket is None:
+                bucket = self._buckets[event] = TokenBucket(limit, limit, now)
+            if not bucket.consume(now):
+                stats['rate_limited'] += 1
+                return False
+
+        buffer = self.buffer
+        if len(buffer) == buffer.maxlen:
+            stats['overflow'] += 1
+        buffer.append((now, event, fields))
+        stats['emitted'] += 1
+        return True
+
+    def run(self):
+        """后台写出循环, 由应用通过hub.spawn启动"""
+        while True:
+            hub.sleep(self.interval)
+            self.drain()
+
+    def drain(self):
+        """取出缓冲区中的全部事件并写出, 返回写出的事件数"""
+        buffer = self.buffer
+        count = len(buffer)
+        if not count:
+            return 0
+        lines = []
+        for _ in range(count):
+            ts, event, fields = buffer.popleft()
+            record = {'ts': round(ts, 6), 'event': event}
+            record.update(fields)
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        if self._sink is not None:
+            self._sink.write('\n'.join(lines) + '\n')
+            self._sink.flush()
+        else:
+            for line in lines:
+                self.logger.info(line)
+        self.stats['written'] += count
+        return count
+
+    def close(self):
+        self.drain()
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def get_stats(self):
+        return dict(self.stats, buffered=len(self.buffer))
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# 参数化数据中心拓扑: k叉fat-tree或N-spine/M-leaf, 交换机dpid、主机MAC/IPv6地址和端口号
+# 全部按规则生成并导出为控制器的拓扑描述(DC_TOPOLOGY)。外部网络交换机(dpid=1)和边缘路由器
+# (dpid=2)与控制器的默认配置一致, 边缘路由器连接最上层(spine或core)的全部交换机。
+#   sudo python3 fabric_topo.py --fat-tree 8 --export fabric.json
+#   sudo python3 fabric_topo.py --leaf-spine 4x32 --hosts 40 --ping 100
+#   python3 fabric_topo.py --fat-tree 16 --export fabric.json --plan-only   # 不启动Mininet
+#
+# 启动时主机配置按主机批量并发执行(每台主机一次shell调用), 交换机由Mininet批量启动,
+# 之后轮询OVS数据库等待全部交换机连上控制器, 再轮询各交换机的洪泛组直到控制器填好, 不再固定等待。
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+from topology import Topology
+
+EXTERNAL_DPID = 1
+EDGE_DPID = 2
+EXTERNAL_PREFIX = '2001:db8:1::'
+DATACENTER_PREFIX = '2001:db8:2::'
+EXTERNAL_GATEWAY = '2001:db8:1::ffff'
+DATACENTER_GATEWAY = '2001:db8:2::ffff'
+# 控制器下发的洪泛组组号(与flood_tree.FLOOD_GROUP_ID一致; 拓扑脚本不依赖ryu)
+FLOOD_GROUP_ID = 0xfffff000
+
+
+class FabricPlan(object):
+    """拓扑规划: 交换机、主机和链路, 端口号在加入链路时按交换机依次分配
+
+    switches: [{name, dpid, role}]
+    hosts:    [{name, mac, ip, prefixlen, dpid, port, gateway}]
+    links:    [{src, src_port, dst, dst_port, uplink}]   # 交换机间链路, src/dst为dpid
+    """
+
+    def __init__(self):
+        self.switches = []
+        self.hosts = []
+        self.links = []
+        self._next_port = {}   # dpid -> 下一个可用端口号
+
+    def add_switch(self, name, dpid, role):
+        self.switches.append({'name': name, 'dpid': dpid, 'role': role})
+        self._next_port[dpid] = 1
+        return dpid
+
+    def _port(self, dpid):
+        port = self._next_port[dpid]
+        self._next_port[dpid] = port + 1
+        return port
+
+    def add_link(self, src, dst, uplink=False):
+        self.links.append({'src': src, 'src_port': self._port(src),
+                           'dst': dst, 'dst_port': self._port(dst), 'uplink': uplink})
+
+    def add_host(self, name, mac, ip, dpid, gateway, prefixlen=64):
+        self.hosts.append({'name': name, 'mac': mac, 'ip': ip, 'prefixlen': prefixlen,
+                           'dpid': dpid, 'port': self._port(dpid), 'gateway': gateway})
+
+    def topology(self):
+        """导出给控制器的拓扑描述"""
+        return Topology({sw['dpid']: sw['name'] for sw in self.switches},
+                        [{key: host[key] for key in
+                          ('name', 'mac', 'ip', 'prefixlen', 'dpid', 'port')}
+                         for host in self.hosts],
+                        [{key: link[key] for key in ('src', 'src_port', 'dst', 'dst_port')}
+                         for link in self.links])
+
+    def summary(self):
+        roles = {}
+        for sw in self.switches:
+            roles[sw['role']] = roles.get(sw['role'], 0) + 1
+        return (f"{len(self.switches)}台交换机 ({', '.join(f'{role} {n}' for role, n in roles.items())}), "
+                f"{len(self.hosts)}台主机, {len(self.links)}条交换机间链路")
+
+
+def _datacenter_host(plan, leaf, index, dpid):
+    """数据中心主机: 地址和MAC由接入交换机序号(从1起)和主机序号(从1起)决定"""
+    plan.add_host(f'h{leaf}x{index}',
+                  f'02:00:{leaf >> 8 & 0xff:02x}:{leaf & 0xff:02x}:'
+                  f'{index >> 8 & 0xff:02x}:{index & 0xff:02x}',
+                  f'{DATACENTER_PREFIX}{leaf:x}:{index:x}', dpid, DATACENTER_GATEWAY)
+
+
+def _external_network(plan, external_hosts):
+    """外部网络交换机及主机, 经边缘路由器接入数据中心"""
+    plan.add_switch('ex', EXTERNAL_DPID, 'external')
+    plan.add_switch('ed', EDGE_DPID, 'edge_router')
+    for i in range(1, external_hosts + 1):
+        plan.add_host(f'x{i}', f'04:00:00:00:{i >> 8 & 0xff:02x}:{i & 0xff:02x}',
+                      f'{EXTERNAL_PREFIX}{i:x}', EXTERNAL_DPID, EXTERNAL_GATEWAY)
+    plan.add_link(EXTERNAL_DPID, EDGE_DPID)
+
+
+def leaf_spine(spines, leaves, hosts_per_leaf, external_hosts=3):
+    """N-spine/M-leaf: 每台leaf连接全部spine, 边缘路由器连接全部spine"""
+    if spines < 1 or leaves < 1 or hosts_per_leaf < 0:
+        raise ValueError(f"无效的leaf-spine参数: {spines}x{leaves}, 每leaf {hosts_per_leaf}台主机")
+    plan = FabricPlan()
+    _external_network(plan, external_hosts)
+    dpid = EDGE_DPID
+    spine_dpids = [plan.add_switch(f'sp{i}', dpid + i, 'spine') for i in range(1, spines + 1)]
+    dpid += spines
+    leaf_dpids = [plan.add_switch(f'lf{i}', dpid + i, 'leaf') for i in range(1, leaves + 1)]
+    for spine in spine_dpids:
+        plan.add_link(EDGE_DPID, spine)
+    for leaf in leaf_dpids:
+        for spine in spine_dpids:
+            plan.add_link(spine, leaf, uplink=True)
+    for i, leaf in enumerate(leaf_dpids, 1):
+        for index in range(1, hosts_per_leaf + 1):
+            _datacenter_host(plan, i, index, leaf)
+    return plan
+
+
+def fat_tree(k, hosts_per_edge=None, external_hosts=3):
+    """k叉fat-tree: (k/2)^2台core, k个pod各k/2台汇聚和k/2台接入交换机, 每台接入交换机
+    默认k/2台主机(共k^3/4台); 第i台core连接每个pod的第i//(k/2)台汇聚交换机,
+    边缘路由器连接全部core"""
+    if k < 2 or k % 2:
+        raise ValueError(f"fat-tree的k必须为正偶数: {k}")
+    half = k // 2
+    if hosts_per_edge is None:
+        hosts_per_edge = half
+    plan = FabricPlan()
+    _external_network(plan, external_hosts)
+    dpid = EDGE_DPID
+    cores = [plan.add_switch(f'c{i}', dpid + i, 'core') for i in range(1, half * half + 1)]
+    dpid += half * half
+    aggs = []
+    edges = []
+    for pod in range(k):
+        aggs.append([plan.add_switch(f'a{pod * half + i}', dpid + pod * half + i, 'aggregation')
+                     for i in range(1, half + 1)])
+    dpid += k * half
+    for pod in range(k):
+        edges.append([plan.add_switch(f'e{pod * half + i}', dpid + pod * half + i, 'edge')
+                      for i in range(1, half + 1)])
+    for core in cores:
+        plan.add_link(EDGE_DPID, core)
+    for i, core in enumerate(cores):
+        for pod in range(k):
+            plan.add_link(core, aggs[pod][i // half], uplink=True)
+    for pod in range(k):
+        for agg in aggs[pod]:
+            for edge in edges[pod]:
+                plan.add_link(agg, edge, uplink=True)
+    for pod in range(k):
+        for i, edge in enumerate(edges[pod], 1):
+            leaf = pod * half + i
+            for index in range(1, hosts_per_edge + 1):
+                _datacenter_host(plan, leaf, index, edge)
+    return plan
+
+
+def host_script(host, intf):
+    """一台主机的全部配置命令, 在主机shell中一次执行(地址已由Mininet配置时同样成功)"""
+    return (f'ip -6 addr replace {host["ip"]}/{host["prefixlen"]} dev {intf} nodad && '
+            f'ip -6 route replace default via {host["gateway"]} dev {intf} onlink')
+
+
+def configure_hosts(net, hosts, parallel=256):
+    """按主机批量并发配置: 每批最多parallel台主机同时执行各自的配置脚本, 返回失败的主机名
+
+    hosts: [{name, ip, prefixlen, gateway}], 如FabricPlan.hosts
+    """
+    failed = []
+    for start in range(0, len(hosts), parallel):
+        batch = [(net.get(host['name']), host) for host in hosts[start:start + parallel]]
+        for node, host in batch:
+            node.sendCmd(host_script(host, node.defaultIntf()) + '; echo rc=$?')
+        for node, host in batch:
+            if 'rc=0' not in node.waitOutput():
+                failed.append(host['name'])
+    return failed
+
+
+def controller_status():
+    """查询OVS数据库: {网桥名: [控制器是否已连接]}, 两次ovs-vsctl调用覆盖全部交换机"""
+    def rows(table, columns):
+        out = subprocess.check_output(['ovs-vsctl', '-f', 'csv', '--no-headings', '-d', 'bare',
+                                       f'--columns={columns}', 'list', table]).decode()
+        return [line.split(',', 1) for line in out.splitlines() if line]
+
+    connected = {uuid: flag.strip() == 'true' for uuid, flag in rows('Controller', '_uuid,is_connected')}
+    return {name: [connected.get(uuid, False) for uuid in controllers.strip('"').split()]
+            for name, controllers in rows('Bridge', 'name,controller')}
+
+
+def wait_connected(switches, timeout=60.0, interval=0.2):
+    """等待全部交换机与其全部控制器建立连接, 返回未连接的交换机名列表(为空表示全部就绪)"""
+    names = {switch.name for switch in switches}
+    deadline = time.monotonic() + timeout
+    while True:
+        status = controller_status()
+        pending = sorted(name for name in names if not status.get(name) or not all(status[name]))
+        if not pending or time.monotonic() >= deadline:
+            return pending
+        time.sleep(interval)
+
+
+def flood_ready(switch):
+    """交换机上的洪泛组已由控制器填入桶(边缘端口或广播树端口已确认)"""
+    out = subprocess.run(['ovs-ofctl', '-O', 'OpenFlow13', 'dump-groups', switch],
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode()
+    return any(f'group_id={FLOOD_GROUP_ID},' in line and 'bucket=' in line
+               for line in out.splitlines())
+
+
+def wait_flood_ready(switches, timeout=30.0, interval=0.2):
+    """轮询各交换机的洪泛组代替固定等待, 返回超时仍未就绪的交换机名列表"""
+    pending = sorted(switch.name for switch in switches)
+    deadline = time.monotonic() + timeout
+    while True:
+        pending = [name for name in pending if not flood_ready(name)]
+        if not pending or time.monotonic() >= deadline:
+            return pending
+        time.sleep(interval)
+
+
+def add_controllers(net):
+    """按CONTROLLER_IP/CONTROLLER_PORTS添加远程控制器, 返回控制器列表
+
+    分片部署时CONTROLLER_PORTS为逗号分隔的各worker端口, 交换机同时连接全部worker。
+    """
+    from mininet.log import info
+    from mininet.node import RemoteController
+
+    controller_ip = os.environ.get('CONTROLLER_IP', '127.0.0.1')
+    controller_ports = [int(port) for port in os.environ.get('CONTROLLER_PORTS', '6633').split(',')]
+    info(f'*** 添加控制器 (IP: {controller_ip}, 端口: {controller_ports})\n')
+    return [net.addController(f'c{i}', controller=RemoteController, ip=controller_ip, port=port)
+            for i, port in enumerate(controller_ports)]
+
+
+def create_fabric_net(plan, link_bw=None, parallel=256, timeout=60.0, topology_file=None):
+    """按规划创建并启动Mininet网络, 返回(net, 各阶段耗时)
+
+    link_bw: 交换机间上行链路带宽(Mbit/s), None为不限速(不使用TCLink, 创建更快)
+    topology_file: 在交换机连接控制器前导出拓扑描述的文件(默认取DC_TOPOLOGY)
+    """
+    from mininet.link import Link, TCLink
+    from mininet.log import info
+    from mininet.net import Mininet
+    from mininet.node import OVSKernelSwitch, RemoteController
+
+    timings = {}
+    t = time.monotonic()
+    net = Mininet(controller=RemoteController, switch=OVSKernelSwitch,
+                  link=TCLink if link_bw else Link, build=False, autoSetMacs=False)
+
+    add_controllers(net)
+
+    info(f'*** 添加{plan.summary()}\n')
+    nodes = {}
+    for sw in plan.switches:
+        nodes[sw['dpid']] = net.addSwitch(sw['name'], dpid=f"{sw['dpid']:016x}",
+                                          protocols='OpenFlow13', batch=True)
+    uplink = {'bw': link_bw} if link_bw else {}
+    for link in plan.links:
+        net.addLink(nodes[link['src']], nodes[link['dst']], port1=link['src_port'],
+                    port2=link['dst_port'], **(uplink if link['uplink'] else {}))
+    for host in plan.hosts:
+        node = net.addHost(host['name'], mac=host['mac'], ip=None)
+        net.addLink(nodes[host['dpid']], node, port1=host['port'], port2=0)
+    net.build()
+    timings['build'] = time.monotonic() - t
+
+    # 在交换机连接控制器之前导出拓扑, 供控制器主动模式使用
+    topology_file = topology_file or os.environ.get('DC_TOPOLOGY')
+    if topology_file:
+        info(f'*** 导出拓扑描述到 {topology_file}\n')
+        plan.topology().save(topology_file)
+
+    t = time.monotonic()
+    info('*** 配置主机(并发)\n')
+    failed = configure_hosts(net, plan.hosts, parallel)
+    if failed:
+        info(f'*** {len(failed)}台主机配置失败: {failed[:10]}\n')
+    timings['hosts'] = time.monotonic() - t
+
+    # 控制器和交换机由Mininet批量启动(每类交换机一次ovs-vsctl事务)
+    t = time.monotonic()
+    net.start()
+    timings['switches'] = time.monotonic() - t
+
+    t = time.monotonic()
+    info('*** 等待交换机连接控制器\n')
+    pending = wait_connected(net.switches, timeout)
+    if pending:
+        info(f'*** {timeout}秒内仍有{len(pending)}台交换机未连接: {pending[:10]}\n')
+    timings['connect'] = time.monotonic() - t
+
+    # 控制器在交换机连接后还需几个LLDP探测周期确认边缘端口, 轮询直到每台交换机的洪泛组填好
+    t = time.monotonic()
+    info('*** 等待洪泛组就绪\n')
+    pending = wait_flood_ready(net.switches)
+    if pending:
+        info(f'*** 仍有{len(pending)}台交换机的洪泛组未就绪: {pending[:10]}\n')
+    timings['flood'] = time.monotonic() - t
+    return net, timings
+
+
+def ping_sample(net, plan, count, seed=1):
+    """随机抽取count对数据中心主机互ping一次(按主机并发), 返回成功对数"""
+    rng = random.Random(seed)
+    internal = [host for host in plan.hosts if host['gateway'] == DATACENTER_GATEWAY]
+    pairs = [rng.sample(internal, 2) for _ in range(count)]
+    ok = 0
+    for start in range(0, len(pairs), 256):
+        batch = []
+        busy = set()
+        for src, dst in pairs[start:start + 256]:
+            node = net.get(src['name'])
+            if node in busy:
+                ok += ' 0% packet loss' in node.cmd(f'ping6 -c 1 -W 2 {dst["ip"]}')
+                continue
+            busy.add(node)
+            node.sendCmd(f'ping6 -c 1 -W 2 {dst["ip"]}')
+            batch.append(node)
+        for node in batch:
+            ok += ' 0% packet loss' in node.waitOutput()
+    return ok
+
+
+def make_plan(args):
+    if args.fat_tree:
+        return fat_tree(args.fat_tree, args.hosts, args.external)
+    spines, _, leaves = args.leaf_spine.partition('x')
+    return leaf_spine(int(spines), int(leaves), 2 if args.hosts is None else args.hosts,
+                      args.external)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='参数化fat-tree / leaf-spine数据中心拓扑')
+    shape = parser.add_mutually_exclusive_group()
+    shape.add_argument('--fat-tree', type=int, metavar='K', help='k叉fat-tree')
+    shape.add_argument('--leaf-spine', default='3x5', metavar='NxM',
+                       help='N台spine、M台leaf(默认3x5)')
+    parser.add_argument('--hosts', type=int, help='每台leaf/接入交换机的主机数(默认leaf-spine为2, '
+                                                 'fat-tree为k/2)')
+    parser.add_argument('--external', type=int, default=3, help='外部网络主机数')
+    parser.add_argument('--bw', type=float, help='交换机间上行链路带宽(Mbit/s)')
+    parser.add_argument('--parallel', type=int, default=256, help='同时配置的主机数')
+    parser.add_argument('--timeout', type=float, default=60.0, help='等待交换机连接的秒数')
+    parser.add_argument('--export', help='导出拓扑描述的文件(默认取DC_TOPOLOGY)')
+    parser.add_argument('--plan-only', action='store_true', help='只生成并导出拓扑, 不启动Mininet')
+    parser.add_argument('--ping', type=int, default=0, help='启动后随机抽取N对主机互ping')
+    parser.add_argument('--no-cli', action='store_true', help='启动后不进入命令行, 直接停止')
+    args = parser.parse_args()
+
+    plan = make_plan(args)
+    print(f'*** 拓扑: {plan.summary()}')
+    if args.plan_only:
+        path = args.export or os.environ.get('DC_TOPOLOGY')
+        if not path:
+            parser.error('--plan-only需要--export或DC_TOPOLOGY')
+        plan.topology().save(path)
+        print(f'拓扑描述已保存到{path}')
+        return
+
+    from mininet.cli import CLI
+    from mininet.log import setLogLevel, info
+    setLogLevel('info')
+    start = time.monotonic()
+    net, timings = create_fabric_net(plan, args.bw, args.parallel, args.timeout, args.export)
+    info(f"*** 启动耗时{time.monotonic() - start:.1f}秒: " +
+         ', '.join(f'{phase} {seconds:.1f}s' for phase, seconds in timings.items()) + '\n')
+    try:
+        if args.ping:
+            info(f'*** 随机{args.ping}对主机互ping: {ping_sample(net, plan, args.ping)}对连通\n')
+        sys.stdout.flush()
+        if not args.no_cli:
+            CLI(net)
+    finally:
+        net.stop()
+
+
+if __name__ == '__main__':
+    main()
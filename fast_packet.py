@@ -0,0 +1,65 @@
+import socket
+import struct
+
+ETH_TYPE_IPV6 = 0x86dd
+IPPROTO_ICMPV6 = 58
+
+# 需要完整解析(含ND选项)的ICMPv6类型: RS/RA/NS/NA/Redirect
+ND_TYPES = frozenset((133, 134, 135, 136, 137))
+
+_ETH_HDR = struct.Struct('!6s6sH')
+_IPV6_HDR_LEN = 40
+
+
+def _mac_to_str(raw):
+    return raw.hex(':')
+
+
+class PacketHeaders(object):
+    """包头快速解析结果, 字段格式与ryu.lib.packet一致"""
+
+    __slots__ = ('dst', 'src', 'ethertype', 'l3_offset',
+                 'ipv6_src', 'ipv6_dst', 'ipv6_nxt', 'icmpv6_type')
+
+    def __init__(self, dst, src, ethertype, l3_offset):
+        self.dst = dst
+        self.src = src
+        self.ethertype = ethertype
+        self.l3_offset = l3_offset
+        self.ipv6_src = None
+        self.ipv6_dst = None
+        self.ipv6_nxt = None
+        self.icmpv6_type = None
+
+    @property
+    def needs_full_parse(self):
+        """是否需要回退到Ryu完整解析器(如ND选项)"""
+        return self.icmpv6_type in ND_TYPES
+
+
+def parse_headers(data):
+    """以固定偏移从原始帧中读取以太网/IPv6/ICMPv6头部字段
+
+    只读取packet-in处理所需的字段, 不构造Ryu协议对象。
+    帧长度不足以太网头部时返回None; IPv6头部被截断时只返回L2字段。
+    """
+    view = memoryview(data)
+    if len(view) < _ETH_HDR.size:
+        return None
+
+    dst, src, ethertype = _ETH_HDR.unpack_from(view, 0)
+    offset = _ETH_HDR.size
+
+    hdr = PacketHeaders(_mac_to_str(dst), _mac_to_str(src), ethertype, offset)
+    if ethertype != ETH_TYPE_IPV6 or len(view) < offset + _IPV6_HDR_LEN:
+        return hdr
+
+    hdr.ipv6_nxt = view[offset + 6]
+    hdr.ipv6_src = socket.inet_ntop(socket.AF_INET6, view[offset + 8:offset + 24])
+    hdr.ipv6_dst = socket.inet_ntop(socket.AF_INET6, view[offset + 24:offset + 40])
+
+    # 扩展头部较少见, 此时不解析ICMPv6类型, 由调用方按需完整解析
+    icmp_offset = offset + _IPV6_HDR_LEN
+    if hdr.ipv6_nxt == IPPROTO_ICMPV6 and len(view) > icmp_offset:
+        hdr.icmpv6_type = view[icmp_offset]
+    return hdr
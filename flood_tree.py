@@ -0,0 +1,265 @@
+import struct
+import time
+from collections import deque
+
+from ryu.lib import hub
+from ryu.lib.packet import packet
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import ether_types
+from ryu.lib.packet import lldp
+
+# 洪泛ALL组的组号, 避开ECMP组(组号为目的dpid)
+FLOOD_GROUP_ID = 0xfffff000
+LLDP_PRIORITY = 65535
+
+_CHASSIS_PREFIX = b'dpid:'
+
+
+def spanning_tree(dpids, links):
+    """计算生成树(森林), 返回 {dpid: 树上端口集合}
+
+    links为(dpid1, 端口1, dpid2, 端口2)的可迭代对象; 每个连通分量以最小dpid为根做BFS,
+    邻居按(dpid, 端口)排序以保证结果确定。
+    """
+    adjacency = {dpid: [] for dpid in dpids}
+    for dpid1, port1, dpid2, port2 in links:
+        if dpid1 in adjacency and dpid2 in adjacency and dpid1 != dpid2:
+            adjacency[dpid1].append((dpid2, port1, port2))
+            adjacency[dpid2].append((dpid1, port2, port1))
+
+    tree_ports = {dpid: set() for dpid in adjacency}
+    visited = set()
+    for root in sorted(adjacency):
+        if root in visited:
+            continue
+        visited.add(root)
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            for neighbor, port, peer_port in sorted(adjacency[node]):
+                if neighbor in visited:
+                    continue
+                visited.add(neighbor)
+                tree_ports[node].add(port)
+                tree_ports[neighbor].add(peer_port)
+                queue.append(neighbor)
+    return tree_ports
+
+
+class FloodTree(object):
+    """基于LLDP链路发现的无环广播树, 替代OFPP_FLOOD
+
+    控制器周期性地从每个端口发送LLDP探测帧, 由收到的探测学习交换机间链路,
+    在链路上计算生成树。每台交换机的洪泛端口为树上端口加上已确认的边缘端口
+    (探测多次仍未发现对端交换机), 以ALL组下发; 链路变化时只修改洪泛端口
+    集合发生变化的交换机的组。尚未确认的端口不参与洪泛, 避免发现完成前成环。
+    """
+
+    def __init__(self, logger, send_msg, interval=1.0, settle_probes=2):
+        self.logger = logger
+        self.send_msg = send_msg      # send_msg(datapath, msg)
+        self.interval = interval
+        self.settle_probes = settle_probes
+        self.link_timeout = interval * 3
+        self.datapaths = {}
+        self.ports = {}               # dpid -> {端口号: 已发送探测次数}
+        self.links = {}               # (dpid, 端口) -> (对端dpid, 对端端口, 最后发现时间)
+        self.flood_ports = {}         # dpid -> 已下发的洪泛端口集合
+        self._lldp_frames = {}        # (dpid, 端口) -> LLDP帧
+
+    def run(self):
+        """后台探测循环, 由应用通过hub.spawn启动"""
+        while True:
+            self._expire_links()
+            for datapath in list(self.datapaths.values()):
+                self._send_probes(datapath)
+            self.update()
+            hub.sleep(self.interval)
+
+    def switch_enter(self, datapath):
+        """交换机连接: 安装LLDP上送流表和空洪泛组, 请求端口列表"""
+        dpid = datapath.id
+        self.switch_leave(dpid)
+        self.datapaths[dpid] = datapath
+        self.ports[dpid] = {}
+        self._install(datapath, set())
+        self.send_msg(datapath, datapath.ofproto_parser.OFPPortDescStatsRequest(datapath, 0))
+
+    def reinstall(self, datapath):
+        """接管交换机(其上状态未知): 按已发现的端口和链路重建LLDP上送流表和洪泛组"""
+        if datapath.id not in self.datapaths:
+            self.switch_enter(datapath)
+            return
+        self._install(datapath, self.flood_ports.get(datapath.id) or set())
+
+    def _install(self, datapath, ports):
+        """下发LLDP上送流表, 删除并重新添加以ports为桶的洪泛组"""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_LLDP)
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+                                          ofproto.OFPCML_NO_BUFFER)]
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        self.send_msg(datapath, parser.OFPFlowMod(datapath=datapath, priority=LLDP_PRIORITY,
+                                                  match=match, instructions=inst))
+
+        buckets = [parser.OFPBucket(actions=[parser.OFPActionOutput(port)])
+                   for port in sorted(ports)]
+        self.send_msg(datapath, parser.OFPGroupMod(
+            datapath, ofproto.OFPGC_DELETE, ofproto.OFPGT_ALL, FLOOD_GROUP_ID))
+        self.send_msg(datapath, parser.OFPGroupMod(
+            datapath, ofproto.OFPGC_ADD, ofproto.OFPGT_ALL, FLOOD_GROUP_ID, buckets))
+        self.flood_ports[datapath.id] = set(ports)
+
+    def switch_leave(self, dpid):
+        if self.datapaths.pop(dpid, None) is None:
+            return
+        self.ports.pop(dpid, None)
+        self.flood_ports.pop(dpid, None)
+        for key in [key for key in self._lldp_frames if key[0] == dpid]:
+            del self._lldp_frames[key]
+        if self._remove_links(lambda src, dst: src[0] == dpid or dst[0] == dpid):
+            self.update()
+
+    def port_desc_reply(self, msg):
+        dpid = msg.datapath.id
+        ports = self.ports.get(dpid)
+        if ports is None:
+            return
+        max_port = msg.datapath.ofproto.OFPP_MAX
+        for port in msg.body:
+            if port.port_no <= max_port:
+                ports.setdefault(port.port_no, 0)
+
+    def port_status(self, msg):
+        """端口增删或状态变化"""
+        datapath = msg.datapath
+        ofproto = datapath.ofproto
+        dpid = datapath.id
+        port_no = msg.desc.port_no
+        ports = self.ports.get(dpid)
+        if ports is None or port_no > ofproto.OFPP_MAX:
+            return
+
+        down = (msg.reason == ofproto.OFPPR_DELETE
+                or msg.desc.state & ofproto.OFPPS_LINK_DOWN
+                or msg.desc.config & ofproto.OFPPC_PORT_DOWN)
+        if down:
+            ports.pop(port_no, None)
+            self._remove_links(lambda src, dst: (dpid, port_no) in (src, dst))
+        else:
+            # 新端口或恢复的端口重新开始确认
+            ports[port_no] = 0
+        self.update()
+
+    def lldp_packet_in(self, datapath, in_port, data):
+        """处理LLDP探测帧, 学习链路; 返回发现的链路((dpid, 端口), (对端dpid, 对端端口))或None"""
+        pkt = packet.Packet(data)
+        lldp_pkt = pkt.get_protocol(lldp.lldp)
+        if lldp_pkt is None or len(lldp_pkt.tlvs) < 2:
+            return None
+        chassis_id = lldp_pkt.tlvs[0].chassis_id
+        port_id = lldp_pkt.tlvs[1].port_id
+        if not chassis_id.startswith(_CHASSIS_PREFIX) or len(port_id) != 4:
+            return None
+        src = (int(chassis_id[len(_CHASSIS_PREFIX):], 16), struct.unpack('!I', port_id)[0])
+        dst = (datapath.id, in_port)
+        if not self.add_link(src, dst):
+            return None
+        return src, dst
+
+    def add_link(self, src, dst):
+        """记录(或刷新)一条交换机间链路, src所在交换机未连接时忽略并返回False"""
+        if src[0] not in self.datapaths:
+            return False
+
+        now = time.time()
+        is_new = self.links.get(src, (None, None))[:2] != dst
+        if is_new:
+            # 端口连接关系变化时先删除旧链路
+            self._remove_links(lambda a, b: a in (src, dst) or b in (src, dst))
+            self.logger.info(f"发现链路: dpid={src[0]} 端口{src[1]} <-> dpid={dst[0]} 端口{dst[1]}")
+        self.links[src] = (dst[0], dst[1], now)
+        self.links[dst] = (src[0], src[1], now)
+        if is_new:
+            self.update()
+        return True
+
+    def flood_actions(self, datapath):
+        """替代OFPP_FLOOD的洪泛动作"""
+        return [datapath.ofproto_parser.OFPActionGroup(FLOOD_GROUP_ID)]
+
+    def edge_ports(self, dpid):
+        """已确认的边缘(主机侧)端口: 探测多次仍未发现对端交换机"""
+        return {port for port, probes in self.ports.get(dpid, {}).items()
+                if probes >= self.settle_probes and (dpid, port) not in self.links}
+
+    def compute_flood_ports(self):
+        """计算每台交换机的洪泛端口: 生成树端口 + 已确认的边缘端口"""
+        link_list = [(src[0], src[1], dst[0], dst[1])
+                     for src, dst in self.links.items() if src < dst[:2]]
+        tree = spanning_tree(self.datapaths, link_list)
+        result = {}
+        for dpid, ports in self.ports.items():
+            result[dpid] = self.edge_ports(dpid) | (tree.get(dpid, set()) & set(ports))
+        return result
+
+    def update(self):
+        """重新计算广播树, 只修改洪泛端口发生变化的交换机"""
+        for dpid, ports in self.compute_flood_ports().items():
+            if self.flood_ports.get(dpid) == ports:
+                continue
+            datapath = self.datapaths[dpid]
+            ofproto = datapath.ofproto
+            parser = datapath.ofproto_parser
+            buckets = [parser.OFPBucket(actions=[parser.OFPActionOutput(port)])
+                       for port in sorted(ports)]
+            self.send_msg(datapath, parser.OFPGroupMod(
+                datapath, ofproto.OFPGC_MODIFY, ofproto.OFPGT_ALL, FLOOD_GROUP_ID, buckets))
+            self.flood_ports[dpid] = ports
+            self.logger.debug(f"dpid={dpid} 洪泛端口: {sorted(ports)}")
+
+    def _remove_links(self, predicate):
+        stale = [(src, dst[:2]) for src, dst in self.links.items() if predicate(src, dst[:2])]
+        for src, dst in stale:
+            self.links.pop(src, None)
+            self.links.pop(dst, None)
+        return bool(stale)
+
+    def _expire_links(self):
+        deadline = time.time() - self.link_timeout
+        for src, (dpid, port, seen) in list(self.links.items()):
+            if seen < deadline and src in self.links:
+                self.logger.info(f"链路超时: dpid={src[0]} 端口{src[1]} <-> dpid={dpid} 端口{port}")
+                self.links.pop(src, None)
+                self.links.pop((dpid, port), None)
+
+    def _send_probes(self, datapath):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        dpid = datapath.id
+        for port_no in list(self.ports.get(dpid, ())):
+            data = self._lldp_frames.get((dpid, port_no))
+            if data is None:
+                data = self._lldp_frames[(dpid, port_no)] = self._build_lldp(dpid, port_no)
+            out = parser.OFPPacketOut(datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+                                      in_port=ofproto.OFPP_CONTROLLER,
+                                      actions=[parser.OFPActionOutput(port_no)], data=data)
+            self.send_msg(datapath, out)
+            self.ports[dpid][port_no] += 1
+
+    @staticmethod
+    def _build_lldp(dpid, port_no):
+        pkt = packet.Packet()
+        pkt.add_protocol(ethernet.ethernet(
+            dst=lldp.LLDP_MAC_NEAREST_BRIDGE, src='00:00:00:00:00:00',
+            ethertype=ether_types.ETH_TYPE_LLDP))
+        tlvs = (lldp.ChassisID(subtype=lldp.ChassisID.SUB_LOCALLY_ASSIGNED,
+                               chassis_id=_CHASSIS_PREFIX + b'%016x' % dpid),
+                lldp.PortID(subtype=lldp.PortID.SUB_PORT_COMPONENT,
+                            port_id=struct.pack('!I', port_no)),
+                lldp.TTL(ttl=120),
+                lldp.End())
+        pkt.add_protocol(lldp.lldp(tlvs))
+        pkt.serialize()
+        return pkt.data
@@ -0,0 +1,228 @@
+import time
+
+from ryu.lib import hub
+
+
+class FlowModBatcher(object):
+    """按datapath排队OpenFlow消息并合并批量发送
+
+    每批消息序列化后拼接为一次写入, 可选用ONF Bundle(OpenFlow 1.3扩展)
+    原子提交FlowMod/GroupMod, 含FlowMod/GroupMod或等待确认回调的批末尾附加一个
+    Barrier请求, 收到BarrierReply后统计该批安装的流表数和耗时; 只有PacketOut等
+    消息的批次不加Barrier, 也不计入批次统计。交换机对批内消息的错误应答按xid对应到批次,
+    被拒绝的FlowMod不计入安装数, bundle提交失败时整批视为失败。
+    """
+
+    def __init__(self, logger, flush_interval=0, max_batch=256,
+                 use_bundles=False, use_barrier=True, channel_stats=None, metrics=None):
+        self.logger = logger
+        self.channel_stats = channel_stats
+        self.metrics = metrics
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.use_bundles = use_bundles
+        self.use_barrier = use_barrier
+        self.pending = {}      # dpid -> (datapath, [msg])
+        self.outstanding = {}  # (dpid, barrier xid) -> (开始时间, 流表数, 确认回调, 首个xid,
+                               #                     FlowMod的xid集合, 是否为bundle)
+        self.failed = {}       # (dpid, barrier xid) -> 批内被拒绝的FlowMod数
+        self.callbacks = {}    # dpid -> 当前队列批次确认后的回调
+        self.bundle_ids = {}   # dpid -> 下一个bundle id
+        self.stats = {}        # dpid -> 批处理统计
+        self.sent_flows = {}   # dpid -> 已发送的FlowMod数
+        self.accept = None     # accept(datapath, msg)为False的消息直接丢弃(分片部署的非MASTER交换机)
+        self.wakeup = hub.Event()  # 队列由空变为非空时唤醒刷新循环
+
+    def run(self):
+        """后台刷新循环, 由应用通过hub.spawn启动
+
+        空闲时阻塞等待send_msg唤醒; 被唤醒时当前事件处理函数已让出, 同一处理函数
+        排入的消息合并为一批。flush_interval大于0时再等待该时长以合并更多消息。
+        """
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.flush_interval:
+                hub.sleep(self.flush_interval)
+            self.flush_all()
+
+    def send_msg(self, datapath, msg):
+        """将消息加入datapath的发送队列"""
+        if self.accept is not None and not self.accept(datapath, msg):
+            return
+        entry = self.pending.get(datapath.id)
+        if entry is None or entry[0] is not datapath:
+            entry = self.pending[datapath.id] = (datapath, [])
+            self.wakeup.set()
+        entry[1].append(msg)
+        if len(entry[1]) >= self.max_batch:
+            self.flush(datapath.id)
+
+    def when_confirmed(self, datapath, callback):
+        """datapath队列中已有的消息被交换机确认(BarrierReply)后调用callback()
+
+        批内有消息被交换机拒绝时不调用。
+        """
+        self.callbacks.setdefault(datapath.id, []).append(callback)
+        if datapath.id not in self.pending:
+            self.pending[datapath.id] = (datapath, [])
+            self.wakeup.set()
+
+    def flush_all(self):
+        for dpid in list(self.pending):
+            self.flush(dpid)
+
+    def flush(self, dpid):
+        """立即发送dpid上排队的全部消息"""
+        entry = self.pending.pop(dpid, None)
+        if entry is None:
+            return
+        callbacks = self.callbacks.pop(dpid, ())
+        t = self.metrics.start() if self.metrics is not None else None
+        datapath, msgs = entry
+        if not datapath.is_active:
+            self.remove(dpid)
+            return
+
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        flow_mods = [msg for msg in msgs if msg.cls_msg_type == ofproto.OFPT_FLOW_MOD]
+        flows = len(flow_mods)
+        # 只有需要确认的批次才等待BarrierReply
+        confirm = bool(callbacks) or any(
+            msg.cls_msg_type in (ofproto.OFPT_FLOW_MOD, ofproto.OFPT_GROUP_MOD) for msg in msgs)
+
+        bundled = False
+        if self.use_bundles:
+            wrapped = self._wrap_bundle(datapath, msgs)
+            bundled = wrapped is not msgs
+            msgs = wrapped
+        barrier = None
+        if self.use_barrier and confirm:
+            barrier = parser.OFPBarrierRequest(datapath)
+            msgs.append(barrier)
+        if not msgs:
+            return
+
+        bufs = []
+        for msg in msgs:
+            datapath.set_xid(msg)
+            msg.serialize()
+            bufs.append(msg.buf)
+        first_xid = msgs[0].xid if msgs else None
+
+        data = b''.join(bufs)
+        start = time.time()
+        if not datapath.send(data):
+            self.logger.warning(f"dpid={dpid} 批量发送失败, 丢弃{len(msgs)}条消息")
+            return
+        if self.channel_stats is not None:
+            self.channel_stats.sent(dpid, len(data))
+        self.sent_flows[dpid] = self.sent_flows.get(dpid, 0) + flows
+        if t is not None:
+            self.metrics.stage('flush', t)
+        if barrier is not None:
+            # bundle内的FlowMod没有单独的xid, 整批按bundle处理
+            flow_xids = frozenset(msg.xid for msg in flow_mods if msg.xid is not None)
+            self.outstanding[(dpid, barrier.xid)] = (start, flows, callbacks, first_xid,
+                                                     flow_xids, bundled)
+        elif confirm:
+            self._record(dpid, flows, 0.0)
+            for callback in callbacks:
+                callback()
+
+    def _wrap_bundle(self, datapath, msgs):
+        """将FlowMod/GroupMod放入一个原子bundle, 其余消息(如PacketOut)在提交后发送"""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        bundled = [msg for msg in msgs
+                   if msg.cls_msg_type in (ofproto.OFPT_FLOW_MOD, ofproto.OFPT_GROUP_MOD)]
+        if not bundled:
+            return msgs
+        others = [msg for msg in msgs
+                  if msg.cls_msg_type not in (ofproto.OFPT_FLOW_MOD, ofproto.OFPT_GROUP_MOD)]
+
+        bundle_id = self.bundle_ids.get(datapath.id, 0)
+        self.bundle_ids[datapath.id] = (bundle_id + 1) & 0xffffffff
+        flags = ofproto.ONF_BF_ATOMIC | ofproto.ONF_BF_ORDERED
+
+        wrapped = [parser.ONFBundleCtrlMsg(datapath, bundle_id,
+                                           ofproto.ONF_BCT_OPEN_REQUEST, flags, [])]
+        wrapped += [parser.ONFBundleAddMsg(datapath, bundle_id, flags, msg, [])
+                    for msg in bundled]
+        wrapped.append(parser.ONFBundleCtrlMsg(datapath, bundle_id,
+                                               ofproto.ONF_BCT_COMMIT_REQUEST, flags, []))
+        return wrapped + others
+
+    def error(self, msg):
+        """把交换机的错误应答按xid对应到未确认的批次, 返回是否属于某个批次"""
+        dpid = msg.datapath.id
+        for key, entry in self.outstanding.items():
+            first_xid = entry[3]
+            if key[0] != dpid or first_xid is None:
+                continue
+            # xid为32位回绕计数, 按模2^32判断是否落在[首个xid, barrier xid]内
+            if (msg.xid - first_xid) & 0xffffffff > (key[1] - first_xid) & 0xffffffff:
+                continue
+            flows, flow_xids, bundled = entry[1], entry[4], entry[5]
+            if bundled:
+                # bundle原子提交, 任一消息出错整批都不生效
+                self.failed[key] = flows
+            elif msg.xid in flow_xids:
+                self.failed[key] = self.failed.get(key, 0) + 1
+            self.logger.warning(f"dpid={dpid} xid={msg.xid} 的消息被交换机拒绝: "
+                                f"type={msg.type} code={msg.code}")
+            return True
+        return False
+
+    def barrier_reply(self, msg):
+        """处理BarrierReply, 确认对应批次已安装"""
+        dpid = msg.datapath.id
+        key = (dpid, msg.xid)
+        entry = self.outstanding.pop(key, None)
+        if entry is None:
+            return
+        start, flows, callbacks = entry[:3]
+        failed = self.failed.pop(key, 0)
+        self._record(dpid, flows - failed, time.time() - start, failed)
+        if failed:
+            self.logger.warning(f"dpid={dpid} 批次中{failed}/{flows}条流表安装失败")
+            return
+        for callback in callbacks:
+            callback()
+
+    def _record(self, dpid, flows, elapsed, failed=0):
+        stats = self.stats.setdefault(dpid, {
+            'batches': 0, 'flows': 0, 'failed_batches': 0, 'failed_flows': 0,
+            'total_time': 0.0, 'max_time': 0.0, 'last_time': 0.0})
+        stats['batches'] += 1
+        stats['flows'] += flows
+        if failed:
+            stats['failed_batches'] += 1
+            stats['failed_flows'] += failed
+        stats['total_time'] += elapsed
+        stats['last_time'] = elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        self.logger.debug(f"dpid={dpid} 批次已确认: {flows}条流表, 耗时{elapsed * 1000:.2f}ms")
+
+    def queue_depth(self):
+        """每个dpid队列中尚未发送的消息数"""
+        return {dpid: len(entry[1]) for dpid, entry in self.pending.items()}
+
+    def remove(self, dpid):
+        """datapath断开时清理其队列和未确认批次"""
+        self.pending.pop(dpid, None)
+        self.callbacks.pop(dpid, None)
+        self.bundle_ids.pop(dpid, None)
+        for key in [key for key in self.outstanding if key[0] == dpid]:
+            del self.outstanding[key]
+            self.failed.pop(key, None)
+
+    def get_stats(self):
+        """返回每个dpid的已确认(安装成功)流表数、失败数和批次耗时统计"""
+        result = {}
+        for dpid, stats in self.stats.items():
+            result[dpid] = dict(stats)
+            result[dpid]['avg_time'] = stats['total_time'] / stats['batches']
+        return result
@@ -0,0 +1,172 @@
+import time
+from collections import Counter, OrderedDict, deque
+
+from flow_stats import flow_key
+
+_FULL_MASK_CHARS = set('f:')
+
+
+class FlowCache(object):
+    """控制器下发流表的影子表: 去重、FlowRemoved跟踪和表满时的LRU淘汰
+
+    每台交换机一个按(表号, 优先级, 匹配字段)索引的有序字典, 记录已下发表项的
+    指令和超时。下发时若影子表中已有完全相同的表项则不再发送(流表生效前在途
+    packet-in造成的重复FlowMod); 距上次下发超过resend_after秒仍被请求时重新下发,
+    避免影子表失准后流量一直上送。所有经过本缓存的FlowMod都带OFPFF_SEND_FLOW_REM,
+    交换机删除表项(超时或被删除)时通过FlowRemoved同步影子表。
+
+    重复请求和流统计中本轮有包命中的表项视为仍在使用, 移到LRU末尾(命中信息来自
+    FlowStatsCollector, 通过flow_stats监听回调接入)。单表表项数达到table_limit或交换机返回
+    OFPFMFC_TABLE_FULL时, 从该表中淘汰最久未使用、带空闲超时、优先级不高于新表项的
+    evict_batch条表项(永久表项如table-miss和上送表项不会被淘汰), 再重发失败的FlowMod。
+    """
+
+    def __init__(self, logger, send_msg, table_limit=0, evict_batch=16, resend_after=5.0,
+                 history=4096, clock=time.monotonic):
+        self.logger = logger
+        self.send_msg = send_msg          # send_msg(datapath, msg)
+        self.table_limit = table_limit    # 单表软上限, 0为不限
+        self.evict_batch = evict_batch
+        self.resend_after = resend_after
+        self.clock = clock
+        self.tables = {}                  # dpid -> OrderedDict((表号, 优先级, 匹配) -> 表项)
+        self.counts = {}                  # dpid -> Counter(表号 -> 影子表中的表项数)
+        self.recent = {}                  # dpid -> deque(最近发送的FlowMod), 按xid查找失败的请求
+        self.history = history
+        self.stats = {'installed': 0, 'suppressed': 0, 'removed': 0, 'evicted': 0,
+                      'table_full': 0, 'rejected': 0}
+
+    @staticmethod
+    def key(table_id, priority, match):
+        # 全1掩码与精确匹配等价, 交换机在FlowRemoved中可能按精确匹配返回
+        fields = []
+        for field, value in match.items():
+            if isinstance(value, tuple) and set(str(value[1])) <= _FULL_MASK_CHARS:
+                value = value[0]
+            fields.append((field, value))
+        return table_id, priority, tuple(sorted(fields))
+
+    @staticmethod
+    def _fingerprint(mod):
+        return (repr(mod.instructions), mod.idle_timeout, mod.hard_timeout, mod.cookie)
+
+    def install(self, datapath, mod):
+        """下发ADD FlowMod, 与影子表中的表项完全相同时不发送; 返回是否发送"""
+        ofproto = datapath.ofproto
+        table = self.tables.setdefault(datapath.id, OrderedDict())
+        key = self.key(mod.table_id, mod.priority, mod.match)
+        fingerprint = self._fingerprint(mod)
+        now = self.clock()
+        entry = table.get(key)
+        # 带缓存包的FlowMod同时负责释放缓存包, 不能省略
+        buffered = mod.buffer_id not in (None, ofproto.OFP_NO_BUFFER)
+        if (entry is not None and entry['fingerprint'] == fingerprint and not buffered
+                and now - entry['sent'] < self.resend_after):
+            table.move_to_end(key)
+            self.stats['suppressed'] += 1
+            return False
+
+        counts = self.counts.setdefault(datapath.id, Counter())
+        if entry is None:
+            if self.table_limit and counts[mod.table_id] >= self.table_limit:
+                self.evict(datapath, mod.table_id, mod.priority)
+            counts[mod.table_id] += 1
+
+        mod.flags |= ofproto.OFPFF_SEND_FLOW_REM
+        table[key] = {'fingerprint': fingerprint, 'sent': now,
+                      'idle_timeout': mod.idle_timeout, 'hard_timeout': mod.hard_timeout}
+        table.move_to_end(key)
+        self.recent.setdefault(datapath.id, deque(maxlen=self.history)).append(mod)
+        self.stats['installed'] += 1
+        self.send_msg(datapath, mod)
+        return True
+
+    def _drop(self, dpid, key):
+        """从影子表删除表项并更新该表的计数, 返回是否存在"""
+        table = self.tables.get(dpid)
+        if table is None or table.pop(key, None) is None:
+            return False
+        self.counts[dpid][key[0]] -= 1
+        return True
+
+    def flow_removed(self, msg):
+        """交换机删除表项(超时/删除/淘汰)后同步影子表"""
+        if self._drop(msg.datapath.id, self.key(msg.table_id, msg.priority, msg.match)):
+            self.stats['removed'] += 1
+
+    def flow_stats(self, dpid, body, table):
+        """FlowStatsCollector监听回调: 本轮有包命中的表项移到LRU末尾"""
+        shadow = self.tables.get(dpid)
+        if not shadow:
+            return
+        for stat in body:
+            slot = table.slots.get(flow_key(stat))
+            if slot is None or not table.delta_packets[slot]:
+                continue
+            key = self.key(stat.table_id, stat.priority, stat.match)
+            if key in shadow:
+                shadow.move_to_end(key)
+
+    def error(self, msg):
+        """处理经本缓存下发的FlowMod失败; 表满时淘汰后重发, 返回是否已处理"""
+        datapath = msg.datapath
+        ofproto = datapath.ofproto
+        mod = next((mod for mod in reversed(self.recent.get(datapath.id, ()))
+                    if mod.xid == msg.xid), None)
+        if mod is None:
+            return False
+        self._drop(datapath.id, self.key(mod.table_id, mod.priority, mod.match))
+        if msg.type != ofproto.OFPET_FLOW_MOD_FAILED or msg.code != ofproto.OFPFMFC_TABLE_FULL:
+            self.stats['rejected'] += 1
+            self.logger.warning(f"dpid={datapath.id} 表{mod.table_id}的FlowMod被拒绝: "
+                                f"type={msg.type} code={msg.code} {mod.match}")
+            return True
+        self.stats['table_full'] += 1
+        if self.evict(datapath, mod.table_id, mod.priority):
+            # 重新构造FlowMod(原消息已分配xid)
+            parser = datapath.ofproto_parser
+            self.install(datapath, parser.OFPFlowMod(
+                datapath=datapath, table_id=mod.table_id, priority=mod.priority,
+                match=mod.match, instructions=mod.instructions, idle_timeout=mod.idle_timeout,
+                hard_timeout=mod.hard_timeout, cookie=mod.cookie))
+        else:
+            self.logger.warning(f"dpid={datapath.id} 表{mod.table_id}已满且没有可淘汰的表项")
+        return True
+
+    def evict(self, datapath, table_id, priority):
+        """按LRU淘汰表中evict_batch条可淘汰表项, 返回淘汰数"""
+        table = self.tables.get(datapath.id)
+        if not table:
+            return 0
+        victims = []
+        for key, entry in table.items():
+            if (key[0] == table_id and key[1] <= priority
+                    and (entry['idle_timeout'] or entry['hard_timeout'])):
+                victims.append(key)
+                if len(victims) >= self.evict_batch:
+                    break
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        for key in victims:
+            self._drop(datapath.id, key)
+            self.send_msg(datapath, parser.OFPFlowMod(
+                datapath=datapath, table_id=key[0], command=ofproto.OFPFC_DELETE_STRICT,
+                priority=key[1], out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+                match=parser.OFPMatch(**dict(key[2]))))
+        if victims:
+            self.stats['evicted'] += len(victims)
+            self.logger.info(f"dpid={datapath.id} 表{table_id}淘汰{len(victims)}条最久未使用的表项")
+        return len(victims)
+
+    def remove(self, dpid):
+        """交换机断开后其流表状态未知, 清空影子表"""
+        self.tables.pop(dpid, None)
+        self.counts.pop(dpid, None)
+        self.recent.pop(dpid, None)
+
+    def entries(self):
+        """每台交换机影子表中的表项数"""
+        return {dpid: len(table) for dpid, table in self.tables.items()}
+
+    def get_stats(self):
+        return dict(self.stats)
@@ -0,0 +1,108 @@
+from collections import namedtuple
+
+ETH_TYPE_IPV6 = 0x86dd
+
+# 与具体OpenFlow解析器无关的流表项描述
+# match: OFPMatch关键字参数
+# actions: [('set_field', 字段, 值) | ('output', 端口) | ('group', 组号)]
+FlowSpec = namedtuple('FlowSpec', ['priority', 'match', 'actions'])
+
+L2_PRIORITY = 1
+L3_PRIORITY = 10
+
+
+def compile_flows(topology, router_mac, edge_dpid, ecmp=False):
+    """根据静态拓扑预先计算全部L2/L3转发表项, 返回 {dpid: [FlowSpec]}
+
+    - 每台交换机: 对每个已知主机MAC沿最短路径转发
+    - 非边缘交换机: 目的MAC为虚拟路由器MAC的流量转发到边缘路由器
+    - 边缘路由器: 对每个已知主机按ipv6_dst路由, 改写源/目的MAC
+
+    ecmp为False时等价路径取邻居dpid最小者; 为True时跨交换机流量指向
+    compile_groups生成的SELECT组(组号为目的交换机dpid), 在全部等价上行链路间哈希分担。
+    """
+    flows = {dpid: [] for dpid in topology.switches}
+
+    for dpid in topology.switches:
+        for host in topology.hosts:
+            actions = forward_actions(topology, dpid, host['dpid'], host['port'], ecmp)
+            if actions:
+                flows[dpid].append(FlowSpec(
+                    L2_PRIORITY, {'eth_dst': host['mac']}, actions))
+
+        if dpid != edge_dpid:
+            actions = forward_actions(topology, dpid, edge_dpid, None, ecmp)
+            if actions:
+                flows[dpid].append(FlowSpec(
+                    L2_PRIORITY, {'eth_dst': router_mac}, actions))
+
+    if edge_dpid in flows:
+        for host in topology.hosts:
+            actions = forward_actions(topology, edge_dpid, host['dpid'], host['port'], ecmp)
+            if not actions:
+                continue
+            match = {'eth_type': ETH_TYPE_IPV6, 'eth_dst': router_mac,
+                     'ipv6_dst': host['ip']}
+            actions = [('set_field', 'eth_src', router_mac),
+                       ('set_field', 'eth_dst', host['mac'])] + actions
+            flows[edge_dpid].append(FlowSpec(L3_PRIORITY, match, actions))
+
+    return flows
+
+
+def forward_actions(topology, dpid, dst_dpid, dst_port, ecmp=False):
+    """dpid上转发到dst_dpid(的dst_port端口)的动作, 不可达时返回None"""
+    if dpid == dst_dpid:
+        return [('output', dst_port)] if dst_port is not None else None
+    ports = topology.next_hop_ports(dpid, dst_dpid)
+    if not ports:
+        return None
+    if ecmp:
+        return [('group', dst_dpid)]
+    return [('output', ports[0])]
+
+
+def host_port(topology, dpid, host):
+    """dpid上通往主机的出端口, 不可达时返回None"""
+    if host['dpid'] == dpid:
+        return host['port']
+    ports = topology.next_hop_ports(dpid, host['dpid'])
+    return ports[0] if ports else None
+
+
+def compile_groups(topology, down_ports=()):
+    """计算ECMP SELECT组, 返回 {dpid: {组号: [(端口, 权重)]}}
+
+    每台交换机对每个可达的目的交换机建一个组(组号为目的dpid), 桶为完整拓扑中
+    全部等价下一跳端口; down_ports中的故障端口使路径失效时, 对应桶权重降为0,
+    若故障后出现新的最短路径端口则追加为新桶。
+    """
+    live = topology.without_ports(down_ports) if down_ports else topology
+    groups = {}
+    for dpid in topology.switches:
+        groups[dpid] = {}
+        for dst_dpid in topology.switches:
+            if dst_dpid == dpid:
+                continue
+            ports = topology.next_hop_ports(dpid, dst_dpid)
+            if not ports:
+                continue
+            live_ports = set(live.next_hop_ports(dpid, dst_dpid))
+            groups[dpid][dst_dpid] = [(port, 1 if port in live_ports else 0)
+                                      for port in sorted(set(ports) | live_ports)]
+    return groups
+
+
+def build_actions(parser, actions):
+    """将FlowSpec动作转换为OpenFlow动作对象"""
+    result = []
+    for action in actions:
+        if action[0] == 'set_field':
+            result.append(parser.OFPActionSetField(**{action[1]: action[2]}))
+        elif action[0] == 'output':
+            result.append(parser.OFPActionOutput(action[1]))
+        elif action[0] == 'group':
+            result.append(parser.OFPActionGroup(action[1]))
+        else:
+            raise ValueError(f"未知动作: {action[0]}")
+    return result
@@ -0,0 +1,294 @@
+import json
+import time
+
+import numpy as np
+from ryu.app.wsgi import ControllerBase, route
+from ryu.lib import hub
+from webob import Response
+
+
+class CounterTable(object):
+    """按槽位索引的字节/包计数表, 计数和速率保存在预分配的NumPy数组中
+
+    每个流(或端口)首次出现时分配一个槽位, 之后每轮统计只做一次向量化的差分计算;
+    一轮完整应答中没有出现的槽位视为已删除并回收。键到槽位的字典是唯一按表项
+    增长的Python对象, 数组容量不足时倍增。
+    """
+
+    def __init__(self, capacity=1024):
+        self.slots = {}     # 键 -> 槽位
+        self.keys = []      # 槽位 -> 键
+        self.free = []
+        self.generation = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, 'bytes', None)
+        arrays = {
+            'bytes': np.uint64, 'packets': np.uint64,
+            'byte_rate': np.float64, 'packet_rate': np.float64,
+            'delta_bytes': np.uint64, 'delta_packets': np.uint64,
+            'seen': np.float64, 'gen': np.uint32, 'active': np.bool_,
+        }
+        for name, dtype in arrays.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                current = getattr(self, name)
+                array[:len(current)] = current
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        if self.free:
+            slot = self.free.pop()
+            self.keys[slot] = key
+        else:
+            slot = len(self.keys)
+            if slot >= self.capacity:
+                self._allocate(self.capacity * 2)
+            self.keys.append(key)
+        self.slots[key] = slot
+        return slot
+
+    def update(self, keys, byte_counts, packet_counts, durations, now):
+        """用一轮完整应答更新计数和速率, 返回(新增数, 删除数)"""
+        count = len(keys)
+        known = len(self.slots)
+        idx = np.fromiter((self._slot(key) for key in keys), dtype=np.int64, count=count)
+        added = len(self.slots) - known
+        self.generation = (self.generation + 1) & 0xffffffff
+
+        new_bytes = np.asarray(byte_counts, dtype=np.uint64)
+        new_packets = np.asarray(packet_counts, dtype=np.uint64)
+        fresh = ~self.active[idx]
+        old_bytes = self.bytes[idx]
+        old_packets = self.packets[idx]
+        # 新分配的槽位、计数器回绕或流表项被替换时, 以新计数作为增量
+        delta_bytes = np.where(fresh | (new_bytes < old_bytes), new_bytes, new_bytes - old_bytes)
+        delta_packets = np.where(fresh | (new_packets < old_packets), new_packets,
+                                 new_packets - old_packets)
+        # 新出现的流用其存活时长估计速率
+        elapsed = np.where(fresh, np.maximum(np.asarray(durations, dtype=np.float64), 1.0),
+                           np.maximum(now - self.seen[idx], 1e-3))
+
+        self.delta_bytes[idx] = delta_bytes
+        self.delta_packets[idx] = delta_packets
+        self.byte_rate[idx] = delta_bytes / elapsed
+        self.packet_rate[idx] = delta_packets / elapsed
+        self.bytes[idx] = new_bytes
+        self.packets[idx] = new_packets
+        self.seen[idx] = now
+        self.gen[idx] = self.generation
+        self.active[idx] = True
+
+        stale = np.flatnonzero(self.active & (self.gen != self.generation))
+        for slot in stale.tolist():
+            del self.slots[self.keys[slot]]
+            self.keys[slot] = None
+            self.free.append(slot)
+        self.active[stale] = False
+        self.byte_rate[stale] = 0
+        self.packet_rate[stale] = 0
+        return added, len(stale)
+
+    def top(self, n, by='bytes'):
+        """速率最高的n个表项, 返回[(键, 字节/秒, 包/秒)]"""
+        rates = self.byte_rate if by == 'bytes' else self.packet_rate
+        active = np.flatnonzero(self.active)
+        if not len(active) or n <= 0:
+            return []
+        if len(active) > n:
+            active = active[np.argpartition(rates[active], -n)[-n:]]
+        active = active[np.argsort(rates[active])[::-1]]
+        return [(self.keys[slot], float(self.byte_rate[slot]), float(self.packet_rate[slot]))
+                for slot in active.tolist()]
+
+
+def flow_key(stat):
+    """流表项的唯一标识: (表号, 优先级, cookie, 匹配字段)"""
+    return (stat.table_id, stat.priority, stat.cookie, tuple(sorted(stat.match.items())))
+
+
+class FlowStatsCollector(object):
+    """流表和端口统计采集, 按交换机自适应调整轮询周期
+
+    多段(multipart)应答按(dpid, xid)拼接, 最后一段到达后一次性更新计数表。
+    一轮中新增/删除流的比例超过churn_high时轮询周期减半, 低于churn_low时
+    放大1.5倍, 周期限制在[min_interval, max_interval]之间。
+    """
+
+    def __init__(self, logger, send_msg, min_interval=1.0, max_interval=30.0,
+                 initial_interval=10.0, churn_high=0.1, churn_low=0.01, clock=time.monotonic):
+        self.logger = logger
+        self.send_msg = send_msg      # send_msg(datapath, msg)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.churn_high = churn_high
+        self.churn_low = churn_low
+        self.clock = clock
+        self.datapaths = {}
+        self.flows = {}       # dpid -> CounterTable
+        self.ports = {}       # dpid -> CounterTable
+        self.port_tx = {}     # dpid -> 只计发送方向的CounterTable
+        self.intervals = {}   # dpid -> 当前轮询周期
+        self.next_poll = {}   # dpid -> 下次轮询时间
+        self._partial = {}    # (dpid, xid) -> 已收到的应答条目
+        self.listeners = []   # 流统计更新后的回调 fn(dpid, 应答条目, CounterTable)
+
+    def add_datapath(self, datapath):
+        dpid = datapath.id
+        self.datapaths[dpid] = datapath
+        self.flows.setdefault(dpid, CounterTable())
+        self.ports.setdefault(dpid, CounterTable(64))
+        self.port_tx.setdefault(dpid, CounterTable(64))
+        self.intervals.setdefault(dpid, self.initial_interval)
+        self.next_poll[dpid] = self.clock()
+
+    def remove_datapath(self, dpid):
+        self.datapaths.pop(dpid, None)
+        self.flows.pop(dpid, None)
+        self.ports.pop(dpid, None)
+        self.port_tx.pop(dpid, None)
+        self.intervals.pop(dpid, None)
+        self.next_poll.pop(dpid, None)
+        for key in [key for key in self._partial if key[0] == dpid]:
+            del self._partial[key]
+
+    def run(self):
+        """后台轮询循环, 由应用通过hub.spawn启动"""
+        while True:
+            now = self.clock()
+            for dpid, datapath in list(self.datapaths.items()):
+                if now >= self.next_poll.get(dpid, now):
+                    self.request_stats(datapath)
+                    self.next_poll[dpid] = now + self.intervals[dpid]
+            hub.sleep(self.min_interval / 2)
+
+    def request_stats(self, datapath):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        self.send_msg(datapath, parser.OFPFlowStatsRequest(datapath))
+        self.send_msg(datapath, parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY))
+
+    def _reassemble(self, msg):
+        """拼接多段应答, 最后一段到达时返回全部条目, 否则返回None"""
+        key = (msg.datapath.id, msg.xid)
+        body = self._partial.pop(key, [])
+        body.extend(msg.body)
+        if msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            self._partial[key] = body
+            return None
+        return body
+
+    def flow_stats_reply(self, msg):
+        body = self._reassemble(msg)
+        dpid = msg.datapath.id
+        table = self.flows.get(dpid)
+        if body is None or table is None:
+            return
+        added, removed = table.update(
+            [flow_key(stat) for stat in body],
+            [stat.byte_count for stat in body],
+            [stat.packet_count for stat in body],
+            [stat.duration_sec + stat.duration_nsec / 1e9 for stat in body],
+            self.clock())
+        self._adapt(dpid, added, removed, len(table))
+        for listener in self.listeners:
+            listener(dpid, body, table)
+
+    def port_stats_reply(self, msg):
+        body = self._reassemble(msg)
+        table = self.ports.get(msg.datapath.id)
+        tx_table = self.port_tx.get(msg.datapath.id)
+        if body is None or table is None:
+            return
+        now = self.clock()
+        ports = [stat.port_no for stat in body]
+        durations = [stat.duration_sec + stat.duration_nsec / 1e9 for stat in body]
+        table.update(
+            ports,
+            [stat.rx_bytes + stat.tx_bytes for stat in body],
+            [stat.rx_packets + stat.tx_packets for stat in body],
+            durations, now)
+        if tx_table is not None:
+            tx_table.update(ports, [stat.tx_bytes for stat in body],
+                            [stat.tx_packets for stat in body], durations, now)
+
+    def _adapt(self, dpid, added, removed, active):
+        churn = (added + removed) / max(active, 1)
+        interval = self.intervals[dpid]
+        if churn > self.churn_high:
+            interval = max(self.min_interval, interval / 2)
+        elif churn < self.churn_low:
+            interval = min(self.max_interval, interval * 1.5)
+        if interval != self.intervals[dpid]:
+            self.logger.debug(f"dpid={dpid} 流变化率{churn:.1%}, 轮询周期调整为{interval:.1f}s")
+            self.intervals[dpid] = interval
+            self.next_poll[dpid] = min(self.next_poll[dpid], self.clock() + interval)
+
+    def top_talkers(self, n=10, by='bytes', dpid=None):
+        """全部(或指定)交换机上速率最高的n条流"""
+        candidates = []
+        for switch, table in self.flows.items():
+            if dpid is not None and switch != dpid:
+                continue
+            for key, byte_rate, packet_rate in table.top(n, by):
+                candidates.append({
+                    'dpid': switch, 'table_id': key[0], 'priority': key[1],
+                    'match': dict(key[3]), 'byte_rate': byte_rate,
+                    'packet_rate': packet_rate})
+        field = 'byte_rate' if by == 'bytes' else 'packet_rate'
+        candidates.sort(key=lambda item: item[field], reverse=True)
+        return candidates[:n]
+
+    def port_rate(self, dpid, port):
+        """端口最近一轮的收发合计字节/秒, 未知时为0"""
+        table = self.ports.get(dpid)
+        slot = table.slots.get(port) if table is not None else None
+        return float(table.byte_rate[slot]) if slot is not None else 0.0
+
+    def port_tx_rate(self, dpid, port):
+        """端口最近一轮的发送字节/秒(即该方向链路的负载), 未知时为0"""
+        table = self.port_tx.get(dpid)
+        slot = table.slots.get(port) if table is not None else None
+        return float(table.byte_rate[slot]) if slot is not None else 0.0
+
+    def port_rates(self, dpid):
+        """交换机各端口的收发合计速率"""
+        table = self.ports.get(dpid)
+        if table is None:
+            return {}
+        return {port: {'byte_rate': byte_rate, 'packet_rate': packet_rate}
+                for port, byte_rate, packet_rate in table.top(len(table))}
+
+
+class FlowStatsController(ControllerBase):
+    """GET /stats/top?n=10&by=bytes|packets[&dpid=N]: 速率最高的流"""
+
+    def __init__(self, req, link, data, **config):
+        super(FlowStatsController, self).__init__(req, link, data, **config)
+        self.collector = data['flow_stats']
+
+    @route('flow_stats', '/stats/top', methods=['GET'])
+    def get_top(self, req, **kwargs):
+        try:
+            n = int(req.GET.get('n', 10))
+            dpid = int(req.GET['dpid']) if 'dpid' in req.GET else None
+        except ValueError:
+            return Response(status=400)
+        by = req.GET.get('by', 'bytes')
+        body = json.dumps(self.collector.top_talkers(n, by, dpid), default=str)
+        return Response(content_type='application/json', charset='utf-8', text=body)
+
+    @route('flow_stats', '/stats/ports/{dpid}', methods=['GET'],
+           requirements={'dpid': r'\d+'})
+    def get_ports(self, req, dpid, **kwargs):
+        body = json.dumps(self.collector.port_rates(int(dpid)))
+        return Response(content_type='application/json', charset='utf-8', text=body)
@@ -0,0 +1,306 @@
+import socket
+import time
+from array import array
+
+_M64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIN_SLOTS = 16
+
+
+def mac_to_int(mac):
+    return int(mac.replace(':', ''), 16)
+
+
+def int_to_mac(value):
+    return value.to_bytes(6, 'big').hex(':')
+
+
+def ipv6_to_int(ip):
+    return int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big')
+
+
+def int_to_ipv6(value):
+    return socket.inet_ntop(socket.AF_INET6, value.to_bytes(16, 'big'))
+
+
+class AgingTable(object):
+    """整数键值的有界老化表, 表项全部保存在定长array中
+
+    开放定址(线性探测)哈希表: 每个槽位由键低64位、(可选)键高64位、值和
+    过期时间(整秒)四个数组元素组成, 过期时间为0表示空槽, 删除时后移回填,
+    不留墓碑。负载因子不超过1/2, 表满前按需倍增直到容量对应的上限。
+
+    每次写入刷新过期时间, 因此过期时间最早的表项就是最久未更新的表项。
+    容量满时从轮转游标处采样若干表项, 淘汰其中最早过期者(近似LRU)。
+    capacity不大于0时表不设上限, 只按负载因子倍增, 表项只靠老化删除。
+    """
+
+    SAMPLES = 8
+
+    def __init__(self, capacity, ttl, key_bits=64, clock=time.monotonic):
+        self.capacity = capacity if capacity > 0 else None
+        self.ttl = max(1, int(ttl))
+        self.clock = clock
+        self.wide = key_bits > 64
+        self.evictions = 0
+        self.expirations = 0
+        self._len = 0
+        self._evict_cursor = 0
+        self._sweep_cursor = 0
+        self._max_slots = _MIN_SLOTS
+        if self.capacity is None:
+            self._max_slots = float('inf')
+        else:
+            while self._max_slots < capacity * 2:
+                self._max_slots <<= 1
+        self._allocate(_MIN_SLOTS)
+
+    def _allocate(self, slots):
+        self._mask = slots - 1
+        self._shift = 64 - (slots.bit_length() - 1)
+        self._lo = array('Q', bytes(8 * slots))
+        self._hi = array('Q', bytes(8 * slots)) if self.wide else None
+        self._values = array('q', bytes(8 * slots))
+        self._expires = array('I', bytes(4 * slots))
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def _home(self, key):
+        return ((hash(key) * _GOLDEN) & _M64) >> self._shift
+
+    def _key_at(self, slot):
+        if self.wide:
+            return (self._hi[slot] << 64) | self._lo[slot]
+        return self._lo[slot]
+
+    def _probe(self, key):
+        """返回(槽位, 是否命中); 未命中时槽位为键应插入的空槽"""
+        lo = key & _M64
+        hi = key >> 64
+        los, his, expires, mask = self._lo, self._hi, self._expires, self._mask
+        slot = self._home(key)
+        while expires[slot]:
+            if los[slot] == lo and (his is None or his[slot] == hi):
+                return slot, True
+            slot = (slot + 1) & mask
+        return slot, False
+
+    def get(self, key, default=None):
+        slot, found = self._probe(key)
+        if not found:
+            return default
+        if self._expires[slot] <= self.clock():
+            self._delete(slot)
+            self.expirations += 1
+            return default
+        return self._values[slot]
+
+    def set(self, key, value, ttl=None):
+        """写入表项, ttl为本表项的存活秒数(默认为表的老化时间)"""
+        expires = int(self.clock()) + (self.ttl if ttl is None else max(1, int(ttl)))
+        slot, found = self._probe(key)
+        if found:
+            self._values[slot] = value
+            self._expires[slot] = expires
+            return
+
+        if self.capacity is not None and self._len >= self.capacity:
+            self._evict()
+            slot, _ = self._probe(key)
+        elif (self._len + 1) * 2 > len(self._expires) and len(self._expires) < self._max_slots:
+            self._resize(len(self._expires) * 2)
+            slot, _ = self._probe(key)
+
+        self._lo[slot] = key & _M64
+        if self.wide:
+            self._hi[slot] = key >> 64
+        self._values[slot] = value
+        self._expires[slot] = expires
+        self._len += 1
+
+    def pop(self, key, default=None):
+        slot, found = self._probe(key)
+        if not found:
+            return default
+        value = self._values[slot]
+        self._delete(slot)
+        return value
+
+    def expire(self, limit=None):
+        """从清理游标处检查至多limit个槽位(默认全表), 删除过期表项并返回数量"""
+        now = self.clock()
+        expires = self._expires
+        slots = len(expires)
+        limit = slots if limit is None else min(limit, slots)
+        slot = self._sweep_cursor % slots
+        count = 0
+        for _ in range(limit):
+            # 删除后可能有后续表项回填到当前槽位, 需要重新检查
+            while expires[slot] and expires[slot] <= now:
+                self._delete(slot)
+                count += 1
+            slot = (slot + 1) & self._mask
+        self._sweep_cursor = slot
+        self.expirations += count
+        return count
+
+    def items(self):
+        now = self.clock()
+        for slot, expires in enumerate(self._expires):
+            if expires > now:
+                yield self._key_at(slot), self._values[slot]
+
+    def entries(self):
+        """未过期表项的(键, 值, 剩余秒数), 供状态快照保存"""
+        now = int(self.clock())
+        for slot, expires in enumerate(self._expires):
+            if expires > now:
+                yield self._key_at(slot), self._values[slot], expires - now
+
+    def _delete(self, slot):
+        """删除槽位上的表项, 并把探测链上的后续表项后移回填(线性探测删除)"""
+        los, his, values, expires, mask = self._lo, self._hi, self._values, self._expires, self._mask
+        self._len -= 1
+        hole = slot
+        nxt = (slot + 1) & mask
+        while expires[nxt]:
+            home = self._home(self._key_at(nxt))
+            if ((nxt - home) & mask) >= ((nxt - hole) & mask):
+                los[hole] = los[nxt]
+                if his is not None:
+                    his[hole] = his[nxt]
+                values[hole] = values[nxt]
+                expires[hole] = expires[nxt]
+                hole = nxt
+            nxt = (nxt + 1) & mask
+        expires[hole] = 0
+
+    def _evict(self):
+        """采样淘汰: 从游标处取若干表项, 删除其中最早过期(最久未更新)的一个"""
+        expires, mask = self._expires, self._mask
+        slot = self._evict_cursor
+        victim = -1
+        seen = 0
+        samples = min(self.SAMPLES, self._len)
+        while seen < samples:
+            if expires[slot]:
+                if victim < 0 or expires[slot] < expires[victim]:
+                    victim = slot
+                seen += 1
+            slot = (slot + 1) & mask
+        self._evict_cursor = slot
+        self._delete(victim)
+        self.evictions += 1
+
+    def _resize(self, slots):
+        old = [(self._key_at(slot), self._values[slot], expires)
+               for slot, expires in enumerate(self._expires) if expires]
+        self._allocate(slots)
+        for key, value, expires in old:
+            slot, _ = self._probe(key)
+            self._lo[slot] = key & _M64
+            if self.wide:
+                self._hi[slot] = key >> 64
+            self._values[slot] = value
+            self._expires[slot] = expires
+
+
+class _StringKeyedTable(object):
+    """以字符串地址为接口的老化表封装, 另带不老化的静态表项"""
+
+    KEY_BITS = 64
+
+    def __init__(self, capacity, ttl):
+        self.table = AgingTable(capacity, ttl, key_bits=self.KEY_BITS)
+        self.static = {}
+
+    def __len__(self):
+        return len(self.table) + len(self.static)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def add_static(self, key, value):
+        """添加不会老化或被淘汰的表项(网关、拓扑中的已知主机)"""
+        self.static[key] = value
+
+    def expire(self, limit=None):
+        return self.table.expire(limit)
+
+    def entries(self):
+        """老化表项的(整数键, 整数值, 剩余秒数), 不含静态表项"""
+        return self.table.entries()
+
+    def restore(self, key, value, ttl):
+        """从快照恢复老化表项, ttl为剩余秒数"""
+        self.table.set(key, value, ttl)
+
+    def get_stats(self):
+        return {
+            'entries': len(self.table),
+            'static_entries': len(self.static),
+            'capacity': self.table.capacity,
+            'evictions': self.table.evictions,
+            'expirations': self.table.expirations,
+        }
+
+
+class MacTable(_StringKeyedTable):
+    """单台交换机的MAC -> 端口表, MAC以48位整数保存"""
+
+    def get(self, mac, default=None):
+        port = self.static.get(mac)
+        if port is not None:
+            return port
+        return self.table.get(mac_to_int(mac), default)
+
+    def __setitem__(self, mac, port):
+        if mac not in self.static:
+            self.table.set(mac_to_int(mac), port)
+
+    def items(self):
+        for key, port in self.table.items():
+            yield int_to_mac(key), port
+        yield from self.static.items()
+
+
+class NeighborTable(_StringKeyedTable):
+    """IPv6地址 -> MAC邻居表, 地址和MAC均以整数保存"""
+
+    KEY_BITS = 128
+
+    def get(self, ip, default=None):
+        mac = self.static.get(ip)
+        if mac is not None:
+            return mac
+        try:
+            key = ipv6_to_int(ip)
+        except (OSError, ValueError):
+            return default
+        value = self.table.get(key)
+        return default if value is None else int_to_mac(value)
+
+    def __setitem__(self, ip, mac):
+        if ip not in self.static:
+            self.table.set(ipv6_to_int(ip), mac_to_int(mac))
+
+    def pop(self, ip, default=None):
+        if ip in self.static:
+            return self.static.pop(ip)
+        value = self.table.pop(ipv6_to_int(ip))
+        return default if value is None else int_to_mac(value)
+
+    def items(self):
+        for key, mac in self.table.items():
+            yield int_to_ipv6(key), int_to_mac(mac)
+        yield from self.static.items()
@@ -0,0 +1,187 @@
+import time
+from bisect import bisect_left
+
+from ryu.app.wsgi import ControllerBase, route
+from webob import Response
+
+# 直方图桶上界(秒): 1us起按2倍递增到约8.4s, 固定桶数, 记录只需一次二分查找
+LATENCY_BUCKETS = tuple(1e-6 * (1 << i) for i in range(24))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+# 同一进程中所有应用的指标集合, 由同一个WSGI端点导出
+REGISTRY = []
+
+# 内置指标族: 名称 -> (类型, 说明)
+_BUILTIN_FAMILIES = {
+    'ryu_instrumentation_enabled': ('gauge', '埋点是否开启'),
+    'ryu_stage_seconds': ('histogram', '处理阶段耗时'),
+    'ryu_packet_in_total': ('counter', '按交换机和以太网类型统计的packet-in数'),
+}
+
+
+class Histogram(object):
+    """固定桶延迟直方图"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶上界估计分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else float('inf')
+        return float('inf')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Instrumentation(object):
+    """控制器热路径埋点: 分阶段延迟直方图、packet-in计数和自定义指标
+
+    关闭时start()返回None, stage()直接返回, 埋点开销只有一次属性判断。
+    用法: t = metrics.start(); ...; t = metrics.stage('parse', t); ...
+    """
+
+    def __init__(self, app, enabled=False):
+        self.app = app
+        self.enabled = enabled
+        self.histograms = {}   # 阶段名 -> Histogram
+        self.packet_ins = {}   # (dpid, 以太网类型) -> 计数
+        self.counters = {}     # (指标名, 标签元组) -> 计数
+        self.collectors = []   # (指标名, 类型, 说明, 取值函数)
+        self.descriptions = {}  # inc()计数器的指标名 -> 说明
+        REGISTRY.append(self)
+
+    def start(self):
+        return time.perf_counter() if self.enabled else None
+
+    def stage(self, name, start):
+        """记录从start到现在的耗时, 返回当前时间作为下一阶段的起点"""
+        if start is None:
+            return None
+        now = time.perf_counter()
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(now - start)
+        return now
+
+    def packet_in(self, dpid, ethertype):
+        if self.enabled:
+            key = (dpid, ethertype)
+            self.packet_ins[key] = self.packet_ins.get(key, 0) + 1
+
+    def describe(self, name, help_text):
+        """设置inc()计数器的说明, 未设置时以指标名作说明"""
+        self.descriptions[name] = help_text
+
+    def inc(self, name, labels=(), value=1):
+        if self.enabled:
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def register(self, name, kind, help_text, fn):
+        """注册导出时才取值的指标(kind为counter/gauge), fn返回[(标签元组, 值)]"""
+        self.collectors.append((name, kind, help_text, fn))
+
+    def reset(self):
+        self.histograms.clear()
+        self.packet_ins.clear()
+        self.counters.clear()
+
+    def render(self):
+        """按指标族分组的Prometheus文本格式样本行: {指标名: (类型, 说明, [样本行])}"""
+        app = (('app', self.app),)
+        families = {}
+
+        def family(name, kind, help_text):
+            return families.setdefault(name, (kind, help_text, []))[2]
+
+        family('ryu_instrumentation_enabled', *_BUILTIN_FAMILIES['ryu_instrumentation_enabled']).append(
+            f"ryu_instrumentation_enabled{_labels(app)} {int(self.enabled)}")
+        lines = family('ryu_stage_seconds', *_BUILTIN_FAMILIES['ryu_stage_seconds'])
+        for name, histogram in sorted(self.histograms.items()):
+            labels = app + (('stage', name),)
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f"ryu_stage_seconds_bucket{_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"ryu_stage_seconds_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"ryu_stage_seconds_sum{_labels(labels)} {histogram.sum:.9f}")
+            lines.append(f"ryu_stage_seconds_count{_labels(labels)} {histogram.count}")
+        lines = family('ryu_packet_in_total', *_BUILTIN_FAMILIES['ryu_packet_in_total'])
+        for (dpid, ethertype), count in sorted(self.packet_ins.items()):
+            labels = app + (('dpid', dpid), ('ethertype', f'0x{ethertype:04x}'))
+            lines.append(f"ryu_packet_in_total{_labels(labels)} {count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            family(name, 'counter', self.descriptions.get(name, name)).append(
+                f"{name}{_labels(app + labels)} {value}")
+        for name, kind, help_text, fn in self.collectors:
+            lines = family(name, kind, help_text)
+            for labels, value in fn():
+                lines.append(f"{name}{_labels(app + tuple(labels))} {value}")
+        return families
+
+
+def render_all():
+    """导出进程中所有应用的指标: 同一指标族的样本连续输出, 每族一组HELP/TYPE"""
+    families = {}
+    for metrics in REGISTRY:
+        for name, (kind, help_text, lines) in metrics.render().items():
+            families.setdefault(name, (kind, help_text, []))[2].extend(lines)
+    output = []
+    for name, (kind, help_text, lines) in families.items():
+        output.append(f'# HELP {name} {help_text}')
+        output.append(f'# TYPE {name} {kind}')
+        output += lines
+    return '\n'.join(output) + '\n'
+
+
+class MetricsController(ControllerBase):
+    """/metrics: Prometheus抓取端点; PUT /metrics/enable|disable|reset: 运行时开关埋点"""
+
+    @route('metrics', '/metrics', methods=['GET'])
+    def get_metrics(self, req, **kwargs):
+        return Response(content_type=PROMETHEUS_CONTENT_TYPE, charset='utf-8',
+                        text=render_all())
+
+    @route('metrics', '/metrics/{action}', methods=['PUT', 'POST'],
+           requirements={'action': 'enable|disable|reset'})
+    def set_metrics(self, req, action, **kwargs):
+        for metrics in REGISTRY:
+            if action == 'reset':
+                metrics.reset()
+            else:
+                metrics.enabled = action == 'enable'
+        return Response(content_type='text/plain', charset='utf-8',
+                        text=f"{action}: {', '.join(m.app for m in REGISTRY)}\n")
+
+
+_registered = set()
+
+
+def register_wsgi(wsgi):
+    """向Ryu WSGI应用注册指标端点, 同一进程中多个应用共用一个端点"""
+    if id(wsgi) not in _registered:
+        _registered.add(id(wsgi))
+        wsgi.register(MetricsController)
@@ -0,0 +1,78 @@
+# Mininet基准脚本的公共部分: 启动/停止ryu-manager控制器、清理Mininet残留、抓取控制器
+# 导出的/metrics计数、给测试主机配置地址和互ping。离线基准使用controller_harness.py。
+
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+from fabric_topo import DATACENTER_GATEWAY, EXTERNAL_GATEWAY  # noqa: F401  供基准脚本导入
+
+METRICS_URL = 'http://127.0.0.1:8080/metrics'
+CONTROLLER = 'datacenter_controller.py'
+# datacenter_topo.py中的外部主机和数据中心主机(不含清洗服务器)
+EXTERNAL_HOSTS = ['h6', 'h7', 'h8']
+INTERNAL_HOSTS = ['h1a', 'h1b', 'h2a', 'h2b', 'h3a', 'h3b', 'h4a', 'h4b']
+GATEWAY = DATACENTER_GATEWAY
+
+
+def cleanup():
+    """清理上一次运行残留的Mininet网络"""
+    subprocess.call(['mn', '-c'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_controller(log_path, app=CONTROLLER, wait=6, append=False, **env):
+    """后台启动ryu-manager(开启METRICS, env覆盖环境变量), 等待wait秒后确认进程仍在运行"""
+    env = dict(os.environ, METRICS='1', **env)
+    log = open(log_path, 'a' if append else 'w')
+    proc = subprocess.Popen(['ryu-manager', app], env=env, stdout=log, stderr=subprocess.STDOUT)
+    time.sleep(wait)
+    if proc.poll() is not None:
+        sys.exit(f"控制器启动失败, 见{log_path}")
+    return proc
+
+
+def stop_controller(proc):
+    proc.terminate()
+    proc.wait()
+
+
+def metric(name, labels=''):
+    """控制器导出的计数之和; labels为标签的正则片段, 如'dpid="2",ethertype="0x86dd"'"""
+    text = urllib.request.urlopen(METRICS_URL).read().decode()
+    pattern = '^' + name + r'\{[^}]*' + labels + r'[^}]*\} (\d+)'
+    return sum(int(count) for count in re.findall(pattern, text, re.M))
+
+
+def add_test_address(host, address, gateway=GATEWAY):
+    """给主机加一个测试地址; gateway不为None时以该地址为源经网关设默认路由"""
+    intf = host.defaultIntf()
+    host.cmd(f'ip -6 addr add {address}/64 dev {intf} nodad')
+    if gateway:
+        host.cmd(f'ip -6 route replace default via {gateway} dev {intf} onlink src {address}')
+
+
+def setup_hosts(net, names, prefix, gateway=GATEWAY):
+    """按序号给主机配置prefix下的测试地址, 返回{主机名: 测试地址}"""
+    addresses = {}
+    for i, name in enumerate(names, 1):
+        addresses[name] = f'{prefix}{i:x}'
+        add_test_address(net.get(name), addresses[name], gateway)
+    return addresses
+
+
+def mesh_pairs(external, addresses):
+    """数据中心主机两两互ping(L2) + 外部主机×数据中心主机(L3)的(源主机, 目的地址)"""
+    pairs = [(src, address) for src in addresses for dst, address in addresses.items()
+             if src != dst]
+    return pairs + [(src, address) for src in external for address in addresses.values()]
+
+
+def ping_pairs(net, pairs):
+    """逐对ping6一次, 返回成功的对数"""
+    ok = 0
+    for src, address in pairs:
+        ok += ' 0% packet loss' in net.get(src).cmd(f'ping6 -c 1 -W 1 {address}')
+    return ok
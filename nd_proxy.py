@@ -0,0 +1,86 @@
+from ryu.lib.packet import packet
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import ether_types
+from ryu.lib.packet import in_proto
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import icmpv6
+
+# 邻居通告标志位(nd_neighbor.res): Router / Solicited / Override
+NA_FLAG_ROUTER = 0x4
+NA_FLAG_SOLICITED = 0x2
+NA_FLAG_OVERRIDE = 0x1
+
+UNSPECIFIED_ADDRESS = '::'
+
+
+def build_neighbor_advert(target_ip, target_mac, dst_ip, dst_mac, router=False):
+    """构造应答邻居请求的邻居通告帧(带目标链路层地址选项)"""
+    flags = NA_FLAG_SOLICITED | NA_FLAG_OVERRIDE
+    if router:
+        flags |= NA_FLAG_ROUTER
+
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst=dst_mac, src=target_mac,
+                                       ethertype=ether_types.ETH_TYPE_IPV6))
+    pkt.add_protocol(ipv6.ipv6(src=target_ip, dst=dst_ip,
+                               nxt=in_proto.IPPROTO_ICMPV6, hop_limit=255))
+    pkt.add_protocol(icmpv6.icmpv6(
+        type_=icmpv6.ND_NEIGHBOR_ADVERT,
+        data=icmpv6.nd_neighbor(res=flags, dst=target_ip,
+                                option=icmpv6.nd_option_tla(hw_src=target_mac))))
+    pkt.serialize()
+    return pkt.data
+
+
+def build_neighbor_solicit(src_ip, src_mac, target_ip, target_mac):
+    """构造单播邻居请求帧(邻居不可达检测), 带源链路层地址选项"""
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst=target_mac, src=src_mac,
+                                       ethertype=ether_types.ETH_TYPE_IPV6))
+    pkt.add_protocol(ipv6.ipv6(src=src_ip, dst=target_ip,
+                               nxt=in_proto.IPPROTO_ICMPV6, hop_limit=255))
+    pkt.add_protocol(icmpv6.icmpv6(
+        type_=icmpv6.ND_NEIGHBOR_SOLICIT,
+        data=icmpv6.nd_neighbor(dst=target_ip,
+                                option=icmpv6.nd_option_sla(hw_src=src_mac))))
+    pkt.serialize()
+    return pkt.data
+
+
+class NDProxy(object):
+    """控制器侧邻居发现代理: 用邻居表应答邻居请求"""
+
+    def __init__(self, nd_table, router_mac):
+        self.nd_table = nd_table
+        self.router_mac = router_mac
+        self.answered = 0
+        self.missed = 0
+
+    @staticmethod
+    def solicit_target(icmpv6_pkt):
+        """邻居请求中的目标地址, 非NS时返回None"""
+        if icmpv6_pkt.type_ != icmpv6.ND_NEIGHBOR_SOLICIT:
+            return None
+        return icmpv6_pkt.data.dst
+
+    def handle_solicit(self, src_mac, ipv6_pkt, icmpv6_pkt):
+        """目标在邻居表中时返回邻居通告帧, 否则返回None
+
+        重复地址检测(源地址为::)的请求不代答, 交由目标主机自己处理。
+        """
+        target_ip = self.solicit_target(icmpv6_pkt)
+        if target_ip is None or ipv6_pkt.src == UNSPECIFIED_ADDRESS:
+            return None
+        target_mac = self.nd_table.get(target_ip)
+        if target_mac is None:
+            self.missed += 1
+            return None
+
+        # 请求方的链路层地址优先取源链路层地址选项
+        option = icmpv6_pkt.data.option
+        if isinstance(option, icmpv6.nd_option_sla):
+            src_mac = option.hw_src
+
+        self.answered += 1
+        return build_neighbor_advert(target_ip, target_mac, ipv6_pkt.src, src_mac,
+                                     router=target_mac == self.router_mac)
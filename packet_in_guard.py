@@ -0,0 +1,153 @@
+import time
+
+# 上送控制器流表(table-miss等)使用的限速表编号
+PACKET_IN_METER_ID = 1
+
+# LLDP探测不做准入限制, 以免链路发现被风暴饿死
+_LLDP_ETHERTYPE = b'\x88\xcc'
+
+
+class TokenBucket(object):
+    """令牌桶: rate为每秒补充的令牌数, burst为桶容量"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'last')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+
+    def consume(self, now):
+        tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if tokens >= 1:
+            self.tokens = tokens - 1
+            return True
+        self.tokens = tokens
+        return False
+
+
+class PacketInGuard(object):
+    """packet-in风暴防护: 交换机侧OpenFlow限速表 + 控制器侧准入控制
+
+    交换机支持限速表时, 上送控制器的流表项挂上按包速率限速的限速表, 超出部分
+    在交换机上直接丢弃。控制器收到packet-in后, 在解析前先按(dpid)和(dpid, 源MAC)
+    两级令牌桶做准入, 超限的包直接丢弃, 或在sample_every>0时每N个超限包放行一个
+    采样。rate为0表示不启用对应的限速。
+    """
+
+    def __init__(self, logger, send_msg, meter_rate=0, meter_burst=0, dpid_rate=0, src_rate=0,
+                 burst_seconds=1.0, sample_every=0, max_sources=65536, clock=time.monotonic):
+        self.logger = logger
+        self.send_msg = send_msg      # send_msg(datapath, msg)
+        self.meter_rate = meter_rate
+        self.meter_burst = meter_burst or meter_rate
+        self.dpid_rate = dpid_rate
+        self.src_rate = src_rate
+        self.burst_seconds = burst_seconds
+        self.sample_every = sample_every
+        self.max_sources = max_sources
+        self.clock = clock
+        self.dpid_buckets = {}   # dpid -> TokenBucket
+        self.src_buckets = {}    # (dpid, 源MAC字节) -> TokenBucket
+        self.meters = set()      # 已安装限速表的dpid
+        self.stats = {}          # dpid -> 准入计数
+
+    def meter_features_request(self, datapath):
+        """查询交换机限速表能力, 应答交给meter_features_reply"""
+        if self.meter_rate:
+            parser = datapath.ofproto_parser
+            self.send_msg(datapath, parser.OFPMeterFeaturesStatsRequest(datapath, 0))
+
+    def meter_features_reply(self, msg):
+        """交换机支持按包速率限速时安装限速表, 返回是否已安装"""
+        datapath = msg.datapath
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if not self.meter_rate or not msg.body:
+            return False
+        features = msg.body[0]
+        if features.max_meter < PACKET_IN_METER_ID or \
+                not features.band_types & (1 << ofproto.OFPMBT_DROP) or \
+                not features.capabilities & ofproto.OFPMF_PKTPS:
+            self.logger.warning(f"dpid={datapath.id} 不支持按包速率限速, 仅使用控制器侧准入控制")
+            return False
+
+        flags = ofproto.OFPMF_PKTPS
+        if features.capabilities & ofproto.OFPMF_BURST:
+            flags |= ofproto.OFPMF_BURST
+        bands = [parser.OFPMeterBandDrop(rate=self.meter_rate, burst_size=self.meter_burst)]
+        # 先删除残留的同号限速表再添加, 避免重连时ADD失败
+        self.send_msg(datapath, parser.OFPMeterMod(datapath, ofproto.OFPMC_DELETE, flags,
+                                                   PACKET_IN_METER_ID))
+        self.send_msg(datapath, parser.OFPMeterMod(datapath, ofproto.OFPMC_ADD, flags,
+                                                   PACKET_IN_METER_ID, bands))
+        self.meters.add(datapath.id)
+        self.logger.info(f"dpid={datapath.id} packet-in限速表: {self.meter_rate}包/秒")
+        return True
+
+    def meter_id(self, dpid):
+        """dpid已安装限速表时返回其编号, 否则返回None"""
+        return PACKET_IN_METER_ID if dpid in self.meters else None
+
+    def admit(self, dpid, data):
+        """packet-in准入判断, 只读取原始帧的源MAC和以太网类型字节(无需解析)"""
+        if data[12:14] == _LLDP_ETHERTYPE:
+            return True
+        src = data[6:12]
+        stats = self.stats.get(dpid)
+        if stats is None:
+            stats = self.stats[dpid] = {'admitted': 0, 'dropped': 0, 'sampled': 0,
+                                        'dpid_limited': 0, 'src_limited': 0}
+        now = self.clock()
+
+        limited = None
+        if self.dpid_rate:
+            bucket = self.dpid_buckets.get(dpid)
+            if bucket is None:
+                bucket = self.dpid_buckets[dpid] = TokenBucket(
+                    self.dpid_rate, self.dpid_rate * self.burst_seconds, now)
+            if not bucket.consume(now):
+                limited = 'dpid_limited'
+        if limited is None and self.src_rate:
+            key = (dpid, src)
+            bucket = self.src_buckets.get(key)
+            if bucket is None:
+                if len(self.src_buckets) >= self.max_sources:
+                    self._prune(now)
+                bucket = self.src_buckets[key] = TokenBucket(
+                    self.src_rate, self.src_rate * self.burst_seconds, now)
+            if not bucket.consume(now):
+                limited = 'src_limited'
+
+        if limited is None:
+            stats['admitted'] += 1
+            return True
+        stats[limited] += 1
+        if self.sample_every and stats[limited] % self.sample_every == 0:
+            stats['sampled'] += 1
+            return True
+        stats['dropped'] += 1
+        return False
+
+    def _prune(self, now):
+        """源表满时删除已补满令牌(空闲)的源, 仍然满时全部清空"""
+        idle = [key for key, bucket in self.src_buckets.items()
+                if bucket.tokens + (now - bucket.last) * bucket.rate >= bucket.burst]
+        for key in idle:
+            del self.src_buckets[key]
+        if len(self.src_buckets) >= self.max_sources:
+            self.src_buckets.clear()
+
+    def remove(self, dpid):
+        """datapath断开时清理其令牌桶和限速表状态"""
+        self.dpid_buckets.pop(dpid, None)
+        self.meters.discard(dpid)
+        for key in [key for key in self.src_buckets if key[0] == dpid]:
+            del self.src_buckets[key]
+
+    def get_stats(self):
+        """返回每个dpid的准入/丢弃/采样计数"""
+        return {dpid: dict(stats, meter=dpid in self.meters)
+                for dpid, stats in self.stats.items()}
@@ -0,0 +1,158 @@
+import struct
+import time
+from collections import deque, namedtuple
+
+from ryu.lib import hub
+
+# 轨迹文件: 文件头 + 逐条追加的记录(定长记录头 + 帧数据), 整数按小端存放
+MAGIC = b'RYUPKTIN'
+VERSION = 1
+FILE_HEADER = struct.Struct('<8sH6x')    # 魔数, 版本
+RECORD = struct.Struct('<dQIIBBHH')      # 时间戳(Unix秒), dpid, 入端口, buffer_id, 表号, 原因,
+                                         # 原始帧长, 记录的帧长
+
+TraceRecord = namedtuple('TraceRecord', ['ts', 'dpid', 'in_port', 'buffer_id', 'table_id',
+                                         'reason', 'total_len', 'data'])
+
+
+class TraceRecorder(object):
+    """packet-in轨迹记录器
+
+    record()在处理packet-in之前调用, 只把消息字段的引用放入有界环形缓冲区, 不做
+    序列化和I/O; 后台循环批量打包成二进制记录追加到文件。缓冲区满时丢弃最旧的记录,
+    文件达到max_bytes后停止写入, 两种情况都计数。snaplen大于0时每个帧只保留前
+    snaplen字节(原始帧长仍然记录)。
+    """
+
+    def __init__(self, logger, path, capacity=65536, snaplen=0, max_bytes=0, interval=0.1,
+                 clock=time.time):
+        self.logger = logger
+        self.path = path
+        self.snaplen = snaplen
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.clock = clock
+        self.buffer = deque(maxlen=capacity)
+        self.stats = {'recorded': 0, 'overflow': 0, 'written': 0, 'dropped': 0, 'bytes': 0}
+        self._sink = open(path, 'ab')
+        self.size = self._sink.tell()
+        if self.size:
+            # 追加到已有文件前确认格式一致
+            with open(path, 'rb') as f:
+                header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header) != (MAGIC, VERSION):
+                self._sink.close()
+                raise ValueError(f"{path}不是本版本的packet-in轨迹文件, 不能追加")
+        else:
+            self._sink.write(FILE_HEADER.pack(MAGIC, VERSION))
+            self.size = FILE_HEADER.size
+
+    def record(self, msg):
+        buffer = self.buffer
+        if len(buffer) == buffer.maxlen:
+            self.stats['overflow'] += 1
+        buffer.append((self.clock(), msg.datapath.id, msg.match['in_port'], msg.buffer_id,
+                       msg.table_id, msg.reason, msg.total_len, msg.data))
+        self.stats['recorded'] += 1
+
+    def run(self):
+        """后台写出循环, 由应用通过hub.spawn启动"""
+        while True:
+            hub.sleep(self.interval)
+            self.drain()
+
+    def drain(self):
+        """取出缓冲区中的全部记录并追加到文件, 返回写出的记录数"""
+        buffer = self.buffer
+        count = len(buffer)
+        if not count or self._sink is None:
+            return 0
+        parts = []
+        size = 0
+        written = 0
+        snaplen = self.snaplen
+        for _ in range(count):
+            ts, dpid, in_port, buffer_id, table_id, reason, total_len, data = buffer.popleft()
+            if snaplen:
+                data = data[:snaplen]
+            length = RECORD.size + len(data)
+            if self.max_bytes and self.size + size + length > self.max_bytes:
+                self.stats['dropped'] += 1
+                continue
+            parts.append(RECORD.pack(ts, dpid, in_port, buffer_id, table_id, reason,
+                                     total_len, len(data)))
+            parts.append(data)
+            size += length
+            written += 1
+        if parts:
+            self._sink.write(b''.join(parts))
+            self._sink.flush()
+            self.size += size
+        self.stats['written'] += written
+        self.stats['bytes'] = self.size
+        return written
+
+    def close(self):
+        self.drain()
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def get_stats(self):
+        return dict(self.stats, buffered=len(self.buffer))
+
+
+def read_trace(path):
+    """逐条读出轨迹记录; 最后一条记录不完整(写入途中进程退出)时忽略"""
+    with open(path, 'rb') as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise ValueError(f"轨迹文件过短: {path}")
+        magic, version = FILE_HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是packet-in轨迹文件或版本不支持: {magic!r} v{version}")
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            ts, dpid, in_port, buffer_id, table_id, reason, total_len, caplen = RECORD.unpack(head)
+            data = f.read(caplen)
+            if len(data) < caplen:
+                return
+            yield TraceRecord(ts, dpid, in_port, buffer_id, table_id, reason, total_len, data)
+
+
+class TraceReplayer(object):
+    """按记录的时间间隔回放轨迹
+
+    speed为1时按原速, N时按N倍速, 0时不等待尽快回放。按计划时间调度而不是逐条
+    休眠间隔, 处理慢于计划时不累积误差, 最大落后时间记为max_lag。
+    """
+
+    def __init__(self, speed=1.0, clock=time.monotonic, sleep=time.sleep):
+        self.speed = speed
+        self.clock = clock
+        self.sleep = sleep
+
+    def run(self, records, deliver, limit=0):
+        """依次调用deliver(record), 返回回放统计"""
+        start = self.clock()
+        first = last = None
+        count = 0
+        max_lag = 0.0
+        for record in records:
+            if first is None:
+                first = record.ts
+            if self.speed:
+                delay = (record.ts - first) / self.speed - (self.clock() - start)
+                if delay > 0:
+                    self.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            deliver(record)
+            last = record.ts
+            count += 1
+            if limit and count >= limit:
+                break
+        return {'packets': count, 'elapsed': self.clock() - start,
+                'trace_seconds': last - first if count else 0.0, 'max_lag': max_lag}
@@ -1,46 +1,80 @@
 #!/bin/bash
 
 # 定义全局变量
-RYU_PID=0
+RYU_PIDS=()
+RYU_LOGS=()
 
 # 清理可能存在的旧进程
 echo "清理旧进程..."
 pkill -f ryu-manager || true
 pkill -f datacenter_topo.py || true
+pkill -f fabric_topo.py || true
 mn -c > /dev/null 2>&1 || true
 
 # 确保OVS服务正在运行
 echo "启动Open vSwitch服务..."
 service openvswitch-switch start
 
+# 主动模式: 设置DC_TOPOLOGY(如 DC_TOPOLOGY=datacenter_topology.json ./run_datacenter_network.sh),
+# 拓扑脚本在交换机连接前导出拓扑描述, 控制器据此预先下发全部转发表项
+if [ -n "$DC_TOPOLOGY" ]; then
+    export DC_TOPOLOGY
+    echo "主动模式: 拓扑描述文件 $DC_TOPOLOGY"
+fi
+
+# 分片部署: 设置SHARD_COUNT=N(如 SHARD_COUNT=4 ./run_datacenter_network.sh)时启动N个控制器worker,
+# 第i个worker监听OpenFlow端口6633+i、REST端口8080+i, 日志写入datacenter_ryu_i.log;
+# 交换机同时连接全部worker, 由各worker按哈希分担交换机并在worker故障时接管
+SHARD_COUNT=${SHARD_COUNT:-1}
+CONTROLLER_PORTS=""
+
 # 启动Ryu控制器
 echo "启动简化版数据中心控制器..."
-ryu-manager --verbose datacenter_controller.py > datacenter_ryu.log 2>&1 &
-RYU_PID=$!
+for ((i = 0; i < SHARD_COUNT; i++)); do
+    if [ "$SHARD_COUNT" -gt 1 ]; then
+        LOG_FILE="datacenter_ryu_$i.log"
+    else
+        LOG_FILE="datacenter_ryu.log"
+    fi
+    SHARD_INDEX=$i SHARD_COUNT=$SHARD_COUNT ryu-manager --verbose \
+        --ofp-tcp-listen-port $((6633 + i)) --wsapi-port $((8080 + i)) \
+        datacenter_controller.py > "$LOG_FILE" 2>&1 &
+    RYU_PIDS+=($!)
+    RYU_LOGS+=("$LOG_FILE")
+    CONTROLLER_PORTS="${CONTROLLER_PORTS:+$CONTROLLER_PORTS,}$((6633 + i))"
+done
 
 # 检查控制器是否成功启动
 echo "等待控制器启动..."
 sleep 6  # 增加等待时间，确保控制器完全启动
-if ! ps -p $RYU_PID > /dev/null; then
-    echo "控制器启动失败!"
-    cat datacenter_ryu.log  # 确保日志文件名称一致
-    exit 1
-fi
+for ((i = 0; i < SHARD_COUNT; i++)); do
+    if ! ps -p ${RYU_PIDS[$i]} > /dev/null; then
+        echo "控制器启动失败!"
+        cat "${RYU_LOGS[$i]}"
+        kill "${RYU_PIDS[@]}" 2>/dev/null || true
+        exit 1
+    fi
+done
 echo "控制器已启动!"
 
 # 设置控制器IP为本地IP
 export CONTROLLER_IP="127.0.0.1"
+export CONTROLLER_PORTS
 
 # 使用stty配置终端以便交互
 stty sane
 export TERM=xterm
 
-# 启动Mininet拓扑
+# 启动Mininet拓扑; 设置DC_FABRIC(如 DC_FABRIC="--fat-tree 8")时用fabric_topo.py生成的拓扑
 echo "启动数据中心拓扑..."
-python3 datacenter_topo.py
+if [ -n "$DC_FABRIC" ]; then
+    python3 fabric_topo.py $DC_FABRIC
+else
+    python3 datacenter_topo.py
+fi
 
 # 清理
 echo "停止控制器..."
-kill $RYU_PID || true
-wait $RYU_PID 2>/dev/null || true
+kill "${RYU_PIDS[@]}" || true
+wait "${RYU_PIDS[@]}" 2>/dev/null || true
 echo "环境已停止"
\ No newline at end of file
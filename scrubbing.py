@@ -0,0 +1,301 @@
+import ipaddress
+from collections import deque
+
+from ryu.lib import hub
+from ryu.lib.packet import ether_types
+from ryu.lib.packet import in_proto
+from ryu.lib.packet import icmpv6
+
+from nd_proxy import build_neighbor_solicit
+
+# 清洗SELECT组的组号, 避开ECMP组(组号为目的dpid)和洪泛组
+SCRUB_GROUP_ID = 0xfffff001
+# 引流表项优先级: 高于L2/L3转发和流量工程引导流表, 低于邻居请求上送
+STEER_PRIORITY = 18
+HEALTH_TRAP_PRIORITY = 20
+
+
+def shortest_path(links, src, dst):
+    """沿LLDP发现的链路求src到dst的最短路径, 返回[(dpid, 出端口)], 不可达时返回None"""
+    if src == dst:
+        return []
+    adjacency = {}
+    for (dpid, port), peer in links.items():
+        adjacency.setdefault(dpid, []).append((peer[0], port))
+    parent = {src: None}
+    queue = deque([src])
+    while queue:
+        node = queue.popleft()
+        for neighbor, port in sorted(adjacency.get(node, ())):
+            if neighbor in parent:
+                continue
+            parent[neighbor] = (node, port)
+            if neighbor == dst:
+                path = []
+                while parent[neighbor] is not None:
+                    node, port = parent[neighbor]
+                    path.append((node, port))
+                    neighbor = node
+                return path[::-1]
+            queue.append(neighbor)
+    return None
+
+
+class Scrubber(object):
+    """一台清洗服务器及其健康状态"""
+
+    __slots__ = ('mac', 'ip', 'missed', 'location')
+
+    def __init__(self, mac, ip):
+        self.mac = mac
+        self.ip = ip
+        self.missed = 0
+        self.location = None    # (dpid, 端口)
+
+
+class ScrubbingSteering(object):
+    """把可疑外部前缀的流量在边缘路由器上引到清洗集群
+
+    边缘路由器上从外部端口进入、源地址属于可疑前缀的IPv6流量指向SELECT组,
+    每个健康的清洗服务器一个桶(改写目的MAC并送往通向该服务器的端口); 交换机按
+    流的报头哈希选桶, 同一条流始终经过同一台清洗服务器。沿途交换机按清洗服务器
+    MAC转发。清洗服务器把干净流量按路由发回网关(路由器MAC), 清洗服务器接入端口
+    上的回程流表把它送回边缘路由器, 由原有的L3转发送往原目的地址; 回程流量不从
+    外部端口进入, 因此不会被再次引流。
+
+    控制器周期性向每台清洗服务器发送单播邻居请求, 连续max_missed次没有应答或
+    接入端口故障时从组中移除对应的桶; 没有健康的清洗服务器时删除引流表项, 流量
+    按原路径转发(失效开放)。
+    """
+
+    def __init__(self, logger, send_msg, datapaths, links, locate, edge_dpid, external_dpid,
+                 router_mac, gateway_ip, prefixes, scrubbers, interval=2.0, max_missed=3):
+        self.logger = logger
+        self.send_msg = send_msg        # send_msg(datapath, msg)
+        self.datapaths = datapaths      # dpid -> datapath
+        self.links = links              # links() -> {(dpid, 端口): (对端dpid, 对端端口, ...)}
+        self.locate = locate            # locate(mac) -> (dpid, 端口)或None
+        self.edge_dpid = edge_dpid
+        self.external_dpid = external_dpid
+        self.router_mac = router_mac
+        self.gateway_ip = gateway_ip
+        self.prefixes = set()
+        self.static = set()             # 配置的前缀, unsteer不会撤销
+        self.scrubbers = [Scrubber(mac, ip) for mac, ip in scrubbers]
+        self.interval = interval
+        self.max_missed = max_missed
+        self.installed = None           # 已下发的(健康清洗服务器MAC元组, 前缀集合, 路径集合)
+        self.installed_paths = set()    # 已下发的(MAC, 接入位置, 去程, 回程)
+        self.steered_flows = set()      # 已下发的引流匹配 (入端口, 前缀)
+        self.traps = set()              # 已下发健康应答上送流表的(dpid, 端口)
+        for prefix in prefixes:
+            self.steer(prefix)
+        self.static = set(self.prefixes)
+
+    def steer(self, prefix):
+        """开始清洗来自prefix的外部流量"""
+        self.prefixes.add(str(ipaddress.IPv6Network(prefix, strict=False)))
+
+    def unsteer(self, prefix):
+        """停止清洗prefix(配置的前缀除外)"""
+        prefix = str(ipaddress.IPv6Network(prefix, strict=False))
+        if prefix not in self.static:
+            self.prefixes.discard(prefix)
+
+    def run(self):
+        """后台健康检查与组更新循环, 由应用通过hub.spawn启动"""
+        while True:
+            self.probe()
+            hub.sleep(self.interval)
+            self.update()
+
+    def healthy(self):
+        return [s for s in self.scrubbers
+                if s.location is not None and s.missed < self.max_missed]
+
+    def probe(self):
+        """向每台已定位的清洗服务器发送单播邻居请求"""
+        for scrubber in self.scrubbers:
+            location = self.locate(scrubber.mac)
+            if location != scrubber.location:
+                scrubber.location = location
+                scrubber.missed = 0
+            if location is None:
+                continue
+            datapath = self.datapaths.get(location[0])
+            if datapath is None:
+                continue
+            ofproto = datapath.ofproto
+            parser = datapath.ofproto_parser
+            if location not in self.traps:
+                self._install_health_trap(datapath, location[1])
+            data = build_neighbor_solicit(self.gateway_ip, self.router_mac,
+                                          scrubber.ip, scrubber.mac)
+            self.send_msg(datapath, parser.OFPPacketOut(
+                datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+                in_port=ofproto.OFPP_CONTROLLER,
+                actions=[parser.OFPActionOutput(location[1])], data=data))
+            scrubber.missed += 1
+
+    def _install_health_trap(self, datapath, port):
+        """清洗服务器发给路由器的邻居通告上送控制器, 不走回程流表"""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(in_port=port, eth_dst=self.router_mac,
+                                eth_type=ether_types.ETH_TYPE_IPV6,
+                                ip_proto=in_proto.IPPROTO_ICMPV6,
+                                icmpv6_type=icmpv6.ND_NEIGHBOR_ADVERT)
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)]
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        self.send_msg(datapath, parser.OFPFlowMod(datapath=datapath, priority=HEALTH_TRAP_PRIORITY,
+                                                  match=match, instructions=inst))
+        self.traps.add((datapath.id, port))
+
+    def health_reply(self, src_ip):
+        """处理发给路由器的邻居通告, 来自清洗服务器时记为健康并返回True"""
+        for scrubber in self.scrubbers:
+            if scrubber.ip == src_ip:
+                scrubber.missed = 0
+                return True
+        return False
+
+    def returned(self, src_mac, src_ip):
+        """帧是否是清洗服务器转发回来的干净流量(源MAC是清洗服务器而源地址不是)"""
+        for scrubber in self.scrubbers:
+            if scrubber.mac == src_mac:
+                return scrubber.ip != src_ip
+        return False
+
+    def port_down(self, dpid, port):
+        """清洗服务器接入端口故障时立即视为不健康"""
+        for scrubber in self.scrubbers:
+            if scrubber.location == (dpid, port):
+                scrubber.missed = self.max_missed
+        self.traps.discard((dpid, port))
+        self.update()
+
+    def switch_enter(self, dpid):
+        """交换机(重新)连接时流表状态未知, 经过它的路径下次update时重新下发"""
+        self._forget(dpid)
+
+    def switch_leave(self, dpid):
+        self.traps = {trap for trap in self.traps if trap[0] != dpid}
+        self._forget(dpid)
+
+    def _forget(self, dpid):
+        if dpid == self.edge_dpid:
+            self.installed = None
+            self.steered_flows.clear()
+            self.installed_paths.clear()
+            return
+        self.installed_paths = {entry for entry in self.installed_paths
+                                if dpid not in self._path_dpids(entry)}
+
+    @staticmethod
+    def _path_dpids(entry):
+        _, location, path, back = entry
+        return {dpid for dpid, _ in path + back} | {location[0]}
+
+    def update(self):
+        """健康集合、可疑前缀或路径变化时重新下发路径、SELECT组和引流表项"""
+        edge = self.datapaths.get(self.edge_dpid)
+        if edge is None:
+            return
+        links = self.links()
+        buckets = []
+        members = []
+        paths = set()
+        fresh = []                      # 尚未下发(或经过的交换机重连过)的路径
+        for scrubber in self.healthy():
+            path = shortest_path(links, self.edge_dpid, scrubber.location[0])
+            back = shortest_path(links, scrubber.location[0], self.edge_dpid)
+            if not path or back is None:
+                continue
+            members.append(scrubber.mac)
+            buckets.append((scrubber, path, back))
+            entry = (scrubber.mac, scrubber.location, tuple(path), tuple(back))
+            paths.add(entry)
+            if entry not in self.installed_paths:
+                fresh.append((scrubber, path, back))
+
+        state = (tuple(members), frozenset(self.prefixes), frozenset(paths))
+        if state == self.installed and not fresh:
+            return
+        for scrubber, path, back in fresh:
+            self._install_paths(scrubber, path, back)
+        self._install_group(edge, buckets)
+        self._install_steering(edge, links, bool(buckets))
+        if self.installed is None or self.installed[0] != state[0]:
+            self.logger.info(f"清洗集群: {len(members)}/{len(self.scrubbers)}台健康 {list(members)}")
+        self.installed = state
+        self.installed_paths = paths
+
+    def _add_flow(self, datapath, match, actions, priority=STEER_PRIORITY):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        self.send_msg(datapath, parser.OFPFlowMod(datapath=datapath, priority=priority,
+                                                  match=parser.OFPMatch(**match),
+                                                  instructions=inst))
+
+    def _install_paths(self, scrubber, path, back):
+        """去程: 沿途按清洗服务器MAC转发; 回程: 发往路由器MAC的干净流量送回边缘路由器"""
+        scrub_dpid, scrub_port = scrubber.location
+        for dpid, port in path[1:] + [(scrub_dpid, scrub_port)]:
+            datapath = self.datapaths.get(dpid)
+            if datapath is not None:
+                self._add_flow(datapath, {'eth_dst': scrubber.mac},
+                               [datapath.ofproto_parser.OFPActionOutput(port)])
+        for i, (dpid, port) in enumerate(back):
+            datapath = self.datapaths.get(dpid)
+            if datapath is None:
+                continue
+            match = {'eth_dst': self.router_mac}
+            if i == 0:
+                match['in_port'] = scrub_port
+            self._add_flow(datapath, match, [datapath.ofproto_parser.OFPActionOutput(port)])
+
+    def _install_group(self, edge, buckets):
+        ofproto = edge.ofproto
+        parser = edge.ofproto_parser
+        of_buckets = [parser.OFPBucket(
+            weight=1, watch_port=path[0][1], watch_group=ofproto.OFPG_ANY,
+            actions=[parser.OFPActionSetField(eth_dst=scrubber.mac),
+                     parser.OFPActionOutput(path[0][1])])
+            for scrubber, path, _ in buckets]
+        if self.installed is None:
+            self.send_msg(edge, parser.OFPGroupMod(
+                edge, ofproto.OFPGC_DELETE, ofproto.OFPGT_SELECT, SCRUB_GROUP_ID))
+            self.send_msg(edge, parser.OFPGroupMod(
+                edge, ofproto.OFPGC_ADD, ofproto.OFPGT_SELECT, SCRUB_GROUP_ID, of_buckets))
+        else:
+            self.send_msg(edge, parser.OFPGroupMod(
+                edge, ofproto.OFPGC_MODIFY, ofproto.OFPGT_SELECT, SCRUB_GROUP_ID, of_buckets))
+
+    def _install_steering(self, edge, links, active):
+        """在边缘路由器的外部端口上按源前缀引流; 没有健康清洗服务器时删除(失效开放)"""
+        ofproto = edge.ofproto
+        parser = edge.ofproto_parser
+        ingress = [port for (dpid, port), peer in links.items()
+                   if dpid == self.edge_dpid and peer[0] == self.external_dpid]
+        wanted = set()
+        if active:
+            wanted = {(port, prefix) for port in ingress for prefix in self.prefixes}
+        for port, prefix in self.steered_flows - wanted:
+            self.send_msg(edge, parser.OFPFlowMod(
+                datapath=edge, command=ofproto.OFPFC_DELETE_STRICT, priority=STEER_PRIORITY,
+                out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+                match=self._steer_match(parser, port, prefix)))
+        for port, prefix in wanted - self.steered_flows:
+            inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                                 [parser.OFPActionGroup(SCRUB_GROUP_ID)])]
+            self.send_msg(edge, parser.OFPFlowMod(
+                datapath=edge, priority=STEER_PRIORITY,
+                match=self._steer_match(parser, port, prefix), instructions=inst))
+        self.steered_flows = wanted
+
+    @staticmethod
+    def _steer_match(parser, port, prefix):
+        network = ipaddress.IPv6Network(prefix)
+        return parser.OFPMatch(in_port=port, eth_type=ether_types.ETH_TYPE_IPV6,
+                               ipv6_src=(str(network.network_address), str(network.netmask)))
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import socket
+import time
+
+from ryu.lib import hub
+
+# 每个总线数据报最多携带的状态条目数, 保证数据报远小于UDP上限
+_MAX_ITEMS = 256
+_M64 = (1 << 64) - 1
+
+
+def rendezvous_order(dpid, count):
+    """交换机对worker 0..count-1的rendezvous哈希偏好顺序(得分从高到低)"""
+    return sorted(range(count), key=lambda member: hashlib.sha1(b'%d/%d' % (member, dpid)).digest(),
+                  reverse=True)
+
+
+def assign_switches(connected, orders):
+    """有界负载的rendezvous哈希分配, 返回 {dpid: worker}
+
+    connected为 {worker: 已连接的dpid集合}, orders为 {dpid: 偏好顺序}。每台交换机按偏好
+    顺序选第一个连接了它且负责的交换机数未达上限(平均值向上取整)的worker, 各worker负责
+    的交换机数最多相差1; 成员变化时大部分交换机保持原归属。
+    """
+    dpids = sorted(set().union(*connected.values()))
+    limit = -(-len(dpids) // len(connected))
+    load = dict.fromkeys(connected, 0)
+    owners = {}
+    for dpid in dpids:
+        candidates = [member for member in orders[dpid]
+                      if member in connected and dpid in connected[member]]
+        owner = next((member for member in candidates if load[member] < limit), candidates[0])
+        owners[dpid] = owner
+        load[owner] += 1
+    return owners
+
+
+class ShardCluster(object):
+    """多进程分片部署中的一个worker
+
+    每个worker是独立的ryu-manager进程, 交换机同时连接全部worker。交换机在已连接它的
+    存活worker中按有界负载的rendezvous哈希分配(各worker看到相同的连接信息时结果一致),
+    负责的worker发送OFPRoleRequest声明MASTER, 其余
+    worker声明SLAVE; 交换机只向MASTER上送packet-in, 各worker分担packet-in处理。
+    非MASTER的worker不向交换机发送修改状态的消息(may_send作为批量发送队列的过滤器)。
+
+    worker之间经本机UDP消息总线(127.0.0.1上bus_port+序号)每interval秒批量发布共享
+    状态(announce/publish), 并至少每heartbeat秒发送一次带已连接dpid列表的心跳; 超过
+    dead_after秒没有消息的worker视为故障, 它负责的交换机由其余worker声明MASTER接管,
+    恢复后再交还。
+
+    roles只记录交换机在OFPRoleReply中确认的角色。成员变化后各worker重新声明负责的
+    交换机的MASTER角色(加入中的worker可能在同步连接信息前短暂声明过MASTER, 交换机会把
+    原MASTER降为SLAVE); 修改状态的消息被交换机以OFPBRC_IS_SLAVE拒绝时同样重新声明。
+    generation_id取已见最大值(含应答中交换机报告的值)之后的值, 被判过期时先用
+    NOCHANGE请求查询交换机当前的generation_id再重发。
+    """
+
+    def __init__(self, logger, send_msg, index, count, bus_port=6700, interval=0.01,
+                 heartbeat=0.5, dead_after=2.0, on_master=None, clock=time.monotonic):
+        self.logger = logger
+        self.send_msg = send_msg      # send_msg(datapath, msg)
+        self.index = index
+        self.count = count
+        self.bus_port = bus_port
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.dead_after = dead_after
+        self.on_master = on_master    # on_master(datapath): 接管交换机后调用
+        self.clock = clock
+        self.members = frozenset([index])
+        self.last_seen = {}           # 其他worker -> 最后收到消息的时间
+        self.peer_dpids = {}          # 其他worker -> 已连接的dpid集合
+        self.owners = None            # dpid -> 负责的worker(成员或连接变化时置空, 用到时重算)
+        self.orders = {}              # dpid -> rendezvous偏好顺序
+        self.datapaths = {}           # dpid -> datapath(本worker已连接的全部交换机)
+        self.wanted = {}              # dpid -> 最近请求的角色('master'/'slave')
+        self.roles = {}               # dpid -> 交换机应答确认的角色('master'/'slave'/'equal')
+        self.generation = 0
+        self.retry = set()            # generation_id过期, 等待NOCHANGE应答后重发请求的dpid
+        self.handlers = {}            # 状态类型 -> handler(键, 值)
+        self.announced = {}           # (类型, 键) -> (值, 下次必须重新发布的时间)
+        self.outbox = []              # [(类型, 键, 值)]
+        self.last_sent = 0.0
+        self.next_prune = 0.0
+        self.dpids_changed = False
+        self.stats = {'role_requests': 0, 'role_reasserts': 0, 'takeovers': 0, 'handovers': 0,
+                      'foreign_packet_ins': 0, 'bus_sent': 0, 'bus_received': 0,
+                      'bus_errors': 0}
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # 突发发布时减少接收端丢包; 丢失的状态在下次重新发布(refresh)时补上
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self.sock.bind(('127.0.0.1', bus_port + index))
+
+    def run(self):
+        """后台发布和成员检查循环, 由应用通过hub.spawn启动"""
+        while True:
+            hub.sleep(self.interval)
+            self.flush()
+            self.check_members()
+
+    def receive_loop(self):
+        """总线接收循环, 由应用通过hub.spawn启动"""
+        while True:
+            self.deliver(self.sock.recv(65535))
+
+    def poll(self):
+        """非阻塞地处理已到达的总线消息(没有接收循环时使用, 如离线基准)"""
+        while True:
+            try:
+                data = self.sock.recv(65535, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return
+            self.deliver(data)
+
+    def owner(self, dpid):
+        """负责dpid的worker; 没有worker连接该交换机时返回None"""
+        if self.owners is None:
+            connected = {member: self.peer_dpids.get(member, frozenset())
+                         for member in self.members if member != self.index}
+            connected[self.index] = frozenset(self.datapaths)
+            for new in set().union(*connected.values()) - self.orders.keys():
+                self.orders[new] = rendezvous_order(new, self.count)
+            self.owners = assign_switches(connected, self.orders)
+        return self.owners.get(dpid)
+
+    def is_master(self, dpid):
+        return self.owner(dpid) == self.index
+
+    def admit(self, dpid):
+        """packet-in是否由本worker处理: 角色生效前(EQUAL)所有worker都会收到packet-in"""
+        if self.is_master(dpid):
+            return True
+        self.stats['foreign_packet_ins'] += 1
+        return False
+
+    def may_send(self, datapath, msg):
+        """批量发送队列的过滤器: 角色请求和只读请求总是发送, 修改交换机状态的消息只由MASTER发送"""
+        ofproto = datapath.ofproto
+        return (msg.cls_msg_type in (ofproto.OFPT_ROLE_REQUEST, ofproto.OFPT_MULTIPART_REQUEST,
+                                     ofproto.OFPT_BARRIER_REQUEST, ofproto.OFPT_ECHO_REQUEST)
+                or self.is_master(datapath.id))
+
+    def switch_ready(self, datapath):
+        """交换机连接(SwitchFeatures): 在发送其他消息前声明角色"""
+        dpid = datapath.id
+        self.datapaths[dpid] = datapath
+        self.owners = None
+        self.dpids_changed = True
+        self._request_role(datapath)
+        # 交换机数变化会改变负载上限, 其他交换机的归属可能随之调整
+        self._rebalance()
+
+    def switch_leave(self, dpid):
+        if self.datapaths.pop(dpid, None) is not None:
+            self.wanted.pop(dpid, None)
+            self.roles.pop(dpid, None)
+            self.retry.discard(dpid)
+            self.owners = None
+            self.dpids_changed = True
+            self._rebalance()
+
+    def _request_role(self, datapath, role=None):
+        ofproto = datapath.ofproto
+        if role is None:
+            master = self.is_master(datapath.id)
+            role = ofproto.OFPCR_ROLE_MASTER if master else ofproto.OFPCR_ROLE_SLAVE
+            self.wanted[datapath.id] = 'master' if master else 'slave'
+        # 交换机拒绝generation_id(按64位回绕比较)小于已见最大值的MASTER/SLAVE请求; 各worker
+        # 在同一主机上, 用毫秒时间戳保证较晚的决定带较大的generation_id
+        self.generation = max(self.generation + 1, int(time.time() * 1000)) & _M64
+        self.send_msg(datapath, datapath.ofproto_parser.OFPRoleRequest(
+            datapath, role, self.generation))
+        self.stats['role_requests'] += 1
+
+    def role_reply(self, msg):
+        """记录交换机确认的角色; 过期重试的查询应答到达后用更大的generation_id重发"""
+        datapath = msg.datapath
+        ofproto = datapath.ofproto
+        dpid = datapath.id
+        if dpid not in self.datapaths:
+            return
+        if (msg.generation_id - self.generation) & _M64 < 1 << 63:
+            self.generation = msg.generation_id
+        self.roles[dpid] = {ofproto.OFPCR_ROLE_MASTER: 'master',
+                            ofproto.OFPCR_ROLE_SLAVE: 'slave'}.get(msg.role, 'equal')
+        self.logger.debug(f"dpid={dpid} 角色应答 role={msg.role} "
+                          f"generation_id={msg.generation_id}")
+        if dpid in self.retry:
+            self.retry.discard(dpid)
+            self._request_role(datapath)
+
+    def error(self, msg):
+        """处理角色请求失败, 返回是否为角色请求错误
+
+        generation_id过期时查询交换机当前值后重发; 负责的交换机以IS_SLAVE拒绝修改消息时
+        说明已被其他控制器降级, 重新声明MASTER(不算作已处理, 其他模块照常处理该错误)。
+        """
+        datapath = msg.datapath
+        ofproto = datapath.ofproto
+        dpid = datapath.id
+        if (msg.type == ofproto.OFPET_BAD_REQUEST and msg.code == ofproto.OFPBRC_IS_SLAVE
+                and dpid in self.datapaths):
+            if self.roles.get(dpid) != 'slave' and self.is_master(dpid):
+                # 同一批被拒绝的消息只触发一次重新声明
+                self.roles[dpid] = 'slave'
+                self.stats['role_reasserts'] += 1
+                self.logger.warning(f"dpid={dpid} 已被降为SLAVE, 重新声明MASTER")
+                self._request_role(datapath)
+                if self.on_master is not None:
+                    self.on_master(datapath)
+            return False
+        if msg.type != ofproto.OFPET_ROLE_REQUEST_FAILED:
+            return False
+        if msg.code == ofproto.OFPRRFC_STALE and dpid in self.datapaths:
+            self.retry.add(dpid)
+            self._request_role(datapath, ofproto.OFPCR_ROLE_NOCHANGE)
+        else:
+            self.logger.warning(f"dpid={dpid} 角色请求失败 code={msg.code}")
+        return True
+
+    def subscribe(self, kind, handler):
+        """收到其他worker发布的kind类型状态时调用handler(键, 值)"""
+        self.handlers[kind] = handler
+
+    def announce(self, kind, key, value, refresh):
+        """发布共享状态; 同一键的值未变且距上次发布不足refresh秒时不重复发布"""
+        now = self.clock()
+        last = self.announced.get((kind, key))
+        if last is not None and last[0] == value and now < last[1]:
+            return
+        self.announced[(kind, key)] = (value, now + refresh)
+        self.outbox.append((kind, key, value))
+
+    def publish(self, kind, key, value):
+        """发布一次性消息(不去重)"""
+        self.outbox.append((kind, key, value))
+
+    def flush(self):
+        """把待发布的状态发给其他worker, 没有状态时按心跳间隔只发dpid列表"""
+        now = self.clock()
+        if not self.outbox and not self.dpids_changed and now - self.last_sent < self.heartbeat:
+            return
+        items, self.outbox = self.outbox, []
+        dpids = sorted(self.datapaths)
+        for start in range(0, max(len(items), 1), _MAX_ITEMS):
+            data = json.dumps({'from': self.index, 'dpids': dpids,
+                               'items': items[start:start + _MAX_ITEMS]}).encode()
+            for peer in range(self.count):
+                if peer == self.index:
+                    continue
+                try:
+                    self.sock.sendto(data, ('127.0.0.1', self.bus_port + peer))
+                    self.stats['bus_sent'] += 1
+                except OSError:
+                    self.stats['bus_errors'] += 1
+        self.last_sent = now
+        self.dpids_changed = False
+        if now >= self.next_prune:
+            # 丢弃已到重新发布时间的去重记录, 下次发布时照常发送
+            self.announced = {key: last for key, last in self.announced.items() if now < last[1]}
+            self.next_prune = now + self.heartbeat
+
+    def deliver(self, data):
+        """处理一个总线数据报"""
+        try:
+            message = json.loads(data)
+            sender = message['from']
+            dpids = frozenset(message['dpids'])
+            items = message['items']
+        except (ValueError, KeyError, TypeError):
+            self.stats['bus_errors'] += 1
+            return
+        if sender == self.index or not 0 <= sender < self.count:
+            return
+        self.stats['bus_received'] += 1
+        self.last_seen[sender] = self.clock()
+        if self.peer_dpids.get(sender) != dpids:
+            self.peer_dpids[sender] = dpids
+            self.owners = None
+            if sender in self.members:
+                self._rebalance()
+        if sender not in self.members:
+            self.check_members()
+        for kind, key, value in items:
+            handler = self.handlers.get(kind)
+            if handler is not None:
+                handler(key, value)
+
+    def check_members(self):
+        """根据心跳更新存活的worker, 成员变化时重新分配交换机"""
+        now = self.clock()
+        members = frozenset([self.index] + [member for member, seen in self.last_seen.items()
+                                            if now - seen < self.dead_after])
+        if members == self.members:
+            return
+        for member in self.members - members:
+            self.logger.warning(f"分片worker {member} 超过{self.dead_after}秒无心跳, 接管其交换机")
+            self.peer_dpids.pop(member, None)
+        for member in members - self.members:
+            self.logger.info(f"分片worker {member} 加入")
+        self.members = members
+        self.owners = None
+        self._rebalance(reassert=True)
+
+    def _rebalance(self, reassert=False):
+        """按当前归属为角色变化的交换机重新声明角色, reassert时同时重新声明负责的交换机"""
+        for dpid, datapath in list(self.datapaths.items()):
+            master = self.is_master(dpid)
+            if (self.wanted.get(dpid) == 'master') == master:
+                if master and reassert:
+                    self.stats['role_reasserts'] += 1
+                    self._request_role(datapath)
+                continue
+            self._request_role(datapath)
+            if master:
+                self.stats['takeovers'] += 1
+                self.logger.info(f"dpid={dpid} 由本worker({self.index})接管")
+                if self.on_master is not None:
+                    self.on_master(datapath)
+            else:
+                self.stats['handovers'] += 1
+                self.logger.info(f"dpid={dpid} 交给worker {self.owner(dpid)}")
+
+    def role_counts(self):
+        """交换机确认本worker为MASTER/SLAVE(/EQUAL)的交换机数"""
+        counts = {'master': 0, 'slave': 0, 'equal': 0}
+        for role in self.roles.values():
+            counts[role] += 1
+        return counts
+
+    def get_stats(self):
+        return dict(self.stats)
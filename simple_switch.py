@@ -1,19 +1,86 @@
 from ryu.base import app_manager
 from ryu.controller import ofp_event
-from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
+from ryu.controller.handler import (CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER,
+                                    HANDSHAKE_DISPATCHER)
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
-from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
+from ryu.lib import hub
+from ryu.app.wsgi import WSGIApplication
 from ryu.lib.packet import ether_types
+import os
+
+import fast_packet
+from channel_stats import RX_EVENTS, ChannelStats, packet_in_max_len
+from event_log import EventLog, parse_rates
+from flood_tree import FloodTree
+from flow_batcher import FlowModBatcher
+from packet_trace import TraceRecorder
+import instrumentation
+from warm_restart import WarmRestart
 
 
 class SimpleSwitch13(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {'wsgi': WSGIApplication}
 
     def __init__(self, *args, **kwargs):
         super(SimpleSwitch13, self).__init__(*args, **kwargs)
         self.mac_to_port = {}
+        # 热路径埋点, 经WSGI端点GET /metrics导出, PUT /metrics/enable|disable运行时开关
+        self.metrics = instrumentation.Instrumentation(
+            'simple_switch', enabled=os.environ.get('METRICS') == '1')
+        instrumentation.register_wsgi(kwargs['wsgi'])
+        # 异步结构化日志: 设置EVENT_LOG时packet-in事件经有界缓冲区由后台循环写出
+        self.event_log = None
+        event_log_path = os.environ.get('EVENT_LOG')
+        if event_log_path:
+            self.event_log = EventLog(
+                self.logger, path=None if event_log_path == '-' else event_log_path,
+                sample_rates=parse_rates(os.environ.get('EVENT_LOG_SAMPLE')),
+                rate_limits=parse_rates(os.environ.get('EVENT_LOG_RATE')))
+            self.event_log_thread = hub.spawn(self.event_log.run)
+        # 截断packet-in: 设置PACKET_IN_MISS_LEN时只上送包头, 交换机没有缓存时仍上送完整帧
+        self.miss_send_len = int(os.environ.get('PACKET_IN_MISS_LEN', 0))
+        self.channel_stats = ChannelStats(self.logger)
+        self.channel_stats_thread = hub.spawn(self.channel_stats.run)
+        # FlowMod批量发送队列, FLOW_BUNDLES=1时使用OpenFlow bundle原子提交
+        self.flow_batcher = FlowModBatcher(
+            self.logger, use_bundles=os.environ.get('FLOW_BUNDLES') == '1',
+            channel_stats=self.channel_stats, metrics=self.metrics)
+        batcher = self.flow_batcher
+        self.metrics.register(
+            'ryu_flow_mods_sent_total', 'counter', '已发送的FlowMod数',
+            lambda: [((('dpid', dpid),), n) for dpid, n in batcher.sent_flows.items()])
+        self.metrics.register(
+            'ryu_flow_mods_failed_total', 'counter', '被交换机拒绝的FlowMod数',
+            lambda: [((('dpid', dpid),), stats['failed_flows'])
+                     for dpid, stats in batcher.get_stats().items()])
+        self.metrics.register(
+            'ryu_send_queue_depth', 'gauge', '批量发送队列中等待发送的消息数',
+            lambda: [((('dpid', dpid),), n) for dpid, n in batcher.queue_depth().items()])
+        self.flow_batcher_thread = hub.spawn(self.flow_batcher.run)
+        # LLDP链路发现与无环广播树, 替代OFPP_FLOOD
+        self.flood_tree = FloodTree(self.logger, self.flow_batcher.send_msg)
+        self.flood_tree_thread = hub.spawn(self.flood_tree.run)
+        # packet-in轨迹: 设置PACKET_TRACE时把进入处理函数的packet-in追加到二进制轨迹文件
+        self.packet_trace = None
+        trace_path = os.environ.get('PACKET_TRACE')
+        if trace_path:
+            self.packet_trace = TraceRecorder(
+                self.logger, trace_path,
+                snaplen=int(os.environ.get('PACKET_TRACE_SNAPLEN', 0)),
+                max_bytes=int(float(os.environ.get('PACKET_TRACE_MAX_MB', 0)) * 2 ** 20))
+            self.packet_trace_thread = hub.spawn(self.packet_trace.run)
+        # 热重启: 设置WARM_RESTART为快照文件路径时周期性保存MAC表, 启动时恢复并与交换机流表核对
+        self.warm_restart = None
+        snapshot_path = os.environ.get('WARM_RESTART')
+        if snapshot_path:
+            self.warm_restart = WarmRestart(
+                self.logger, self.flow_batcher.send_msg, snapshot_path, self.mac_to_port,
+                owned=lambda stat: stat.priority == 1,
+                interval=float(os.environ.get('WARM_RESTART_INTERVAL', 10)))
+            self.warm_restart.load()
+            self.warm_restart_thread = hub.spawn(self.warm_restart.run)
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -21,41 +88,98 @@ class SimpleSwitch13(app_manager.RyuApp):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
+        max_len = packet_in_max_len(ofproto, ev.msg.n_buffers, self.miss_send_len)
+        if max_len != ofproto.OFPCML_NO_BUFFER:
+            self.flow_batcher.send_msg(datapath, parser.OFPSetConfig(
+                datapath, ofproto.OFPC_FRAG_NORMAL, max_len))
+
         # 安装表-未匹配流的默认行为是发送到控制器
         match = parser.OFPMatch()
-        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                          ofproto.OFPCML_NO_BUFFER)]
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, max_len)]
         self.add_flow(datapath, 0, match, actions)
 
+        self.flood_tree.switch_enter(datapath)
+
+    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
+    def _state_change_handler(self, ev):
+        datapath = ev.datapath
+        if ev.state == MAIN_DISPATCHER and self.warm_restart:
+            self.warm_restart.switch_ready(datapath)
+        elif ev.state == DEAD_DISPATCHER and datapath.id is not None:
+            if self.warm_restart:
+                self.warm_restart.switch_leave(datapath.id)
+            self.flood_tree.switch_leave(datapath.id)
+            self.flow_batcher.remove(datapath.id)
+            self.channel_stats.remove(datapath.id)
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def _flow_stats_reply_handler(self, ev):
+        if self.warm_restart:
+            self.warm_restart.flow_stats_reply(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPPortDescStatsReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _port_desc_stats_reply_handler(self, ev):
+        self.flood_tree.port_desc_reply(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    def _port_status_handler(self, ev):
+        self.flood_tree.port_status(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _barrier_reply_handler(self, ev):
+        self.flow_batcher.barrier_reply(ev.msg)
+
+    @set_ev_cls(RX_EVENTS, [HANDSHAKE_DISPATCHER, CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _channel_rx_handler(self, ev):
+        self.channel_stats.received(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _error_msg_handler(self, ev):
+        msg = ev.msg
+        if not self.flow_batcher.error(msg):
+            self.logger.debug(f"dpid={msg.datapath.id} 错误消息 type={msg.type} code={msg.code}")
+
     def add_flow(self, datapath, priority, match, actions, buffer_id=None):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
         inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
                                              actions)]
-        if buffer_id:
+        if buffer_id is not None and buffer_id != ofproto.OFP_NO_BUFFER:
             mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
                                     priority=priority, match=match,
                                     instructions=inst)
         else:
             mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
                                     match=match, instructions=inst)
-        datapath.send_msg(mod)
+        self.flow_batcher.send_msg(datapath, mod)
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
+        start = self.metrics.start()
+        if self.packet_trace:
+            self.packet_trace.record(ev.msg)
+        self._handle_packet_in(ev.msg, start)
+        self.metrics.stage('packet_in', start)
+
+    def _handle_packet_in(self, msg, t):
         # 如果你不知道OpenFlow请参考OpenFlow规范
-        msg = ev.msg
         datapath = msg.datapath
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         in_port = msg.match['in_port']
+        self.channel_stats.packet_in(msg)
 
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        # 只需要以太网头部, 直接按固定偏移读取
+        eth = fast_packet.parse_headers(msg.data)
+        if eth is None:
+            return
+        t = self.metrics.stage('parse', t)
+        self.metrics.packet_in(datapath.id, eth.ethertype)
 
         if eth.ethertype == ether_types.ETH_TYPE_LLDP:
-            # 忽略LLDP包
+            # LLDP包用于链路发现
+            self.flood_tree.lldp_packet_in(datapath, in_port, msg.data)
             return
         dst = eth.dst
         src = eth.src
@@ -63,17 +187,22 @@ class SimpleSwitch13(app_manager.RyuApp):
         dpid = datapath.id
         self.mac_to_port.setdefault(dpid, {})
 
-        self.logger.info("packet in %s %s %s %s", dpid, src, dst, in_port)
+        if self.event_log:
+            self.event_log.emit('packet_in', dpid=dpid, src=src, dst=dst, in_port=in_port)
+        else:
+            self.logger.info("packet in %s %s %s %s", dpid, src, dst, in_port)
 
         # 学习MAC地址以避免FLOOD
         self.mac_to_port[dpid][src] = in_port
+        t = self.metrics.stage('learn', t)
 
         if dst in self.mac_to_port[dpid]:
             out_port = self.mac_to_port[dpid][dst]
+            actions = [parser.OFPActionOutput(out_port)]
         else:
+            # 沿广播树洪泛
             out_port = ofproto.OFPP_FLOOD
-
-        actions = [parser.OFPActionOutput(out_port)]
+            actions = self.flood_tree.flood_actions(datapath)
 
         # 为已知目的地安装流表项以避免包发送到控制器
         if out_port != ofproto.OFPP_FLOOD:
@@ -90,4 +219,4 @@ class SimpleSwitch13(app_manager.RyuApp):
 
         out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
                                   in_port=in_port, actions=actions, data=data)
-        datapath.send_msg(out) 
\ No newline at end of file
+        self.flow_batcher.send_msg(datapath, out) 
\ No newline at end of file
@@ -0,0 +1,85 @@
+import ipaddress
+from collections import OrderedDict
+
+
+class SubnetIndex(object):
+    """IPv6子网最长前缀匹配索引
+
+    按前缀长度分组, 每组以网络地址整数为键的哈希表保存子网,
+    查找时从最长前缀开始逐组屏蔽匹配, 并用有界LRU缓存最近的查找结果。
+    """
+
+    def __init__(self, subnets=(), memo_size=4096):
+        self.memo_size = memo_size
+        self._tables = {}      # 前缀长度 -> {网络地址整数: 子网字符串}
+        self._masks = []       # [(前缀长度, 掩码)], 按前缀长度降序
+        self._memo = OrderedDict()
+        for subnet in subnets:
+            self.add(subnet)
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
+
+    def __contains__(self, subnet):
+        net = ipaddress.ip_network(subnet)
+        table = self._tables.get(net.prefixlen)
+        return table is not None and int(net.network_address) in table
+
+    def _rebuild_masks(self):
+        self._masks = [(plen, ((1 << plen) - 1) << (128 - plen))
+                       for plen in sorted(self._tables, reverse=True)]
+
+    def add(self, subnet):
+        """添加子网(增量更新)"""
+        net = ipaddress.ip_network(subnet)
+        if net.version != 6:
+            raise ValueError(f"仅支持IPv6子网: {subnet}")
+        table = self._tables.get(net.prefixlen)
+        if table is None:
+            table = self._tables[net.prefixlen] = {}
+            self._rebuild_masks()
+        table[int(net.network_address)] = str(subnet)
+        self._memo.clear()
+
+    def remove(self, subnet):
+        """删除子网(增量更新), 子网不存在时返回False"""
+        net = ipaddress.ip_network(subnet)
+        table = self._tables.get(net.prefixlen)
+        if table is None or table.pop(int(net.network_address), None) is None:
+            return False
+        if not table:
+            del self._tables[net.prefixlen]
+            self._rebuild_masks()
+        self._memo.clear()
+        return True
+
+    def lookup_int(self, addr):
+        """按整数地址做最长前缀匹配"""
+        tables = self._tables
+        for plen, mask in self._masks:
+            subnet = tables[plen].get(addr & mask)
+            if subnet is not None:
+                return subnet
+        return None
+
+    def lookup(self, ip):
+        """获取IPv6地址所属的最长匹配子网, 非法地址返回None"""
+        memo = self._memo
+        try:
+            subnet = memo[ip]
+        except KeyError:
+            pass
+        else:
+            memo.move_to_end(ip)
+            return subnet
+
+        try:
+            addr = ipaddress.IPv6Address(ip)
+        except ValueError:
+            return None
+        subnet = self.lookup_int(int(addr))
+
+        memo[ip] = subnet
+        if len(memo) > self.memo_size:
+            memo.popitem(last=False)
+        return subnet
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# 大流迁移场景: spine-leaf链路限速后, 在leaf1->leaf2和leaf3->leaf4之间各跑两条iperf大流,
+# 分别在关闭和开启流量工程(DC_TE=1)时测量总吞吐
+#
+# 未开启流量工程时跨leaf流量沿广播树学习到的路径全部经过同一台spine, 同一leaf的两条
+# 大流挤在一条上行链路上; 开启后控制器把其中一条迁移到空闲的spine。
+
+import argparse
+import time
+
+from mininet.log import setLogLevel, info
+
+from datacenter_topo import createDatacenterNet
+from mininet_bench import cleanup, setup_hosts, start_controller, stop_controller
+
+# (源主机, 目的主机): 同一leaf上的两台主机发往另一leaf上的两台主机
+PAIRS = [('h1a', 'h2a'), ('h1b', 'h2b'), ('h3a', 'h4a'), ('h3b', 'h4b')]
+# 测试地址放在同一/64内, 走L2转发
+TEST_PREFIX = '2001:db8:2::a:'
+
+
+def run_iperf(net, addresses, duration, settle):
+    """并发运行全部iperf流, 返回稳定阶段(跳过前settle秒)每条流的平均吞吐(Mbit/s)"""
+    for _, dst in PAIRS:
+        net.get(dst).cmd('iperf -s -V > /dev/null 2>&1 &')
+    time.sleep(1)
+
+    clients = []
+    for src, dst in PAIRS:
+        clients.append(net.get(src).popen(
+            ['iperf', '-V', '-c', addresses[dst], '-t', str(duration), '-i', '1', '-y', 'C']))
+
+    results = []
+    for (src, dst), proc in zip(PAIRS, clients):
+        out, _ = proc.communicate()
+        samples = []
+        for line in out.decode().splitlines():
+            fields = line.split(',')
+            if len(fields) < 9:
+                continue
+            start, end = (float(x) for x in fields[6].split('-'))
+            # 只取1秒间隔的报告, 跳过最后的整段汇总
+            if end - start <= 1.5 and start >= settle:
+                samples.append(int(fields[8]) / 1e6)
+        results.append(sum(samples) / len(samples) if samples else 0.0)
+
+    for _, dst in PAIRS:
+        net.get(dst).cmd('kill %iperf')
+    return results
+
+
+def run_case(te, args):
+    info(f"*** 流量工程{'开启' if te else '关闭'}\n")
+    cleanup()
+    # 大流阈值取链路带宽的1/5, 两条流挤在一条链路上时各约为带宽的一半
+    controller = start_controller(f"te_scenario_{'on' if te else 'off'}.log",
+                                  DC_TE='1' if te else '0', TE_ELEPHANT_MBPS=str(args.bw / 5))
+    net = None
+    try:
+        net = createDatacenterNet(link_bw=args.bw)
+        # 测试地址只用于L2转发, 不改默认路由
+        addresses = setup_hosts(net, sorted({name for pair in PAIRS for name in pair}),
+                                TEST_PREFIX, gateway=None)
+        # 预热: 学习MAC和邻居表
+        for src, dst in PAIRS:
+            net.get(src).cmd(f'ping6 -c 3 -i 0.2 {addresses[dst]}')
+        results = run_iperf(net, addresses, args.duration, args.settle)
+    finally:
+        if net is not None:
+            net.stop()
+        stop_controller(controller)
+    for (src, dst), mbps in zip(PAIRS, results):
+        info(f"    {src} -> {dst}: {mbps:.1f} Mbit/s\n")
+    return sum(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大流跨spine迁移的iperf吞吐对比')
+    parser.add_argument('--bw', type=float, default=10, help='spine-leaf链路带宽(Mbit/s)')
+    parser.add_argument('--duration', type=int, default=40, help='iperf时长(秒)')
+    parser.add_argument('--settle', type=int, default=15, help='统计时跳过的起始秒数')
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    baseline = run_case(False, args)
+    engineered = run_case(True, args)
+    info(f"*** 总吞吐: 关闭{baseline:.1f} Mbit/s, 开启{engineered:.1f} Mbit/s, "
+         f"提升{(engineered / baseline - 1) if baseline else 0:.0%}\n")
+
+
+if __name__ == '__main__':
+    main()
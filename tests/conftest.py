@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controller_harness import Harness, create_app  # noqa: E402
+from fabric_topo import leaf_spine  # noqa: E402
+
+
+@pytest.fixture
+def make_harness(monkeypatch):
+    """按环境变量创建控制器应用, 返回记录发送消息的Harness"""
+    def make(name='datacenter', **env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        return Harness(create_app(name), record=True)
+    return make
+
+
+@pytest.fixture
+def topology_file(tmp_path):
+    """2-spine/2-leaf、每leaf 2台主机的拓扑描述(dpid: ex=1, ed=2, spine 3-4, leaf 5-6)"""
+    path = str(tmp_path / 'fabric.json')
+    leaf_spine(2, 2, 2, external_hosts=2).topology().save(path)
+    return path
+
+
+def group_mods(dp):
+    """dp收到的GroupMod: [(命令, 组号)]"""
+    return [(msg.command, msg.group_id) for msg in dp.messages
+            if msg.cls_msg_type == dp.ofproto.OFPT_GROUP_MOD]
+
+
+def flow_mods(dp, table_id=None):
+    """dp收到的FlowMod(可按表号过滤)"""
+    return [msg for msg in dp.messages if msg.cls_msg_type == dp.ofproto.OFPT_FLOW_MOD
+            and (table_id is None or msg.table_id == table_id)]
+
+
+def referenced_groups(mod):
+    return {action.group_id for inst in mod.instructions
+            for action in getattr(inst, 'actions', ()) if action.type == mod.datapath.ofproto.OFPAT_GROUP}
+
+
+def assert_groups_exist_before_use(dp):
+    """引用组的FlowMod发出时该组已添加, 且之后没有被删除(删除组会同时删除引用它的流表)"""
+    ofproto = dp.ofproto
+    groups = set()
+    used = set()
+    for msg in dp.messages:
+        if msg.cls_msg_type == ofproto.OFPT_GROUP_MOD:
+            if msg.command == ofproto.OFPGC_ADD:
+                groups.add(msg.group_id)
+            elif msg.command == ofproto.OFPGC_DELETE:
+                assert msg.group_id not in used, f'组{msg.group_id:#x}在被引用后删除'
+                groups.discard(msg.group_id)
+        elif msg.cls_msg_type == ofproto.OFPT_FLOW_MOD:
+            for group_id in referenced_groups(msg):
+                assert group_id in groups, f'流表引用了尚未添加的组{group_id:#x}'
+                used.add(group_id)
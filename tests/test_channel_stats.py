@@ -0,0 +1,34 @@
+import logging
+
+from ryu.controller import ofp_event
+
+from channel_stats import RX_EVENTS, ChannelStats
+from controller_harness import SimulatedDatapath
+from datacenter_controller import IPv6DatacenterController
+from simple_switch import SimpleSwitch13
+
+
+def test_rx_events_cover_replies_but_not_packet_in():
+    assert ofp_event.EventOFPBarrierReply in RX_EVENTS
+    assert ofp_event.EventOFPErrorMsg in RX_EVENTS
+    assert ofp_event.EventOFPFlowStatsReply in RX_EVENTS
+    assert ofp_event.EventOFPPortDescStatsReply in RX_EVENTS
+    assert ofp_event.EventOFPPacketIn not in RX_EVENTS
+
+
+def test_apps_count_every_received_message():
+    for app in (IPv6DatacenterController, SimpleSwitch13):
+        assert set(RX_EVENTS) <= set(app._channel_rx_handler.callers)
+
+
+def test_received_message_bytes_are_counted():
+    stats = ChannelStats(logging.getLogger('test'))
+    dp = SimulatedDatapath(7)
+    reply = dp.ofproto_parser.OFPBarrierReply(dp)
+    reply.buf = bytes(8)
+    stats.received(reply)
+
+    assert stats.get_stats()[7]['total']['rx_bytes'] == 8
+    dp.id = None
+    stats.received(reply)
+    assert None not in stats.get_stats()
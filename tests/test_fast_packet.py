@@ -0,0 +1,88 @@
+import pytest
+from ryu.lib.packet import ethernet, icmpv6, ipv6, lldp, packet
+
+import fast_packet
+
+HOST_MAC, ROUTER_MAC = '00:00:00:00:01:01', '00:00:00:00:00:fe'
+HOST_IP, ROUTER_IP = '2001:db8:2:1::1', '2001:db8:2::ffff'
+
+
+def frame(*protocols):
+    pkt = packet.Packet()
+    for protocol in protocols:
+        pkt.add_protocol(protocol)
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def echo_request():
+    return frame(ethernet.ethernet(dst=ROUTER_MAC, src=HOST_MAC, ethertype=0x86dd),
+                 ipv6.ipv6(src=HOST_IP, dst='2001:db8:1::10', nxt=58),
+                 icmpv6.icmpv6(type_=icmpv6.ICMPV6_ECHO_REQUEST, data=icmpv6.echo(id_=1, seq=1)))
+
+
+def neighbor_solicit():
+    option = icmpv6.nd_option_sla(hw_src=HOST_MAC)
+    return frame(ethernet.ethernet(dst='33:33:ff:00:ff:ff', src=HOST_MAC, ethertype=0x86dd),
+                 ipv6.ipv6(src=HOST_IP, dst='ff02::1:ff00:ffff', nxt=58, hop_limit=255),
+                 icmpv6.icmpv6(type_=icmpv6.ND_NEIGHBOR_SOLICIT,
+                               data=icmpv6.nd_neighbor(dst=ROUTER_IP, option=option)))
+
+
+def neighbor_advert():
+    option = icmpv6.nd_option_tla(hw_src=ROUTER_MAC)
+    return frame(ethernet.ethernet(dst=HOST_MAC, src=ROUTER_MAC, ethertype=0x86dd),
+                 ipv6.ipv6(src=ROUTER_IP, dst=HOST_IP, nxt=58, hop_limit=255),
+                 icmpv6.icmpv6(type_=icmpv6.ND_NEIGHBOR_ADVERT,
+                               data=icmpv6.nd_neighbor(res=6, dst=ROUTER_IP, option=option)))
+
+
+def lldp_frame():
+    tlvs = [lldp.ChassisID(subtype=lldp.ChassisID.SUB_LOCALLY_ASSIGNED, chassis_id=b'dpid:1'),
+            lldp.PortID(subtype=lldp.PortID.SUB_PORT_COMPONENT, port_id=b'\x00\x01'),
+            lldp.TTL(ttl=120), lldp.End()]
+    return frame(ethernet.ethernet(dst=lldp.LLDP_MAC_NEAREST_BRIDGE, src=HOST_MAC,
+                                   ethertype=0x88cc),
+                 lldp.lldp(tlvs))
+
+
+@pytest.mark.parametrize('data, icmp_type', [
+    (echo_request(), icmpv6.ICMPV6_ECHO_REQUEST),
+    (neighbor_solicit(), icmpv6.ND_NEIGHBOR_SOLICIT),
+    (neighbor_advert(), icmpv6.ND_NEIGHBOR_ADVERT),
+    (lldp_frame(), None),
+])
+def test_matches_ryu_parser(data, icmp_type):
+    hdr = fast_packet.parse_headers(data)
+    pkt = packet.Packet(data)
+    eth = pkt.get_protocol(ethernet.ethernet)
+    assert (hdr.dst, hdr.src, hdr.ethertype) == (eth.dst, eth.src, eth.ethertype)
+    assert hdr.l3_offset == ethernet.ethernet._MIN_LEN
+
+    ip = pkt.get_protocol(ipv6.ipv6)
+    if ip is None:
+        assert (hdr.ipv6_src, hdr.ipv6_dst, hdr.ipv6_nxt, hdr.icmpv6_type) == (None,) * 4
+        return
+    assert (hdr.ipv6_src, hdr.ipv6_dst, hdr.ipv6_nxt) == (ip.src, ip.dst, ip.nxt)
+    assert hdr.icmpv6_type == pkt.get_protocol(icmpv6.icmpv6).type_ == icmp_type
+    assert hdr.needs_full_parse == (icmp_type in (icmpv6.ND_NEIGHBOR_SOLICIT,
+                                                  icmpv6.ND_NEIGHBOR_ADVERT))
+
+
+def test_truncated_ipv6_header_keeps_l2_fields():
+    data = echo_request()[:14 + 30]
+    hdr = fast_packet.parse_headers(data)
+    pkt = packet.Packet(data)
+    eth = pkt.get_protocol(ethernet.ethernet)
+    assert (hdr.dst, hdr.src, hdr.ethertype) == (eth.dst, eth.src, eth.ethertype)
+    # ryu同样不解析出IPv6头部
+    assert pkt.get_protocol(ipv6.ipv6) is None
+    assert (hdr.ipv6_src, hdr.ipv6_dst, hdr.icmpv6_type) == (None, None, None)
+    assert not hdr.needs_full_parse
+
+
+def test_short_frame_returns_none():
+    data = echo_request()[:13]
+    assert packet.Packet(data).get_protocol(ethernet.ethernet) is None
+    assert fast_packet.parse_headers(data) is None
+    assert fast_packet.parse_headers(b'') is None
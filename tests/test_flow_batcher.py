@@ -0,0 +1,133 @@
+import logging
+
+from ryu.lib import hub
+
+from controller_harness import SimulatedDatapath
+from flow_batcher import FlowModBatcher
+
+
+def flow_mod(dp, port):
+    parser = dp.ofproto_parser
+    return parser.OFPFlowMod(datapath=dp, priority=1, match=parser.OFPMatch(in_port=port),
+                             instructions=[])
+
+
+def error_for(dp, msg, type_=None):
+    ofproto = dp.ofproto
+    error = dp.ofproto_parser.OFPErrorMsg(
+        dp, type_=ofproto.OFPET_FLOW_MOD_FAILED if type_ is None else type_,
+        code=ofproto.OFPFMFC_TABLE_FULL)
+    error.xid = msg.xid
+    return error
+
+
+def barrier_reply(batcher, dp):
+    for xid in dp.barriers:
+        reply = dp.ofproto_parser.OFPBarrierReply(dp)
+        reply.xid = xid
+        batcher.barrier_reply(reply)
+    dp.barriers.clear()
+
+
+def test_rejected_flow_mod_is_not_counted_as_installed():
+    batcher = FlowModBatcher(logging.getLogger('test'))
+    dp = SimulatedDatapath(1)
+    mods = [flow_mod(dp, port) for port in (1, 2, 3)]
+    for mod in mods:
+        batcher.send_msg(dp, mod)
+    confirmed = []
+    batcher.when_confirmed(dp, lambda: confirmed.append(True))
+    batcher.flush(1)
+
+    assert batcher.error(error_for(dp, mods[1]))
+    barrier_reply(batcher, dp)
+
+    stats = batcher.get_stats()[1]
+    assert stats['flows'] == 2
+    assert stats['failed_flows'] == 1
+    assert stats['failed_batches'] == 1
+    assert confirmed == []
+    assert batcher.sent_flows[1] == 3
+
+
+def test_bundle_failure_fails_whole_batch():
+    batcher = FlowModBatcher(logging.getLogger('test'), use_bundles=True)
+    dp = SimulatedDatapath(1)
+    for port in (1, 2, 3):
+        batcher.send_msg(dp, flow_mod(dp, port))
+    batcher.flush(1)
+    # 提交失败的错误应答带bundle提交请求的xid(屏障之前的最后一条消息)
+    commit = type('Msg', (), {'xid': dp.barriers[0] - 1})()
+    assert batcher.error(error_for(dp, commit, type_=dp.ofproto.OFPET_EXPERIMENTER))
+    barrier_reply(batcher, dp)
+
+    stats = batcher.get_stats()[1]
+    assert stats['flows'] == 0
+    assert stats['failed_flows'] == 3
+
+
+def test_errors_outside_outstanding_batches_are_ignored():
+    batcher = FlowModBatcher(logging.getLogger('test'))
+    dp = SimulatedDatapath(1)
+    mod = flow_mod(dp, 1)
+    batcher.send_msg(dp, mod)
+    confirmed = []
+    batcher.when_confirmed(dp, lambda: confirmed.append(True))
+    batcher.flush(1)
+    barrier_reply(batcher, dp)
+
+    assert not batcher.error(error_for(dp, mod))
+    assert batcher.get_stats()[1]['flows'] == 1
+    assert confirmed == [True]
+
+
+def test_packet_out_only_batches_skip_barrier():
+    batcher = FlowModBatcher(logging.getLogger('test'))
+    dp = SimulatedDatapath(1)
+    parser = dp.ofproto_parser
+    out = parser.OFPPacketOut(datapath=dp, buffer_id=dp.ofproto.OFP_NO_BUFFER,
+                              in_port=1, actions=[parser.OFPActionOutput(2)], data=b'\0' * 60)
+    batcher.send_msg(dp, out)
+    batcher.flush(1)
+
+    assert dp.barriers == []
+    assert batcher.get_stats() == {}
+
+    batcher.send_msg(dp, flow_mod(dp, 1))
+    batcher.flush(1)
+    assert len(dp.barriers) == 1
+
+
+def test_flush_loop_wakes_on_send_and_idles_otherwise():
+    batcher = FlowModBatcher(logging.getLogger('test'))
+    dp = SimulatedDatapath(1)
+    thread = hub.spawn(batcher.run)
+    try:
+        hub.sleep(0)
+        batcher.send_msg(dp, flow_mod(dp, 1))
+        batcher.send_msg(dp, flow_mod(dp, 2))
+        hub.sleep(0)
+        # 同一处理函数排入的消息合并为一批
+        assert batcher.queue_depth() == {}
+        assert dp.sent['OFPFlowMod'] == 2 and len(dp.barriers) == 1
+
+        # 队列为空时刷新循环保持阻塞, 不再发送任何消息
+        hub.sleep(0.01)
+        assert dp.xid == 3
+    finally:
+        hub.kill(thread)
+
+
+def test_errors_match_batches_across_xid_wrap():
+    batcher = FlowModBatcher(logging.getLogger('test'))
+    dp = SimulatedDatapath(1)
+    dp.xid = 0xffffffff - 1
+    mods = [flow_mod(dp, port) for port in (1, 2, 3)]
+    for mod in mods:
+        batcher.send_msg(dp, mod)
+    batcher.flush(1)
+    assert [mod.xid for mod in mods] == [0xffffffff, 0, 1]
+
+    assert batcher.error(error_for(dp, mods[2]))
+    barrier_reply(batcher, dp)
+    assert batcher.get_stats()[1]['failed_flows'] == 1
@@ -0,0 +1,75 @@
+import logging
+
+from controller_harness import SimulatedDatapath
+from flow_cache import FlowCache
+from flow_stats import CounterTable, flow_key
+
+
+def flow_mod(dp, port, table_id=0):
+    parser = dp.ofproto_parser
+    return parser.OFPFlowMod(datapath=dp, table_id=table_id, priority=1,
+                             match=parser.OFPMatch(in_port=port), instructions=[],
+                             idle_timeout=60)
+
+
+def build(**kwargs):
+    dp = SimulatedDatapath(1, record=True)
+    cache = FlowCache(logging.getLogger('test'), lambda dp, msg: dp.send_msg(msg), **kwargs)
+    return cache, dp
+
+
+def deleted_ports(dp):
+    return [dict(msg.match.items())['in_port'] for msg in dp.messages
+            if msg.cls_msg_type == dp.ofproto.OFPT_FLOW_MOD
+            and msg.command == dp.ofproto.OFPFC_DELETE_STRICT]
+
+
+def test_other_errors_are_logged_and_counted(caplog):
+    cache, dp = build()
+    mod = flow_mod(dp, 1)
+    cache.install(dp, mod)
+    ofproto = dp.ofproto
+    error = dp.ofproto_parser.OFPErrorMsg(dp, type_=ofproto.OFPET_BAD_MATCH,
+                                          code=ofproto.OFPBMC_BAD_FIELD)
+    error.xid = mod.xid
+
+    with caplog.at_level(logging.WARNING):
+        assert cache.error(error)
+
+    assert cache.get_stats()['rejected'] == 1
+    assert cache.entries() == {1: 0}
+    assert f'type={ofproto.OFPET_BAD_MATCH}' in caplog.text
+
+
+def test_table_limit_counts_each_table_separately():
+    cache, dp = build(table_limit=2, evict_batch=1)
+    for port in (1, 2):
+        cache.install(dp, flow_mod(dp, port, table_id=0))
+        cache.install(dp, flow_mod(dp, port, table_id=1))
+    assert deleted_ports(dp) == []
+
+    cache.install(dp, flow_mod(dp, 3, table_id=0))
+    assert deleted_ports(dp) == [1]
+    assert cache.counts[1] == {0: 2, 1: 2}
+
+
+def test_flow_stats_hits_refresh_lru_order():
+    cache, dp = build(table_limit=2, evict_batch=1)
+    mods = [flow_mod(dp, port) for port in (1, 2)]
+    for mod in mods:
+        cache.install(dp, mod)
+
+    # 先安装的表项在流统计中有包命中, 淘汰后安装的空闲表项
+    parser = dp.ofproto_parser
+    stats = [parser.OFPFlowStats(table_id=0, duration_sec=1, duration_nsec=0, priority=1,
+                                 idle_timeout=60, hard_timeout=0, flags=0, cookie=0,
+                                 packet_count=packets, byte_count=packets * 100,
+                                 match=mod.match, instructions=[])
+             for mod, packets in zip(mods, (10, 0))]
+    table = CounterTable()
+    table.update([flow_key(stat) for stat in stats], [stat.byte_count for stat in stats],
+                 [stat.packet_count for stat in stats], [1.0, 1.0], 0.0)
+    cache.flow_stats(1, stats, table)
+
+    cache.install(dp, flow_mod(dp, 3))
+    assert deleted_ports(dp) == [2]
@@ -0,0 +1,48 @@
+import pytest
+
+from host_tables import AgingTable, MacTable
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_full_table_evicts_oldest_sampled_entry():
+    clock = FakeClock()
+    table = AgingTable(4, 300, clock=clock)
+    for key in range(4):
+        table.set(key, key)
+        clock.now += 1
+    table.set(99, 99)
+
+    assert len(table) == 4
+    assert table.evictions == 1
+    assert 0 not in table
+    assert table.get(99) == 99
+
+
+@pytest.mark.parametrize('capacity', [0, -5])
+def test_non_positive_capacity_is_unbounded(capacity):
+    clock = FakeClock()
+    table = AgingTable(capacity, 300, clock=clock)
+    for key in range(1000):
+        table.set(key, key + 1)
+
+    assert table.capacity is None
+    assert len(table) == 1000
+    assert table.evictions == 0
+    assert all(table.get(key) == key + 1 for key in range(1000))
+    clock.now += 301
+    assert table.expire() == 1000
+    assert len(table) == 0
+
+
+def test_unbounded_mac_table_reports_no_capacity():
+    table = MacTable(0, 300)
+    table['00:00:00:00:00:01'] = 1
+    assert table['00:00:00:00:00:01'] == 1
+    assert table.get_stats()['capacity'] is None
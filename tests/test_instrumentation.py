@@ -0,0 +1,58 @@
+import pytest
+
+import instrumentation
+from instrumentation import Instrumentation, render_all
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'REGISTRY', [])
+    return instrumentation.REGISTRY
+
+
+def families(text):
+    """解析导出文本: 返回按出现顺序的[(指标族, 类型, [样本名])], 同时检查每族只声明一次"""
+    result = []
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ', 3)
+            assert name not in [family for family, _, _ in result], f'{name}重复声明'
+            result.append((name, kind, []))
+        else:
+            assert result, f'样本{line}之前没有TYPE'
+            result[-1][2].append(line.split('{')[0].split(' ')[0])
+    return result
+
+
+def test_families_from_all_apps_are_grouped(registry):
+    first = Instrumentation('first', enabled=True)
+    second = Instrumentation('second', enabled=True)
+    for metrics in (first, second):
+        metrics.packet_in(1, 0x86dd)
+        metrics.stage('parse', metrics.start())
+        metrics.register('ryu_datapaths', 'gauge', '已连接的交换机数', lambda: [((), 3)])
+    second.register('ryu_only_second', 'counter', '只有一个应用注册', lambda: [((), 1)])
+
+    parsed = families(render_all())
+    names = [name for name, _, _ in parsed]
+    assert len(names) == len(set(names))
+    for name, kind, samples in parsed:
+        allowed = {name} if kind != 'histogram' else {f'{name}_bucket', f'{name}_sum', f'{name}_count'}
+        assert set(samples) <= allowed
+    assert dict((name, kind) for name, kind, _ in parsed)['ryu_only_second'] == 'counter'
+    assert len(dict((name, samples) for name, _, samples in parsed)['ryu_packet_in_total']) == 2
+
+
+def test_ad_hoc_counters_get_help_and_type(registry):
+    metrics = Instrumentation('app', enabled=True)
+    metrics.describe('ryu_described_total', '有说明的计数器')
+    metrics.inc('ryu_described_total', (('dpid', 1),))
+    metrics.inc('ryu_plain_total')
+
+    text = render_all()
+    assert '# HELP ryu_described_total 有说明的计数器' in text
+    assert '# TYPE ryu_described_total counter' in text
+    assert '# TYPE ryu_plain_total counter' in text
+    assert 'ryu_plain_total{app="app"} 1' in text
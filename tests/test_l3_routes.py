@@ -0,0 +1,62 @@
+import pytest
+from ryu.lib.packet import ethernet, icmpv6, ipv6, packet
+
+from conftest import flow_mods
+from controller_harness import packet_in_bytes
+from datacenter_controller import L3_TABLE
+
+EDGE = 2
+EXTERNAL_MAC, EXTERNAL_IP = '00:00:00:00:01:01', '2001:db8:1::10'
+HOST_MAC, HOST_IP = '00:00:00:00:05:01', '2001:db8:2:5::1'
+
+
+def route(harness, table_id):
+    """外部主机经边缘路由器访问数据中心主机的首包(目的主机的邻居表和MAC表项已知)"""
+    app = harness.app
+    harness.datapath(EDGE)
+    app.nd_table[HOST_IP] = HOST_MAC
+    app.mac_to_port[EDGE][HOST_MAC] = 2
+    frame = packet.Packet()
+    frame.add_protocol(ethernet.ethernet(dst=app.router_mac, src=EXTERNAL_MAC, ethertype=0x86dd))
+    frame.add_protocol(ipv6.ipv6(src=EXTERNAL_IP, dst=HOST_IP, nxt=58))
+    frame.add_protocol(icmpv6.icmpv6(type_=icmpv6.ICMPV6_ECHO_REQUEST,
+                                     data=icmpv6.echo(id_=1, seq=1)))
+    frame.serialize()
+    harness.packet_in(EDGE, packet_in_bytes(1, 1, bytes(frame.data), table_id=table_id))
+    harness.flush()
+    dp = harness.datapath(EDGE)
+    return [dict(mod.match.items()) for mod in flow_mods(dp, table_id)
+            if mod.priority == 10]
+
+
+@pytest.mark.parametrize('env, table_id', [({}, 0), ({'DC_PIPELINE': 1}, L3_TABLE)])
+def test_host_mode_matches_exact_destination(make_harness, env, table_id):
+    harness = make_harness(L3_FLOW_MODE='host', **env)
+    matches = route(harness, table_id)
+
+    assert {match['ipv6_dst'] for match in matches} == {HOST_IP, EXTERNAL_IP}
+    assert all('ipv6_src' not in match for match in matches)
+
+
+@pytest.mark.parametrize('mode', ['pair', 'host'])
+def test_ddos_detection_counts_edge_flows_per_pair(make_harness, mode):
+    harness = make_harness(L3_FLOW_MODE=mode, DDOS_DETECT=1)
+    app = harness.app
+    matches = route(harness, 0)
+    assert {(match['ipv6_src'], match['ipv6_dst']) for match in matches} == {
+        (EXTERNAL_IP, HOST_IP), (HOST_IP, EXTERNAL_IP)}
+
+    # 两个方向的L3表项都带源地址, 流统计的包增量计入DDoS检测
+    dp = harness.datapath(EDGE)
+    parser = dp.ofproto_parser
+    body = [parser.OFPFlowStats(table_id=0, duration_sec=1, duration_nsec=0, priority=10,
+                                idle_timeout=300, hard_timeout=0, flags=0, cookie=0,
+                                packet_count=100, byte_count=10000,
+                                match=parser.OFPMatch(**match), instructions=[])
+            for match in matches]
+    reply = parser.OFPFlowStatsReply(dp)
+    reply.body, reply.flags, reply.xid = body, 0, 1
+    app.flow_stats.flow_stats_reply(reply)
+    app.ddos.flush()
+
+    assert app.ddos.stats['flow_packets'] == 200
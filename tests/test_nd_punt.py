@@ -0,0 +1,23 @@
+from conftest import assert_groups_exist_before_use, flow_mods, referenced_groups
+from flood_tree import FLOOD_GROUP_ID
+
+
+def ns_flows(dp):
+    return {mod.priority: mod for mod in flow_mods(dp)
+            if dict(mod.match.items()).get('icmpv6_type') == 135}
+
+
+def test_only_multicast_solicitations_are_punted(make_harness):
+    harness = make_harness()
+    dp = harness.datapath(6)
+    flows = ns_flows(dp)
+
+    punt = dict(flows[20].match.items())
+    assert punt['eth_dst'] == ('33:33:ff:00:00:00', 'ff:ff:ff:00:00:00')
+    assert 'ipv6_src' not in punt
+    # 重复地址检测不经过控制器
+    dad = dict(flows[21].match.items())
+    assert dad['ipv6_src'] == '::'
+    assert dad['eth_dst'] == punt['eth_dst']
+    assert referenced_groups(flows[21]) == {FLOOD_GROUP_ID}
+    assert_groups_exist_before_use(dp)
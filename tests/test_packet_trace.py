@@ -0,0 +1,87 @@
+import logging
+
+import pytest
+
+from controller_harness import SimulatedDatapath
+from packet_trace import FILE_HEADER, RECORD, TraceRecorder, read_trace
+
+
+def packet_in(dpid, in_port, data, table_id=0):
+    dp = SimulatedDatapath(dpid)
+    ofproto = dp.ofproto
+    return dp.ofproto_parser.OFPPacketIn(
+        dp, buffer_id=ofproto.OFP_NO_BUFFER, total_len=len(data), reason=ofproto.OFPR_NO_MATCH,
+        table_id=table_id, cookie=0, match=dp.ofproto_parser.OFPMatch(in_port=in_port),
+        data=data)
+
+
+def recorder(path, **kwargs):
+    clock = iter(range(1000, 2000)).__next__
+    return TraceRecorder(logging.getLogger('test'), path, clock=lambda: float(clock()), **kwargs)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    trace = recorder(path)
+    trace.record(packet_in(5, 3, b'\x01' * 80, table_id=1))
+    trace.record(packet_in(6, 7, b'\x02' * 60))
+    assert trace.drain() == 2
+    trace.close()
+
+    records = list(read_trace(path))
+    assert [(r.ts, r.dpid, r.in_port, r.table_id, r.total_len, r.data) for r in records] == [
+        (1000.0, 5, 3, 1, 80, b'\x01' * 80), (1001.0, 6, 7, 0, 60, b'\x02' * 60)]
+    assert records[0].buffer_id == SimulatedDatapath(1).ofproto.OFP_NO_BUFFER
+
+    # 同一格式的文件可以继续追加
+    trace = recorder(path)
+    trace.record(packet_in(5, 4, b'\x03' * 70))
+    trace.close()
+    assert [r.in_port for r in read_trace(path)] == [3, 7, 4]
+
+
+def test_snaplen_truncates_frames_but_keeps_total_len(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    trace = recorder(path, snaplen=64)
+    trace.record(packet_in(5, 3, bytes(range(200))))
+    trace.close()
+
+    record, = read_trace(path)
+    assert record.data == bytes(range(64))
+    assert record.total_len == 200
+
+
+def test_max_bytes_drops_and_counts_records(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    size = RECORD.size + 100
+    trace = recorder(path, max_bytes=FILE_HEADER.size + 2 * size)
+    for port in range(5):
+        trace.record(packet_in(5, port + 1, b'\0' * 100))
+    trace.close()
+
+    stats = trace.get_stats()
+    assert (stats['written'], stats['dropped']) == (2, 3)
+    assert stats['bytes'] == FILE_HEADER.size + 2 * size
+    assert [r.in_port for r in read_trace(path)] == [1, 2]
+
+
+def test_refuses_to_append_to_foreign_file(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a packet-in trace')
+    with pytest.raises(ValueError, match='不能追加'):
+        recorder(str(path))
+    assert path.read_bytes() == b'not a packet-in trace'
+
+
+def test_truncated_final_record_is_skipped(tmp_path):
+    path = tmp_path / 'trace.bin'
+    trace = recorder(str(path))
+    for port in (1, 2):
+        trace.record(packet_in(5, port, b'\0' * 100))
+    trace.close()
+    data = path.read_bytes()
+
+    # 截断在第二条记录的帧数据中和记录头中
+    for cut in (10, 100 + 10):
+        path.write_bytes(data[:-cut])
+        assert [r.in_port for r in read_trace(str(path))] == [1]
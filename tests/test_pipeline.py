@@ -0,0 +1,68 @@
+from ryu.lib.packet import ethernet, packet
+
+from conftest import assert_groups_exist_before_use, flow_mods, referenced_groups
+from controller_harness import packet_in_bytes
+from datacenter_controller import INGRESS_TABLE, L2_TABLE, L3_TABLE, LEARN_TABLE
+from flood_tree import FLOOD_GROUP_ID
+
+
+def goto(mod):
+    return [inst.table_id for inst in mod.instructions
+            if inst.type == mod.datapath.ofproto.OFPIT_GOTO_TABLE]
+
+
+def outputs(mod):
+    return [action.port for inst in mod.instructions
+            for action in getattr(inst, 'actions', ()) if action.type == mod.datapath.ofproto.OFPAT_OUTPUT]
+
+
+def test_table_misses_chain_tables_and_flood_in_l2(make_harness):
+    harness = make_harness(DC_PIPELINE=1)
+    dp = harness.datapath(6)
+    ofproto = dp.ofproto
+
+    misses = {mod.table_id: mod for mod in flow_mods(dp) if mod.priority == 0}
+    assert goto(misses[INGRESS_TABLE]) == [LEARN_TABLE]
+    assert outputs(misses[LEARN_TABLE]) == [ofproto.OFPP_CONTROLLER]
+    assert goto(misses[L3_TABLE]) == [L2_TABLE]
+    assert referenced_groups(misses[L2_TABLE]) == {FLOOD_GROUP_ID}
+    assert_groups_exist_before_use(dp)
+
+
+def test_edge_router_punts_unrouted_ipv6_from_l3_table(make_harness):
+    harness = make_harness(DC_PIPELINE=1)
+    dp = harness.datapath(2)
+    l3 = [mod for mod in flow_mods(dp, L3_TABLE) if mod.priority == 1]
+
+    assert len(l3) == 1
+    assert dict(l3[0].match.items())['eth_dst'] == harness.app.router_mac
+    assert outputs(l3[0]) == [dp.ofproto.OFPP_CONTROLLER]
+    assert_groups_exist_before_use(dp)
+
+
+def test_learning_miss_installs_learn_and_forward_entries(make_harness):
+    harness = make_harness(DC_PIPELINE=1)
+    dp = harness.datapath(6)
+    before = len(dp.messages)
+    frame = packet.Packet()
+    frame.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src='00:00:00:00:01:01',
+                                         ethertype=0x0800))
+    frame.serialize()
+    harness.packet_in(6, packet_in_bytes(1, 3, bytes(frame.data), table_id=LEARN_TABLE))
+    harness.flush()
+
+    new = [msg for msg in dp.messages[before:] if msg.cls_msg_type == dp.ofproto.OFPT_FLOW_MOD]
+    learn = [mod for mod in new if mod.table_id == LEARN_TABLE]
+    forward = [mod for mod in new if mod.table_id == L2_TABLE]
+    assert [dict(mod.match.items()) for mod in learn] == [
+        {'in_port': 3, 'eth_src': '00:00:00:00:01:01'}]
+    assert goto(learn[0]) == [L3_TABLE]
+    assert [dict(mod.match.items()) for mod in forward] == [{'eth_dst': '00:00:00:00:01:01'}]
+    assert outputs(forward[0]) == [3]
+
+
+def test_single_table_mode_installs_group_before_use(make_harness):
+    harness = make_harness()
+    dp = harness.datapath(6)
+    assert {mod.table_id for mod in flow_mods(dp)} == {0}
+    assert_groups_exist_before_use(dp)
@@ -0,0 +1,20 @@
+from conftest import group_mods
+from flood_tree import FLOOD_GROUP_ID
+
+
+def test_ecmp_install_only_deletes_its_own_groups(make_harness, topology_file):
+    harness = make_harness(DC_TOPOLOGY=topology_file, DC_ECMP=1)
+    dp = harness.datapath(5)
+    ofproto = dp.ofproto
+    mods = group_mods(dp)
+    ecmp = set(harness.app.ecmp_groups[5])
+
+    assert ecmp
+    deleted = {group_id for command, group_id in mods if command == ofproto.OFPGC_DELETE}
+    assert ofproto.OFPG_ALL not in deleted
+    assert deleted - {FLOOD_GROUP_ID} == ecmp
+    for group_id in ecmp:
+        assert mods.index((ofproto.OFPGC_DELETE, group_id)) < mods.index((ofproto.OFPGC_ADD, group_id))
+    # 洪泛组最后添加后不再被删除
+    last_add = max(i for i, mod in enumerate(mods) if mod == (ofproto.OFPGC_ADD, FLOOD_GROUP_ID))
+    assert (ofproto.OFPGC_DELETE, FLOOD_GROUP_ID) not in mods[last_add:]
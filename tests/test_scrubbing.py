@@ -0,0 +1,67 @@
+import logging
+
+from controller_harness import SimulatedDatapath
+from scrubbing import ScrubbingSteering
+
+EXTERNAL, EDGE, SPINE, LEAF = 1, 2, 3, 5
+SCRUBBER_MAC = '00:00:00:00:05:01'
+LINKS = {
+    (EDGE, 9): (EXTERNAL, 1), (EDGE, 1): (SPINE, 1),
+    (SPINE, 1): (EDGE, 1), (SPINE, 2): (LEAF, 1),
+    (LEAF, 1): (SPINE, 2),
+}
+
+
+def build():
+    datapaths = {dpid: SimulatedDatapath(dpid, record=True) for dpid in (EDGE, SPINE, LEAF)}
+    scrubbing = ScrubbingSteering(
+        logging.getLogger('test'), lambda dp, msg: dp.send_msg(msg), datapaths,
+        lambda: LINKS, lambda mac: (LEAF, 4) if mac == SCRUBBER_MAC else None,
+        EDGE, EXTERNAL, '00:00:00:00:00:fe', '2001:db8:2::1', ['2001:db8:f::/48'],
+        [(SCRUBBER_MAC, '2001:db8:2:5::1')])
+    scrubbing.probe()
+    scrubbing.update()
+    return scrubbing, datapaths
+
+
+def path_flows(dp):
+    return [msg for msg in dp.messages if msg.cls_msg_type == dp.ofproto.OFPT_FLOW_MOD
+            and msg.match.get('eth_dst') == SCRUBBER_MAC]
+
+
+def rejoin(datapaths, dpid):
+    datapaths[dpid] = SimulatedDatapath(dpid, record=True)
+    return datapaths[dpid]
+
+
+def test_path_switch_rejoin_reinstalls_path():
+    scrubbing, datapaths = build()
+    assert path_flows(datapaths[SPINE])
+
+    scrubbing.switch_leave(SPINE)
+    del datapaths[SPINE]
+    spine = rejoin(datapaths, SPINE)
+    scrubbing.switch_enter(SPINE)
+    scrubbing.update()
+
+    assert [msg.instructions[0].actions[0].port for msg in path_flows(spine)] == [2]
+    # 边缘路由器上的组和引流表项不受影响, 只修改组的桶
+    edge = datapaths[EDGE]
+    assert [msg.command for msg in edge.messages
+            if msg.cls_msg_type == edge.ofproto.OFPT_GROUP_MOD][-1] == edge.ofproto.OFPGC_MODIFY
+
+
+def test_reconnect_without_leave_reinstalls_path():
+    scrubbing, datapaths = build()
+    leaf = rejoin(datapaths, LEAF)
+    scrubbing.switch_enter(LEAF)
+    scrubbing.update()
+
+    assert [msg.instructions[0].actions[0].port for msg in path_flows(leaf)] == [4]
+
+
+def test_unchanged_state_sends_nothing():
+    scrubbing, datapaths = build()
+    sent = {dpid: len(dp.messages) for dpid, dp in datapaths.items()}
+    scrubbing.update()
+    assert {dpid: len(dp.messages) for dpid, dp in datapaths.items()} == sent
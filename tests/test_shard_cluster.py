@@ -0,0 +1,180 @@
+import logging
+import socket
+import types
+
+import pytest
+
+from conftest import assert_groups_exist_before_use, group_mods
+from controller_harness import SimulatedDatapath
+from flood_tree import FLOOD_GROUP_ID
+from scrubbing import SCRUB_GROUP_ID
+from shard_cluster import ShardCluster
+
+DPIDS = range(1, 7)
+_M64 = (1 << 64) - 1
+
+
+class RoleSwitch(object):
+    """按OpenFlow 1.3角色语义应答的交换机: 新MASTER把原MASTER降为SLAVE,
+    generation_id过期的请求返回STALE, SLAVE发来的FlowMod返回IS_SLAVE"""
+
+    def __init__(self, dpid):
+        self.dpid = dpid
+        self.generation = None
+        self.roles = {}           # 连接 -> 角色
+
+    def connect(self, controller):
+        return Connection(self, controller)
+
+    @property
+    def master(self):
+        return next((conn.controller for conn, role in self.roles.items()
+                     if role == conn.ofproto.OFPCR_ROLE_MASTER), None)
+
+    def handle(self, conn, msg):
+        ofproto = conn.ofproto
+        parser = conn.ofproto_parser
+        if msg.cls_msg_type == ofproto.OFPT_ROLE_REQUEST:
+            if msg.role in (ofproto.OFPCR_ROLE_MASTER, ofproto.OFPCR_ROLE_SLAVE):
+                if (self.generation is not None
+                        and (msg.generation_id - self.generation) & _M64 >= 1 << 63):
+                    return self._error(conn, msg, ofproto.OFPET_ROLE_REQUEST_FAILED,
+                                       ofproto.OFPRRFC_STALE)
+                self.generation = msg.generation_id
+                if msg.role == ofproto.OFPCR_ROLE_MASTER:
+                    for other, role in self.roles.items():
+                        if role == ofproto.OFPCR_ROLE_MASTER:
+                            self.roles[other] = ofproto.OFPCR_ROLE_SLAVE
+                self.roles[conn] = msg.role
+            reply = parser.OFPRoleReply(conn, self.roles.get(conn, ofproto.OFPCR_ROLE_EQUAL),
+                                        self.generation or 0)
+            reply.xid = msg.xid
+            conn.controller.role_reply(reply)
+        elif (msg.cls_msg_type == ofproto.OFPT_FLOW_MOD
+              and self.roles.get(conn) == ofproto.OFPCR_ROLE_SLAVE):
+            self._error(conn, msg, ofproto.OFPET_BAD_REQUEST, ofproto.OFPBRC_IS_SLAVE)
+
+    @staticmethod
+    def _error(conn, msg, type_, code):
+        error = conn.ofproto_parser.OFPErrorMsg(conn, type_=type_, code=code)
+        error.xid = msg.xid
+        conn.controller.error(error)
+
+
+class Connection(SimulatedDatapath):
+    """一个控制器到RoleSwitch的连接"""
+
+    def __init__(self, switch, controller):
+        super(Connection, self).__init__(switch.dpid)
+        self.switch = switch
+        self.controller = controller
+
+    def send_msg(self, msg):
+        self.set_xid(msg)
+        self.switch.handle(self, msg)
+        return True
+
+
+def free_port_pair():
+    for _ in range(20):
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            probe.bind(('127.0.0.1', port + 1))
+        except OSError:
+            continue
+        finally:
+            probe.close()
+        return port
+    pytest.skip('没有可用的连续UDP端口')
+
+
+@pytest.fixture
+def workers():
+    port = free_port_pair()
+    clusters = [ShardCluster(logging.getLogger(f'worker{index}'),
+                             lambda dp, msg: dp.send_msg(msg), index, 2, bus_port=port,
+                             clock=lambda: 100.0)
+                for index in range(2)]
+    yield clusters
+    for cluster in clusters:
+        cluster.sock.close()
+
+
+def exchange(workers):
+    """每个worker发布一次心跳, 另一个worker处理"""
+    for sender, receiver in ((workers[0], workers[1]), (workers[1], workers[0])):
+        sender.dpids_changed = True
+        sender.flush()
+        receiver.poll()
+
+
+def converge(workers):
+    """两个worker先后连接全部交换机(互相不知道对方时都会声明MASTER), 再交换心跳"""
+    switches = {dpid: RoleSwitch(dpid) for dpid in DPIDS}
+    for worker in workers:
+        for switch in switches.values():
+            worker.switch_ready(switch.connect(worker))
+    exchange(workers)
+    return switches
+
+
+def test_membership_change_reasserts_master_for_owned_switches(workers):
+    switches = converge(workers)
+
+    for dpid, switch in switches.items():
+        owner = workers[0].owner(dpid)
+        assert workers[1].owner(dpid) == owner
+        # worker 1后连接时把worker 0降级过; 成员变化后负责的worker重新声明MASTER
+        assert switch.master is workers[owner]
+        assert workers[owner].roles[dpid] == 'master'
+        assert workers[1 - owner].roles[dpid] == 'slave'
+    assert {worker.index for worker in workers
+            if worker.role_counts()['master']} == {0, 1}
+
+
+def test_demoted_master_reasserts_with_newer_generation(workers):
+    switches = converge(workers)
+    switch = switches[1]
+    owner = workers[workers[0].owner(1)]
+    conn = owner.datapaths[1]
+    reasserts = owner.get_stats()['role_reasserts']
+
+    # 另一个控制器用更大的generation_id抢占MASTER
+    outsider = types.SimpleNamespace(role_reply=lambda msg: None, error=lambda msg: None)
+    other = switch.connect(outsider)
+    ofproto = other.ofproto
+    other.send_msg(other.ofproto_parser.OFPRoleRequest(other, ofproto.OFPCR_ROLE_MASTER, 1 << 62))
+    assert switch.master is outsider
+
+    # 被降级的worker发送的FlowMod被拒绝后重新声明MASTER: 先被判generation过期,
+    # 查询交换机当前generation_id后以更大的值重发
+    conn.send_msg(conn.ofproto_parser.OFPFlowMod(datapath=conn, priority=1,
+                                                 match=conn.ofproto_parser.OFPMatch(in_port=1),
+                                                 instructions=[]))
+    assert switch.master is owner
+    assert owner.roles[1] == 'master'
+    assert owner.generation > 1 << 62
+    assert owner.get_stats()['role_reasserts'] == reasserts + 1
+
+
+def test_take_over_recreates_groups_before_flows(make_harness, topology_file):
+    harness = make_harness(DC_TOPOLOGY=topology_file, DC_ECMP=1, DC_PIPELINE=1,
+                           SCRUB_PREFIXES='2001:db8:f::/48')
+    app = harness.app
+    for dpid in (2, 5):
+        dp = harness.datapath(dpid)
+        ofproto = dp.ofproto
+        # 作为SLAVE时发出的消息被过滤, 接管时交换机上的组状态未知
+        dp.messages.clear()
+        app._take_over(dp)
+        harness.flush()
+
+        mods = group_mods(dp)
+        assert (ofproto.OFPGC_ADD, FLOOD_GROUP_ID) in mods
+        assert (ofproto.OFPGC_DELETE, ofproto.OFPG_ALL) not in mods
+        assert_groups_exist_before_use(dp)
+    assert (ofproto.OFPGC_ADD, SCRUB_GROUP_ID) in group_mods(harness.datapath(2))
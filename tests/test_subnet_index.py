@@ -0,0 +1,54 @@
+import ipaddress
+
+import pytest
+
+from subnet_index import SubnetIndex
+
+SUBNETS = ['2001:db8::/32', '2001:db8:2::/48', '2001:db8:2::/64', '2001:db8:2:5::/64']
+
+
+def test_longest_prefix_wins():
+    index = SubnetIndex(SUBNETS)
+    assert index.lookup('2001:db8:2::10') == '2001:db8:2::/64'
+    assert index.lookup('2001:db8:2:5::1') == '2001:db8:2:5::/64'
+    assert index.lookup('2001:db8:2:7::1') == '2001:db8:2::/48'
+    assert index.lookup('2001:db8:9::1') == '2001:db8::/32'
+    assert index.lookup('2001:db9::1') is None
+    assert len(index) == 4
+
+
+def test_remove_rebuilds_masks():
+    index = SubnetIndex(SUBNETS)
+    assert index.remove('2001:db8:2::/64')
+    # 同长度的其他/64仍然保留
+    assert [plen for plen, _ in index._masks] == [64, 48, 32]
+    assert index.remove('2001:db8:2:5::/64')
+    assert [plen for plen, _ in index._masks] == [48, 32]
+    assert index.lookup_int(int(ipaddress.IPv6Address('2001:db8:2::10'))) == '2001:db8:2::/48'
+    assert not index.remove('2001:db8:2:5::/64')
+    assert '2001:db8:2:5::/64' not in index and '2001:db8:2::/48' in index
+
+
+@pytest.mark.parametrize('memo_size', [4096, 0])
+def test_add_and_remove_invalidate_memo(memo_size):
+    index = SubnetIndex(['2001:db8::/32'], memo_size=memo_size)
+    assert index.lookup('2001:db8:2::10') == '2001:db8::/32'
+    assert index.lookup('2001:db8:3::10') == '2001:db8::/32'
+
+    index.add('2001:db8:2::/64')
+    assert index.lookup('2001:db8:2::10') == '2001:db8:2::/64'
+    index.remove('2001:db8::/32')
+    assert index.lookup('2001:db8:3::10') is None
+    assert len(index._memo) <= memo_size
+
+
+@pytest.mark.parametrize('ip', ['not-an-ip', '10.0.0.1', '2001:db8::1::2', ''])
+def test_invalid_addresses_return_none(ip):
+    index = SubnetIndex(SUBNETS)
+    assert index.lookup(ip) is None
+    assert ip not in index._memo
+
+
+def test_rejects_ipv4_subnets():
+    with pytest.raises(ValueError):
+        SubnetIndex(['10.0.0.0/8'])
@@ -0,0 +1,91 @@
+import logging
+
+from controller_harness import SimulatedDatapath
+from flow_stats import FlowStatsCollector
+from traffic_engineer import TrafficEngineer
+
+LEAF, DST_LEAF = 5, 6
+DST_MAC = '00:00:00:00:06:01'
+
+
+def reply(cls, dp, body):
+    msg = cls(dp)
+    msg.body = body
+    msg.flags = 0
+    msg.xid = 1
+    return msg
+
+
+def port_stats(dp, collector, tx_rx):
+    """按{端口: (发送字节, 接收字节)}喂一轮端口统计(存活1秒, 速率即字节数)"""
+    parser = dp.ofproto_parser
+    body = [parser.OFPPortStats(port, 0, 0, rx, tx, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0)
+            for port, (tx, rx) in tx_rx.items()]
+    collector.port_stats_reply(reply(parser.OFPPortStatsReply, dp, body))
+
+
+def elephant(dp, collector, port, rate):
+    """在源leaf上喂一条经port输出、速率为rate的按目的MAC转发流"""
+    parser = dp.ofproto_parser
+    inst = [parser.OFPInstructionActions(dp.ofproto.OFPIT_APPLY_ACTIONS,
+                                         [parser.OFPActionOutput(port)])]
+    stat = parser.OFPFlowStats(table_id=0, duration_sec=1, duration_nsec=0, priority=1,
+                               idle_timeout=0, hard_timeout=0, flags=0, cookie=0,
+                               packet_count=rate // 1000, byte_count=rate,
+                               match=parser.OFPMatch(eth_dst=DST_MAC), instructions=inst)
+    collector.flow_stats_reply(reply(parser.OFPFlowStatsReply, dp, [stat]))
+
+
+def build(links, loads):
+    """links: {(dpid, 端口): 对端dpid}; loads: {dpid: {端口: (发送字节, 接收字节)}}"""
+    collector = FlowStatsCollector(logging.getLogger('test'), lambda dp, msg: dp.send_msg(msg),
+                                   clock=lambda: 100.0)
+    dps = {dpid: SimulatedDatapath(dpid, record=True)
+           for dpid in {LEAF, DST_LEAF} | {peer for peer in links.values()}}
+    for dp in dps.values():
+        collector.add_datapath(dp)
+    for dpid, ports in loads.items():
+        port_stats(dps[dpid], collector, ports)
+    engineer = TrafficEngineer(
+        logging.getLogger('test'), lambda dp, msg: dp.send_msg(msg),
+        lambda dp, callback: callback(), collector,
+        lambda: {key: (peer, 0) for key, peer in links.items()},
+        lambda match: DST_LEAF, threshold=1e6, clock=lambda: 100.0)
+    return collector, engineer, dps
+
+
+def output_ports(dp):
+    return [action.port for msg in dp.messages
+            if msg.cls_msg_type == dp.ofproto.OFPT_FLOW_MOD
+            for inst in msg.instructions for action in inst.actions]
+
+
+def test_reverse_traffic_does_not_make_path_look_congested():
+    # leaf5端口1经spine3、端口2经spine4到leaf6; spine4方向只有大量反向(接收)流量
+    links = {(LEAF, 1): 3, (LEAF, 2): 4, (3, 1): DST_LEAF, (4, 1): DST_LEAF}
+    loads = {LEAF: {1: (6000000, 0), 2: (0, 20000000)},
+             3: {1: (6000000, 0)}, 4: {1: (0, 20000000)}}
+    collector, engineer, dps = build(links, loads)
+    assert collector.port_tx_rate(LEAF, 2) == 0
+    assert collector.port_rate(LEAF, 2) == 20000000
+
+    elephant(dps[LEAF], collector, 1, 5000000)
+
+    assert engineer.moves == 1
+    assert output_ports(dps[4]) == [1]
+    assert output_ports(dps[LEAF]) == [2]
+
+
+def test_parallel_links_are_candidate_paths():
+    # 只有一台spine, leaf5端口1/3与spine3端口1/2各是一对并行链路
+    links = {(LEAF, 1): 3, (LEAF, 3): 3, (3, 1): DST_LEAF, (3, 2): DST_LEAF}
+    loads = {LEAF: {1: (6000000, 0), 3: (0, 0)}, 3: {1: (6000000, 0), 2: (0, 0)}}
+    collector, engineer, dps = build(links, loads)
+    assert sorted(engineer._paths(engineer.links(), LEAF, DST_LEAF)) == [
+        (3, 1, 1), (3, 1, 2), (3, 3, 1), (3, 3, 2)]
+
+    elephant(dps[LEAF], collector, 1, 5000000)
+
+    assert engineer.moves == 1
+    assert output_ports(dps[3]) == [2]
+    assert output_ports(dps[LEAF]) == [3]
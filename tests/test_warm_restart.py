@@ -0,0 +1,120 @@
+import logging
+
+import pytest
+
+from controller_harness import SimulatedDatapath
+from host_tables import MacTable, NeighborTable, ipv6_to_int, mac_to_int
+from warm_restart import HEADER, MAGIC, Snapshot, WarmRestart, read_snapshot, write_snapshot
+
+MAC_A, MAC_B, MAC_C, MAC_D = (f'00:00:00:00:05:0{i}' for i in range(1, 5))
+HOST_IP = '2001:db8:2:5::4'
+
+
+def snapshot():
+    return Snapshot(1700000000.5,
+                    [(5, mac_to_int(MAC_A), 1, 300), (6, mac_to_int(MAC_B), 2, 0)],
+                    [(ipv6_to_int(HOST_IP), mac_to_int(MAC_D), 120)],
+                    {5: 'leaf1', 6: 'x' * 40})
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'state.snap')
+    original = snapshot()
+    write_snapshot(path, original)
+    restored = read_snapshot(path)
+
+    assert restored.created == original.created
+    assert restored.macs == original.macs
+    assert restored.neighbors == original.neighbors
+    # 名称截断到记录长度
+    assert restored.names == {5: 'leaf1', 6: 'x' * 32}
+    assert read_snapshot(str(tmp_path / 'missing.snap')) is None
+
+
+@pytest.mark.parametrize('corrupt, error', [
+    (lambda data: data[:-5], '截断'),
+    (lambda data: data[:HEADER.size - 1], '过短'),
+    (lambda data: b'BADMAGIC' + data[len(MAGIC):], '魔数'),
+])
+def test_corrupt_snapshot_is_rejected_and_cold_starts(tmp_path, corrupt, error):
+    path = str(tmp_path / 'state.snap')
+    write_snapshot(path, snapshot())
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(corrupt(data))
+
+    with pytest.raises(ValueError, match=error):
+        read_snapshot(path)
+    mac_tables = {}
+    warm = WarmRestart(logging.getLogger('test'), None, path, mac_tables)
+    assert not warm.load()
+    assert mac_tables == {} and warm.created is None
+
+
+def test_save_and_load_restore_tables_minus_downtime(tmp_path):
+    path = str(tmp_path / 'state.snap')
+    now = [1000.0]
+    mac_tables = {5: MacTable(64, 300)}
+    mac_tables[5][MAC_A] = 1
+    nd_table = NeighborTable(64, 300)
+    nd_table[HOST_IP] = MAC_D
+    WarmRestart(logging.getLogger('test'), None, path, mac_tables, nd_table, {5: 'leaf1'},
+                clock=lambda: now[0]).save()
+
+    now[0] += 100
+    restored, neighbors, names = {}, NeighborTable(64, 300), {}
+    warm = WarmRestart(logging.getLogger('test'), None, path, restored, neighbors, names,
+                       new_mac_table=lambda: MacTable(64, 300), clock=lambda: now[0])
+    assert warm.load()
+    assert restored[5].get(MAC_A) == 1
+    assert neighbors.get(HOST_IP) == MAC_D
+    assert names == {5: 'leaf1'}
+    # 剩余老化时间扣除停机的100秒
+    assert [ttl for _, _, ttl in restored[5].entries()] == [pytest.approx(200, abs=1)]
+
+
+def l2_flow(dp, mac, port, duration, priority=1):
+    parser = dp.ofproto_parser
+    inst = [parser.OFPInstructionActions(dp.ofproto.OFPIT_APPLY_ACTIONS,
+                                         [parser.OFPActionOutput(port)])]
+    return parser.OFPFlowStats(table_id=0, duration_sec=duration, duration_nsec=0,
+                               priority=priority, idle_timeout=60, hard_timeout=0, flags=0,
+                               cookie=0, packet_count=0, byte_count=0,
+                               match=parser.OFPMatch(eth_dst=mac), instructions=inst)
+
+
+def l3_flow(dp, ip, mac, port, duration):
+    parser = dp.ofproto_parser
+    actions = [parser.OFPActionSetField(eth_dst=mac), parser.OFPActionOutput(port)]
+    inst = [parser.OFPInstructionActions(dp.ofproto.OFPIT_APPLY_ACTIONS, actions)]
+    return parser.OFPFlowStats(table_id=0, duration_sec=duration, duration_nsec=0, priority=10,
+                               idle_timeout=300, hard_timeout=0, flags=0, cookie=0,
+                               packet_count=0, byte_count=0,
+                               match=parser.OFPMatch(eth_type=0x86dd, ipv6_dst=ip),
+                               instructions=inst)
+
+
+def test_reconcile_keeps_adopts_and_deletes():
+    dp = SimulatedDatapath(5, record=True)
+    mac_tables = {5: {MAC_A: 1, MAC_B: 2, MAC_C: 4}}
+    nd_table = {}
+    warm = WarmRestart(logging.getLogger('test'), lambda dp, msg: dp.send_msg(msg), None,
+                       mac_tables, nd_table, owned=lambda stat: stat.priority in (1, 10),
+                       clock=lambda: 1000.0)
+    warm.created = 900.0    # 快照生成于100秒前
+
+    result = warm.reconcile(dp, [
+        l2_flow(dp, MAC_A, 1, 500),           # 与状态一致: 保留
+        l2_flow(dp, MAC_B, 3, 500),           # 与状态矛盾且早于快照: 删除
+        l2_flow(dp, MAC_C, 5, 10),            # 与状态矛盾但晚于快照: 以流表为准
+        l3_flow(dp, HOST_IP, MAC_D, 6, 500),  # 状态中没有的主机: 学习
+        l2_flow(dp, MAC_B, 7, 500, priority=0),  # 非学习下发的表项不核对
+    ])
+
+    assert result == {'kept': 1, 'adopted': 2, 'deleted': 1}
+    assert mac_tables[5] == {MAC_A: 1, MAC_B: 2, MAC_C: 5, MAC_D: 6}
+    assert nd_table == {HOST_IP: MAC_D}
+    deletes = [msg for msg in dp.messages if msg.cls_msg_type == dp.ofproto.OFPT_FLOW_MOD]
+    assert [(msg.command, dict(msg.match.items())) for msg in deletes] == [
+        (dp.ofproto.OFPFC_DELETE_STRICT, {'eth_dst': MAC_B})]
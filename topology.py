@@ -0,0 +1,103 @@
+import json
+import os
+from collections import deque
+
+
+class Topology(object):
+    """数据中心静态拓扑描述: 交换机、主机及其接入端口、交换机间链路
+
+    文件格式(JSON或YAML):
+        switches: [{name, dpid}]
+        hosts:    [{name, mac, ip, prefixlen, dpid, port}]
+        links:    [{src, src_port, dst, dst_port}]   # src/dst为交换机dpid
+    """
+
+    def __init__(self, switches=None, hosts=None, links=None):
+        self.switches = dict(switches or {})   # dpid -> 名称
+        self.hosts = list(hosts or [])
+        self.links = list(links or [])
+        self._build()
+
+    def _build(self):
+        self.hosts_by_mac = {host['mac']: host for host in self.hosts}
+        self.hosts_by_ip = {host['ip']: host for host in self.hosts}
+        # dpid -> {邻居dpid: [本端端口]}
+        self.adjacency = {dpid: {} for dpid in self.switches}
+        for link in self.links:
+            self.adjacency.setdefault(link['src'], {}).setdefault(
+                link['dst'], []).append(link['src_port'])
+            self.adjacency.setdefault(link['dst'], {}).setdefault(
+                link['src'], []).append(link['dst_port'])
+        self._distances = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        switches = {int(sw['dpid']): sw['name'] for sw in data.get('switches', [])}
+        hosts = [dict(host, dpid=int(host['dpid']), port=int(host['port']))
+                 for host in data.get('hosts', [])]
+        links = [{'src': int(link['src']), 'src_port': int(link['src_port']),
+                  'dst': int(link['dst']), 'dst_port': int(link['dst_port'])}
+                 for link in data.get('links', [])]
+        return cls(switches, hosts, links)
+
+    def to_dict(self):
+        return {
+            'switches': [{'name': name, 'dpid': dpid}
+                         for dpid, name in sorted(self.switches.items())],
+            'hosts': self.hosts,
+            'links': self.links,
+        }
+
+    @classmethod
+    def load(cls, path):
+        """从JSON或YAML文件加载拓扑"""
+        with open(path) as f:
+            if os.path.splitext(path)[1] in ('.yaml', '.yml'):
+                import yaml
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        return cls.from_dict(data)
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    def without_ports(self, down_ports):
+        """返回去掉故障端口((dpid, 端口)集合)所在链路后的拓扑"""
+        links = [link for link in self.links
+                 if (link['src'], link['src_port']) not in down_ports
+                 and (link['dst'], link['dst_port']) not in down_ports]
+        return Topology(self.switches, self.hosts, links)
+
+    def switch_ports(self, dpid):
+        """交换机上连接其他交换机的端口集合"""
+        return {port for ports in self.adjacency.get(dpid, {}).values() for port in ports}
+
+    def distances(self, dst_dpid):
+        """所有交换机到dst_dpid的跳数(BFS, 结果缓存)"""
+        dist = self._distances.get(dst_dpid)
+        if dist is None:
+            dist = {dst_dpid: 0}
+            queue = deque([dst_dpid])
+            while queue:
+                node = queue.popleft()
+                for neighbor in self.adjacency.get(node, {}):
+                    if neighbor not in dist:
+                        dist[neighbor] = dist[node] + 1
+                        queue.append(neighbor)
+            self._distances[dst_dpid] = dist
+        return dist
+
+    def next_hop_ports(self, src_dpid, dst_dpid):
+        """src_dpid上沿最短路径到达dst_dpid的全部等价出端口(按邻居dpid排序)"""
+        dist = self.distances(dst_dpid)
+        if src_dpid not in dist or src_dpid == dst_dpid:
+            return []
+        ports = []
+        for neighbor in sorted(self.adjacency[src_dpid]):
+            if dist.get(neighbor) == dist[src_dpid] - 1:
+                ports.extend(sorted(self.adjacency[src_dpid][neighbor]))
+        return ports
@@ -0,0 +1,175 @@
+import time
+
+from ryu.ofproto import ofproto_v1_3
+
+from flow_stats import flow_key
+
+# 流量工程在中间(spine)交换机上下发的引导流表优先级: 高于L2/L3转发表项, 低于邻居请求上送
+TE_PRIORITY = 15
+TE_IDLE_TIMEOUT = 60
+
+# 按目的地址转发的流表才可能被迁移
+_DST_FIELDS = ('eth_dst', 'ipv6_dst')
+
+
+def _is_output(action):
+    return action.type == ofproto_v1_3.OFPAT_OUTPUT
+
+
+def output_port(stat):
+    """流表项唯一的输出端口, 没有或有多个Output动作时返回None"""
+    ports = [action.port for inst in stat.instructions
+             for action in getattr(inst, 'actions', ()) if _is_output(action)]
+    return ports[0] if len(ports) == 1 else None
+
+
+def replace_output(parser, instructions, port):
+    """复制指令列表, 只把Output动作的端口换成port(保留改写MAC等其他动作)"""
+    result = []
+    for inst in instructions:
+        actions = getattr(inst, 'actions', None)
+        if actions is not None:
+            inst = parser.OFPInstructionActions(
+                inst.type, [parser.OFPActionOutput(port) if _is_output(action) else action
+                            for action in actions])
+        result.append(inst)
+    return result
+
+
+class TrafficEngineer(object):
+    """大流检测与跨spine动态迁移
+
+    基于FlowStatsCollector的流统计, 在接入(leaf)交换机上找出速率超过阈值、
+    经上行端口发往其他leaf的按目的地址转发流表项(大流)。每条候选路径(并行链路
+    各算一条)的负载取沿转发方向两段链路出端口(源leaf上行口、中间交换机到目的leaf
+    的端口)发送速率的较大者, 反向流量不计入;
+    当最空闲的候选路径加上该流后仍低于当前路径负载时迁移:
+    先在新中间交换机上下发到目的leaf的引导流表, 收到其BarrierReply后再把源leaf
+    上的流表项改为从新上行口输出(先建后拆), 旧路径上的引导流表空闲超时后自动删除。
+    """
+
+    def __init__(self, logger, send_msg, when_confirmed, collector, links, locate,
+                 threshold=1e6, hold_down=30.0, clock=time.monotonic):
+        self.logger = logger
+        self.send_msg = send_msg              # send_msg(datapath, msg)
+        self.when_confirmed = when_confirmed  # when_confirmed(datapath, callback)
+        self.collector = collector
+        self.links = links                    # links() -> {(dpid, 端口): (对端dpid, 对端端口, ...)}
+        self.locate = locate                  # locate(match字典) -> 目的主机所在dpid
+        self.threshold = threshold            # 大流阈值(字节/秒)
+        self.hold_down = hold_down            # 同一流两次迁移的最小间隔(秒)
+        self.clock = clock
+        self.moved = {}                       # (dpid, 流标识) -> 上次迁移时间
+        self.moves = 0
+        collector.listeners.append(self.flow_stats)
+
+    def flow_stats(self, dpid, body, table):
+        """一台交换机的流统计更新后检测大流并尝试迁移"""
+        datapath = self.collector.datapaths.get(dpid)
+        if datapath is None:
+            return
+        self.expire()
+        links = self.links()
+        elephants = []
+        for stat in body:
+            match = dict(stat.match.items())
+            if not any(field in match for field in _DST_FIELDS):
+                continue
+            key = flow_key(stat)
+            slot = table.slots.get(key)
+            if slot is None or table.byte_rate[slot] < self.threshold:
+                continue
+            port = output_port(stat)
+            if port is None or (dpid, port) not in links:
+                continue
+            elephants.append((float(table.byte_rate[slot]), key, stat, match, port))
+
+        if not elephants:
+            return
+        # 先处理最大的流, 每次迁移后更新各链路负载估计
+        elephants.sort(key=lambda item: item[0], reverse=True)
+        load = {}                             # (dpid, 出端口) -> 发送方向字节/秒
+        now = self.clock()
+
+        def path_load(path):
+            middle, up_port, down_port = path
+            return max(load[(dpid, up_port)], load[(middle, down_port)])
+
+        for rate, key, stat, match, port in elephants:
+            if now - self.moved.get((dpid, key), -self.hold_down) < self.hold_down:
+                continue
+            dst_dpid = self.locate(match)
+            if dst_dpid is None or dst_dpid == dpid:
+                continue
+            paths = self._paths(links, dpid, dst_dpid)
+            current = [path for path in paths if path[1] == port]
+            if not current:
+                continue
+            for middle, up_port, down_port in paths:
+                for hop in ((dpid, up_port), (middle, down_port)):
+                    if hop not in load:
+                        load[hop] = self.collector.port_tx_rate(*hop)
+            # 不知道中间交换机实际走哪条下行链路时按负载最小者计, 避免误迁移
+            current = min(current, key=path_load)
+            best = min(paths, key=path_load)
+            if best[1] == port or path_load(best) + rate >= path_load(current):
+                continue
+            self._move(datapath, stat, match, best[0], best[1:])
+            for hop in ((dpid, current[1]), (current[0], current[2])):
+                load[hop] -= rate
+            for hop in ((dpid, best[1]), (best[0], best[2])):
+                load[hop] += rate
+            self.moved[(dpid, key)] = now
+            self.logger.info(f"大流迁移: dpid={dpid} {match} {rate * 8 / 1e6:.1f}Mbit/s "
+                             f"经dpid={current[0]}端口{port} -> dpid={best[0]}端口{best[1]}")
+
+    @staticmethod
+    def _paths(links, src, dst):
+        """src到dst的全部两跳路径: [(中间dpid, src上行端口, 中间交换机到dst的端口)]
+
+        并行链路各自构成一条路径。
+        """
+        down = {}
+        for (dpid, port), peer in links.items():
+            if peer[0] == dst:
+                down.setdefault(dpid, []).append(port)
+        paths = []
+        for (dpid, port), peer in links.items():
+            if dpid == src and peer[0] in down:
+                paths.extend((peer[0], port, down_port) for down_port in down[peer[0]])
+        return sorted(paths)
+
+    def _move(self, datapath, stat, match, middle, ports):
+        """先建后拆: 新中间交换机的引导流表确认后再修改源交换机的输出端口"""
+        middle_dp = self.collector.datapaths.get(middle)
+        if middle_dp is None:
+            return
+        up_port, down_port = ports
+        parser = middle_dp.ofproto_parser
+        ofproto = middle_dp.ofproto
+        middle_match = {field: value for field, value in match.items() if field != 'in_port'}
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                             [parser.OFPActionOutput(down_port)])]
+        self.send_msg(middle_dp, parser.OFPFlowMod(
+            datapath=middle_dp, priority=TE_PRIORITY, match=parser.OFPMatch(**middle_match),
+            instructions=inst, idle_timeout=TE_IDLE_TIMEOUT))
+
+        def switch_over():
+            if not datapath.is_active:
+                return
+            parser = datapath.ofproto_parser
+            ofproto = datapath.ofproto
+            self.send_msg(datapath, parser.OFPFlowMod(
+                datapath=datapath, table_id=stat.table_id,
+                command=ofproto.OFPFC_MODIFY_STRICT, priority=stat.priority,
+                match=parser.OFPMatch(**match),
+                instructions=replace_output(parser, stat.instructions, up_port)))
+            self.moves += 1
+
+        self.when_confirmed(middle_dp, switch_over)
+
+    def expire(self):
+        """删除已过保持期的迁移记录"""
+        deadline = self.clock() - self.hold_down
+        for key in [key for key, moved in self.moved.items() if moved < deadline]:
+            del self.moved[key]
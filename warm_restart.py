@@ -0,0 +1,281 @@
+import mmap
+import os
+import struct
+import time
+
+from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_3
+
+from host_tables import int_to_mac, mac_to_int
+from traffic_engineer import output_port
+
+# 快照文件: 文件头 + 三段定长记录, 整数按小端存放, 通过mmap整块写入和读取
+MAGIC = b'RYUSNAP1'
+HEADER = struct.Struct('<8sdIII')       # 魔数, 生成时间(Unix秒), MAC/邻居/名称记录数
+MAC_RECORD = struct.Struct('<QQII')     # dpid, MAC, 端口, 剩余秒数(0为不老化)
+ND_RECORD = struct.Struct('<QQQI4x')    # IPv6高64位, 低64位, MAC, 剩余秒数
+NAME_RECORD = struct.Struct('<Q32s')    # dpid, 交换机名称(UTF-8, 截断到32字节)
+
+_M64 = (1 << 64) - 1
+
+
+class Snapshot(object):
+    __slots__ = ('created', 'macs', 'neighbors', 'names')
+
+    def __init__(self, created, macs, neighbors, names):
+        self.created = created
+        self.macs = macs            # [(dpid, MAC整数, 端口, 剩余秒数)]
+        self.neighbors = neighbors  # [(IPv6整数, MAC整数, 剩余秒数)]
+        self.names = names          # {dpid: 名称}
+
+
+def write_snapshot(path, snapshot):
+    """写入临时文件后原子替换, 控制器在写入途中被杀死时旧快照仍然完整"""
+    names = [(dpid, name.encode()[:NAME_RECORD.size - 8]) for dpid, name in snapshot.names.items()]
+    size = (HEADER.size + MAC_RECORD.size * len(snapshot.macs)
+            + ND_RECORD.size * len(snapshot.neighbors) + NAME_RECORD.size * len(names))
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w+b') as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as buf:
+            HEADER.pack_into(buf, 0, MAGIC, snapshot.created, len(snapshot.macs),
+                             len(snapshot.neighbors), len(names))
+            offset = HEADER.size
+            for record in snapshot.macs:
+                MAC_RECORD.pack_into(buf, offset, *record)
+                offset += MAC_RECORD.size
+            for ip, mac, ttl in snapshot.neighbors:
+                ND_RECORD.pack_into(buf, offset, ip >> 64, ip & _M64, mac, ttl)
+                offset += ND_RECORD.size
+            for record in names:
+                NAME_RECORD.pack_into(buf, offset, *record)
+                offset += NAME_RECORD.size
+            buf.flush()
+    os.replace(tmp, path)
+    return size
+
+
+def read_snapshot(path):
+    """读取快照, 文件不存在时返回None, 格式错误或被截断时抛出ValueError"""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        if len(buf) < HEADER.size:
+            raise ValueError(f"快照文件过短: {len(buf)}字节")
+        magic, created, n_macs, n_neighbors, n_names = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"快照文件魔数错误: {magic!r}")
+        sections = []
+        offset = HEADER.size
+        for record, count in ((MAC_RECORD, n_macs), (ND_RECORD, n_neighbors),
+                              (NAME_RECORD, n_names)):
+            end = offset + record.size * count
+            if end > len(buf):
+                raise ValueError(f"快照文件被截断: {len(buf)}/{end}字节")
+            sections.append(list(record.iter_unpack(buf[offset:end])))
+            offset = end
+    macs, neighbors, names = sections
+    return Snapshot(created, macs,
+                    [((hi << 64) | lo, mac, ttl) for hi, lo, mac, ttl in neighbors],
+                    {dpid: name.rstrip(b'\0').decode(errors='replace') for dpid, name in names})
+
+
+def _mac_entries(table):
+    """MacTable按剩余老化时间导出, 普通字典视为不老化"""
+    if hasattr(table, 'entries'):
+        return table.entries()
+    return ((mac_to_int(mac), port, 0) for mac, port in table.items())
+
+
+def _full_mask(value):
+    """全1掩码的匹配字段取地址本身, 其他掩码返回None"""
+    if isinstance(value, tuple):
+        return value[0] if set(str(value[1])) <= set('f:') else None
+    return value
+
+
+def flow_facts(stat):
+    """从控制器学习下发的流表项中提取它依赖的主机位置和邻居表项
+
+    返回([(MAC, 端口)], [(IPv6, MAC)]):
+    - L2转发表项(匹配eth_dst, 唯一Output): 目的MAC位于输出端口
+    - L3路由表项(改写eth_dst, 唯一Output): 改写后的MAC位于输出端口, 匹配的目的IPv6对应该MAC
+    - 源MAC学习表项(匹配in_port+eth_src, 只有goto_table): 源MAC位于入端口
+    """
+    match = stat.match
+    actions = [action for inst in stat.instructions for action in getattr(inst, 'actions', ())]
+    if not actions:
+        goto = any(inst.type == ofproto_v1_3.OFPIT_GOTO_TABLE for inst in stat.instructions)
+        if goto and 'in_port' in match and isinstance(match.get('eth_src'), str):
+            return [(match['eth_src'], match['in_port'])], []
+        return [], []
+    port = output_port(stat)
+    if port is None or port > ofproto_v1_3.OFPP_MAX:
+        return [], []
+    rewrite = [action.value for action in actions
+               if action.type == ofproto_v1_3.OFPAT_SET_FIELD and action.key == 'eth_dst']
+    if rewrite:
+        ip = _full_mask(match.get('ipv6_dst'))
+        return [(rewrite[-1], port)], ([(ip, rewrite[-1])] if ip else [])
+    mac = match.get('eth_dst')
+    if isinstance(mac, str):
+        return [(mac, port)], []
+    return [], []
+
+
+class WarmRestart(object):
+    """控制器热重启: 周期性状态快照 + 重连后的流表核对
+
+    每interval秒把MAC表(带剩余老化时间)、邻居表和交换机名称写入定长记录的快照文件;
+    启动时读取快照恢复这些表, 扣除控制器停机期间流逝的时间。交换机重新连接后导出其
+    全部流表, 与恢复的状态逐条核对(只核对owned判定为学习下发的表项):
+
+    - 状态中没有的主机: 从流表项学习(快照之后新学到的主机)
+    - 与状态一致: 保留
+    - 与状态矛盾: 流表项存在时间短于快照年龄时它比快照新, 以流表为准更新状态;
+      否则流表项是快照之前的旧路径, 从交换机删除
+
+    交换机上仍在转发的流表不被清空重装, 控制器也不必为已知主机重新洪泛和学习。
+    """
+
+    def __init__(self, logger, send_msg, path, mac_tables, nd_table=None, names=None,
+                 new_mac_table=dict, owned=None, interval=10.0, clock=time.time):
+        self.logger = logger
+        self.send_msg = send_msg          # send_msg(datapath, msg)
+        self.path = path
+        self.mac_tables = mac_tables      # 控制器的dpid -> MAC表
+        self.nd_table = nd_table
+        self.names = names
+        self.new_mac_table = new_mac_table
+        self.owned = owned or (lambda stat: True)
+        self.interval = interval
+        self.clock = clock
+        self.created = None               # 已恢复快照的生成时间
+        self.reconciled = set()           # 本进程内已核对过的交换机
+        self.requests = {}                # dpid -> 流表导出请求
+        self.partial = {}                 # dpid -> 已收到的多段应答
+        self.stats = {'snapshots': 0, 'restored_macs': 0, 'restored_neighbors': 0,
+                      'kept': 0, 'adopted': 0, 'deleted': 0}
+
+    def run(self):
+        """周期性写快照, 由应用通过hub.spawn启动"""
+        while True:
+            hub.sleep(self.interval)
+            try:
+                self.save()
+            except OSError as e:
+                self.logger.warning(f"写入状态快照失败: {e}")
+
+    def save(self):
+        macs = [(dpid, key, port, ttl) for dpid, table in list(self.mac_tables.items())
+                for key, port, ttl in _mac_entries(table)]
+        neighbors = list(self.nd_table.entries()) if self.nd_table is not None else []
+        size = write_snapshot(self.path, Snapshot(self.clock(), macs, neighbors,
+                                                  dict(self.names or {})))
+        self.stats['snapshots'] += 1
+        self.logger.debug(f"状态快照: MAC{len(macs)}条, 邻居{len(neighbors)}条, {size}字节")
+        return size
+
+    def load(self):
+        """启动时从快照恢复状态, 返回是否恢复"""
+        try:
+            snapshot = read_snapshot(self.path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"读取状态快照失败, 冷启动: {e}")
+            return False
+        if snapshot is None:
+            return False
+        age = max(0.0, self.clock() - snapshot.created)
+        for dpid, key, port, ttl in snapshot.macs:
+            table = self.mac_tables.setdefault(dpid, self.new_mac_table())
+            if not ttl:
+                table[int_to_mac(key)] = port
+            elif ttl > age:
+                table.restore(key, port, ttl - age)
+            else:
+                continue
+            self.stats['restored_macs'] += 1
+        if self.nd_table is not None:
+            for ip, mac, ttl in snapshot.neighbors:
+                if ttl > age:
+                    self.nd_table.restore(ip, mac, ttl - age)
+                    self.stats['restored_neighbors'] += 1
+        if self.names is not None:
+            self.names.update(snapshot.names)
+        self.created = snapshot.created
+        self.logger.info(f"从快照恢复状态(生成于{age:.0f}秒前): MAC{self.stats['restored_macs']}条, "
+                         f"邻居{self.stats['restored_neighbors']}条")
+        return True
+
+    def switch_ready(self, datapath):
+        """交换机进入MAIN状态: 本进程内首次连接时导出其流表进行核对"""
+        if datapath.id in self.reconciled:
+            return
+        self.reconciled.add(datapath.id)
+        req = datapath.ofproto_parser.OFPFlowStatsRequest(datapath)
+        self.requests[datapath.id] = req
+        self.send_msg(datapath, req)
+
+    def switch_leave(self, dpid):
+        self.requests.pop(dpid, None)
+        self.partial.pop(dpid, None)
+
+    def flow_stats_reply(self, msg):
+        """处理核对用的流表导出应答, 不是本模块的请求时返回False"""
+        dpid = msg.datapath.id
+        req = self.requests.get(dpid)
+        if req is None or req.xid != msg.xid:
+            return False
+        body = self.partial.pop(dpid, [])
+        body.extend(msg.body)
+        if msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            self.partial[dpid] = body
+            return True
+        del self.requests[dpid]
+        self.reconcile(msg.datapath, body)
+        return True
+
+    def reconcile(self, datapath, stats):
+        """逐条核对流表项与恢复的状态"""
+        dpid = datapath.id
+        table = self.mac_tables.setdefault(dpid, self.new_mac_table())
+        age = self.clock() - self.created if self.created is not None else None
+        result = {'kept': 0, 'adopted': 0, 'deleted': 0}
+        for stat in stats:
+            if not self.owned(stat):
+                continue
+            macs, neighbors = flow_facts(stat)
+            # 流表项在快照之后安装(或没有快照)时以流表为准
+            newer = age is None or stat.duration_sec < age
+            facts = [(table, mac, port) for mac, port in macs]
+            if self.nd_table is not None:
+                facts += [(self.nd_table, ip, mac) for ip, mac in neighbors]
+            if not facts:
+                continue
+            changes = [(state, key, value) for state, key, value in facts
+                       if state.get(key) != value]
+            if any(state.get(key) is not None for state, key, _ in changes) and not newer:
+                result['deleted'] += 1
+                self._delete(datapath, stat)
+                continue
+            for state, key, value in changes:
+                state[key] = value
+            result['adopted' if changes else 'kept'] += 1
+        for key, count in result.items():
+            self.stats[key] += count
+        self.logger.info(f"dpid={dpid} 流表核对: 保留{result['kept']}条, "
+                         f"学习{result['adopted']}条, 删除{result['deleted']}条")
+        return result
+
+    def _delete(self, datapath, stat):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        self.send_msg(datapath, parser.OFPFlowMod(
+            datapath=datapath, table_id=stat.table_id, command=ofproto.OFPFC_DELETE_STRICT,
+            priority=stat.priority, match=stat.match,
+            out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY))
+
+    def get_stats(self):
+        return dict(self.stats)